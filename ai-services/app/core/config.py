@@ -18,14 +18,38 @@ class Settings(BaseSettings):
     recommendation_service_port: int = int(os.getenv("RECOMMENDATION_PORT", "8000"))
     search_service_port: int = int(os.getenv("SEARCH_PORT", "8001"))
     analytics_service_port: int = int(os.getenv("ANALYTICS_PORT", "8002"))
+    search_service_url: str = os.getenv("SEARCH_SERVICE_URL", "http://localhost:8001")
 
     # ML Model Configuration
     model_cache_dir: str = os.getenv("MODEL_CACHE_DIR", "./models")
     sentence_transformer_model: str = os.getenv("SENTENCE_MODEL", "all-MiniLM-L6-v2")
+    encoder_backend: str = os.getenv("ENCODER_BACKEND", "sentence_transformers")  # "sentence_transformers", "onnx"
+    onnx_quantize: bool = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+    search_warm_model: bool = os.getenv("SEARCH_WARM_MODEL", "true").lower() == "true"
 
     # Performance Settings
     max_recommendations: int = int(os.getenv("MAX_RECOMMENDATIONS", "20"))
     search_timeout: float = float(os.getenv("SEARCH_TIMEOUT", "5.0"))
+    search_candidate_depth: int = int(os.getenv("SEARCH_CANDIDATE_DEPTH", "500"))
+    search_max_limit: int = int(os.getenv("SEARCH_MAX_LIMIT", "100"))
+    search_cursor_ttl_seconds: int = int(os.getenv("SEARCH_CURSOR_TTL", "120"))
+    search_cursor_cache_size: int = int(os.getenv("SEARCH_CURSOR_CACHE_SIZE", "2048"))
+    search_batch_max_size: int = int(os.getenv("SEARCH_BATCH_MAX_SIZE", "32"))
+    search_batch_max_wait_ms: float = float(os.getenv("SEARCH_BATCH_MAX_WAIT_MS", "5.0"))
+    user_preferences_ttl_seconds: int = int(os.getenv("USER_PREFERENCES_TTL", "300"))
+    user_preferences_cache_size: int = int(os.getenv("USER_PREFERENCES_CACHE_SIZE", "10000"))
+    taste_blend_weight: float = float(os.getenv("TASTE_BLEND_WEIGHT", "0.2"))
+    als_factors: int = int(os.getenv("ALS_FACTORS", "64"))
+    als_iterations: int = int(os.getenv("ALS_ITERATIONS", "15"))
+    als_regularization: float = float(os.getenv("ALS_REGULARIZATION", "0.05"))
+    als_alpha: float = float(os.getenv("ALS_ALPHA", "10.0"))
+    als_ann_min_items: int = int(os.getenv("ALS_ANN_MIN_ITEMS", "50000"))  # needs hnswlib
+    preference_upsert_batch_size: int = int(os.getenv("PREFERENCE_UPSERT_BATCH_SIZE", "1000"))
+    preference_upsert_commit_batches: int = int(os.getenv("PREFERENCE_UPSERT_COMMIT_BATCHES", "10"))
+    snapshot_enabled: bool = os.getenv("SNAPSHOT_ENABLED", "true").lower() == "true"
+    snapshot_max_age_minutes: int = int(os.getenv("SNAPSHOT_MAX_AGE_MINUTES", "180"))
+    snapshot_retention_days: int = int(os.getenv("SNAPSHOT_RETENTION_DAYS", "120"))
+    processing_workers: int = int(os.getenv("PROCESSING_WORKERS", "0"))  # 0 = all cores
     cache_ttl_seconds: int = int(os.getenv("CACHE_TTL", "3600"))  # 1 hour
 
     # Security
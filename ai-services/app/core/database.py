@@ -5,7 +5,7 @@ import mysql.connector
 from mysql.connector import Error
 from contextlib import contextmanager
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from .config import settings
 
 logger = logging.getLogger(__name__)
@@ -120,6 +120,33 @@ def execute_query(query: str, params: tuple = None, fetch: bool = True) -> Optio
             cursor.close()
 
 
+def stream_query(query: str, params: tuple = None, chunk_size: int = 50000) -> Iterator[Tuple[List[str], list]]:
+    """Stream a large result set through an unbuffered (server-side) cursor.
+
+    Yields (column_names, rows) with up to ``chunk_size`` row tuples at a time,
+    so the client never holds the full result or a dict per row.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor(buffered=False)
+
+        try:
+            cursor.execute(query, params or ())
+            columns = list(cursor.column_names)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield columns, rows
+
+        finally:
+            # A consumer that stops early leaves rows on the wire; drain them so the connection is reusable
+            try:
+                cursor.close()
+            except Error:
+                conn.consume_results()
+                cursor.close()
+
+
 def execute_many(query: str, params_list: list) -> bool:
     """Execute multiple queries with different parameters"""
     with get_db_connection() as conn:
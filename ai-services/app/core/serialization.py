@@ -0,0 +1,69 @@
+"""
+Fast JSON serialization for LCMTV AI Services responses
+Uses orjson when installed and falls back to the standard library encoder
+"""
+import json
+import math
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encode the non-JSON types that MySQL rows and numpy produce"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value: Any) -> Any:
+    """Content with NaN and infinities replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, (Decimal, np.generic, np.ndarray)):
+        return _finite(_default(value))
+    return value
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize trusted response content to UTF-8 JSON bytes; non-finite floats become null"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        text = json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        # The stdlib would write NaN, which is not JSON; only such payloads pay for the rewrite
+        text = json.dumps(_finite(content), default=_default, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (or the stdlib encoder when it is missing).
+
+    Returning an instance directly from an endpoint skips response-model
+    validation, so only do that with plain dicts/lists built from trusted
+    internal data. As ``response_class`` or ``default_response_class`` the
+    content is still validated against the endpoint's response model first;
+    only the rendering is faster.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
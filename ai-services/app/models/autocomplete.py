@@ -0,0 +1,278 @@
+"""
+Prefix autocomplete for LCMTV search suggestions
+Sorted-array prefix index over titles, channels, categories and popular queries
+"""
+import json
+import threading
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.logging import get_logger
+from .lexical_index import tokenize
+
+logger = get_logger("autocomplete")
+
+# Weight given to a logged query relative to log1p(count)
+QUERY_WEIGHT = 3.0
+
+# Matches that start mid-phrase rank below those that start the phrase
+INNER_WORD_PENALTY = 0.5
+
+
+def normalize_phrase(text: str) -> str:
+    """Canonical form used for prefix matching"""
+    return " ".join(tokenize(text))
+
+
+class PrefixAutocomplete:
+    """Popularity-weighted prefix completion served entirely from memory.
+
+    Every phrase is indexed under its full text and under each word-start
+    suffix, so "rom" completes "Bible Study: Romans". Keys live in one sorted
+    list; a prefix maps to a contiguous slice found with two bisections. Top-k
+    for the short prefixes that match huge slices is precomputed at build time.
+
+    A logged query only becomes a completion once it was searched
+    ``min_query_count`` times by ``min_query_users`` distinct users (all
+    anonymous searches count as one user), so one person's searches are never
+    shown to everyone. Promoted queries accumulate in a small pending set that
+    is searched linearly until the next rebuild; ``record_query`` reports when
+    that rebuild is due so callers can run it off the request path. Candidate
+    and promoted query counts are both capped.
+    """
+
+    def __init__(
+        self,
+        precompute_prefix_len: int = 2,
+        precompute_k: int = 10,
+        rebuild_threshold: int = 500,
+        min_query_count: int = 3,
+        min_query_users: int = 2,
+        max_queries: int = 50000,
+        max_candidates: int = 100000
+    ):
+        self.precompute_prefix_len = precompute_prefix_len
+        self.precompute_k = precompute_k
+        self.rebuild_threshold = rebuild_threshold
+        self.min_query_count = min_query_count
+        self.min_query_users = min_query_users
+        self.max_queries = max_queries
+        self.max_candidates = max_candidates
+
+        self._keys: List[str] = []
+        self._key_entries = np.array([], dtype=np.int32)
+        self._key_weights = np.array([], dtype=np.float32)
+        self._displays: List[str] = []
+        self._top_by_prefix: Dict[str, List[int]] = {}
+
+        self._catalog_weights: Dict[str, Tuple[str, float]] = {}
+        # Promoted queries (suggested) and candidates still short of the thresholds
+        self.query_counts: Counter = Counter()
+        self._candidates: Dict[str, Tuple[int, Set[Optional[int]]]] = {}
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._rebuild_due = False
+        self._lock = threading.Lock()
+
+    def build_from_catalog(self, video_data: pd.DataFrame):
+        """Index titles, channel names and category names from the search index data"""
+        if 'view_count' in video_data:
+            views = np.log1p(pd.to_numeric(video_data['view_count'], errors='coerce').fillna(0).clip(lower=0))
+        else:
+            views = pd.Series(0.0, index=video_data.index)
+        weights: Dict[str, Tuple[str, float]] = {}
+
+        def add(display, weight):
+            if not isinstance(display, str) or not display.strip():
+                return
+            key = normalize_phrase(display)
+            if not key:
+                return
+            existing = weights.get(key)
+            weights[key] = (existing[0] if existing else display.strip(), (existing[1] if existing else 0.0) + weight)
+
+        for title, weight in zip(video_data['title'], views):
+            add(title, 1.0 + float(weight))
+
+        for column in ('channel_title', 'category_name'):
+            if column in video_data:
+                grouped = pd.Series(views.values, index=video_data[column]).groupby(level=0).sum()
+                for name, weight in grouped.items():
+                    add(name, 1.0 + float(np.log1p(weight)))
+
+        self._catalog_weights = weights
+        self.rebuild()
+
+    def rebuild(self):
+        """Merge catalog phrases, logged queries and pending additions into a fresh index"""
+        with self._lock:
+            if len(self.query_counts) > self.max_queries:
+                self.query_counts = Counter(dict(self.query_counts.most_common(self.max_queries)))
+            phrases = dict(self._catalog_weights)
+            for query, count in self.query_counts.items():
+                display, weight = phrases.get(query, (query, 0.0))
+                phrases[query] = (display, weight + QUERY_WEIGHT * float(np.log1p(count)))
+            self._pending = {}
+            self._rebuild_due = False
+
+        displays = []
+        keyed: List[Tuple[str, int, float]] = []
+        for entry_id, (key, (display, weight)) in enumerate(phrases.items()):
+            displays.append(display)
+            keyed.append((key, entry_id, weight))
+
+            words = key.split(" ")
+            offset = 0
+            for word in words[:-1]:
+                offset += len(word) + 1
+                keyed.append((key[offset:], entry_id, weight * INNER_WORD_PENALTY))
+
+        keyed.sort(key=lambda item: item[0])
+        keys = [item[0] for item in keyed]
+        key_entries = np.fromiter((item[1] for item in keyed), dtype=np.int32, count=len(keyed))
+        key_weights = np.fromiter((item[2] for item in keyed), dtype=np.float32, count=len(keyed))
+
+        top_by_prefix = self._precompute_short_prefixes(keys, key_entries, key_weights)
+
+        with self._lock:
+            self._keys = keys
+            self._key_entries = key_entries
+            self._key_weights = key_weights
+            self._displays = displays
+            self._top_by_prefix = top_by_prefix
+
+        logger.info(f"Built autocomplete index: {len(displays)} phrases, {len(keys)} prefix keys")
+
+    def _precompute_short_prefixes(self, keys: List[str], entries: np.ndarray, weights: np.ndarray) -> Dict[str, List[int]]:
+        """Top entries for every prefix up to precompute_prefix_len characters"""
+        prefixes = {key[:length] for key in keys for length in range(1, self.precompute_prefix_len + 1) if len(key) >= length}
+        return {
+            prefix: self._top_entries(keys, entries, weights, prefix, self.precompute_k)
+            for prefix in prefixes
+        }
+
+    @staticmethod
+    def _top_entries(keys: List[str], entries: np.ndarray, weights: np.ndarray, prefix: str, k: int) -> List[int]:
+        """Distinct entry ids for the k heaviest keys starting with prefix"""
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + "\uffff", lo)
+        if lo == hi:
+            return []
+
+        slice_weights = weights[lo:hi]
+        # Over-fetch: one phrase can match through several of its word suffixes
+        depth = min(len(slice_weights), k * 3)
+        if depth < len(slice_weights):
+            candidates = np.argpartition(-slice_weights, depth - 1)[:depth]
+        else:
+            candidates = np.arange(len(slice_weights))
+        candidates = candidates[np.argsort(-slice_weights[candidates], kind="stable")]
+
+        seen = []
+        for candidate in candidates:
+            entry = int(entries[lo + candidate])
+            if entry not in seen:
+                seen.append(entry)
+                if len(seen) == k:
+                    break
+        return seen
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[str]:
+        """Most popular completions for a partial query"""
+        normalized = normalize_phrase(prefix)
+        if not normalized:
+            return []
+        # Keep the trailing space so "john " only completes the next word
+        if prefix.endswith(" "):
+            normalized += " "
+
+        with self._lock:
+            keys, entries, weights, displays = self._keys, self._key_entries, self._key_weights, self._displays
+            cached = self._top_by_prefix.get(normalized) if limit <= self.precompute_k else None
+            pending = [item for key, item in self._pending.items() if key.startswith(normalized)]
+
+        entry_ids = cached if cached is not None else self._top_entries(keys, entries, weights, normalized, limit)
+        suggestions = [displays[entry] for entry in entry_ids[:limit]]
+
+        if pending:
+            seen = {suggestion.lower() for suggestion in suggestions}
+            for display, _ in sorted(pending, key=lambda item: item[1], reverse=True):
+                if display.lower() not in seen and len(suggestions) < limit:
+                    suggestions.append(display)
+
+        return suggestions
+
+    def record_query(self, query: str, user_id: Optional[int] = None) -> bool:
+        """Log a search so popular queries become completions.
+
+        Returns True when enough queries were promoted that ``rebuild`` should
+        run (once; the caller schedules it).
+        """
+        key = normalize_phrase(query)
+        if not key:
+            return False
+
+        with self._lock:
+            if key in self.query_counts:
+                self.query_counts[key] += 1
+                return False
+
+            count, users = self._candidates.get(key, (0, set()))
+            count += 1
+            if len(users) < self.min_query_users:
+                users.add(user_id)
+            if count < self.min_query_count or len(users) < self.min_query_users:
+                self._candidates[key] = (count, users)
+                if len(self._candidates) > self.max_candidates:
+                    self._prune_candidates()
+                return False
+
+            self._candidates.pop(key, None)
+            self.query_counts[key] = count
+            self._pending[key] = (query.strip(), QUERY_WEIGHT * float(np.log1p(count)))
+            if self._rebuild_due or len(self._pending) < self.rebuild_threshold:
+                return False
+            self._rebuild_due = True
+            return True
+
+    def _prune_candidates(self):
+        """Keep the more frequent half of the candidates; one-off queries go first"""
+        keep = sorted(self._candidates.items(), key=lambda item: item[1][0], reverse=True)[:self.max_candidates // 2]
+        self._candidates = dict(keep)
+
+    def load_query_log(self, path: Path):
+        """Restore promoted query counts persisted by save_query_log"""
+        try:
+            with open(path) as f:
+                counts = json.load(f)
+            # Logs written before the thresholds existed may hold one-off queries
+            self.query_counts.update({
+                query: count for query, count in counts.items() if count >= self.min_query_count
+            })
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to load autocomplete query log: {e}")
+
+    def save_query_log(self, path: Path):
+        """Persist the most frequent promoted queries"""
+        with self._lock:
+            top_queries = dict(self.query_counts.most_common(self.max_queries))
+        try:
+            with open(path, "w") as f:
+                json.dump(top_queries, f)
+        except Exception as e:
+            logger.warning(f"Failed to save autocomplete query log: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "phrases": len(self._displays),
+            "prefix_keys": len(self._keys),
+            "logged_queries": len(self.query_counts),
+            "candidate_queries": len(self._candidates),
+            "pending_queries": len(self._pending)
+        }
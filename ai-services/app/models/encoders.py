@@ -0,0 +1,237 @@
+"""
+Text encoder backends for LCMTV semantic search
+Wraps the stock SentenceTransformer model and an ONNX Runtime export of it
+"""
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Tuple
+import threading
+
+from ..core.logging import get_logger
+
+logger = get_logger("encoders")
+
+ENCODER_BACKENDS = ("sentence_transformers", "onnx")
+
+
+def resolve_hub_name(model_name: str) -> str:
+    """Map short sentence-transformers names to their Hugging Face hub id"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def encoder_signature(backend: str, model_name: str, quantize: bool = True) -> str:
+    """Identifies the embedding space an encoder produces; stored with cached embeddings"""
+    if backend == "onnx":
+        return f"onnx:{resolve_hub_name(model_name)}:{'int8' if quantize else 'fp32'}"
+    return f"{backend}:{resolve_hub_name(model_name)}"
+
+
+def _mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average token embeddings over the non-padding positions"""
+    mask = attention_mask[..., np.newaxis].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return (summed / counts).astype(np.float32)
+
+
+class SentenceTransformerEncoder:
+    """Stock PyTorch SentenceTransformer encoder"""
+
+    backend = "sentence_transformers"
+
+    def __init__(self, model_name: str, cache_dir: Path):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, cache_folder=str(cache_dir))
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+
+class OnnxEncoder:
+    """ONNX Runtime encoder with int8 dynamic quantization and tokenizer caching.
+
+    The model is exported once into ``<cache_dir>/onnx/<model>`` (this step needs
+    torch, transformers and onnx); afterwards only onnxruntime and tokenizers are
+    imported at runtime.
+    """
+
+    backend = "onnx"
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Path,
+        quantize: bool = True,
+        max_length: int = 256,
+        tokenizer_cache_size: int = 4096
+    ):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length
+        self.export_dir = Path(cache_dir) / "onnx" / resolve_hub_name(model_name).replace("/", "__")
+
+        # Tokenized queries repeat heavily (keystroke-driven searches)
+        self._token_cache: "OrderedDict[str, Tuple[List[int], List[int]]]" = OrderedDict()
+        self._token_cache_size = tokenizer_cache_size
+        self._token_cache_lock = threading.Lock()
+
+        self.ensure_exported()
+        self._load_runtime()
+
+    @property
+    def model_path(self) -> Path:
+        return self.export_dir / ("model.int8.onnx" if self.quantize else "model.onnx")
+
+    @property
+    def tokenizer_path(self) -> Path:
+        return self.export_dir / "tokenizer.json"
+
+    def ensure_exported(self):
+        """Export (and quantize) the transformer and its tokenizer to ONNX if not already cached"""
+        if self.model_path.exists() and self.tokenizer_path.exists():
+            return
+
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        fp32_path = self.export_dir / "model.onnx"
+
+        if not self.model_path.exists():
+            if not fp32_path.exists():
+                self._export_fp32(fp32_path)
+
+            if self.quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+
+                logger.info(f"Quantizing ONNX model to int8: {self.model_path}")
+                quantize_dynamic(str(fp32_path), str(self.model_path), weight_type=QuantType.QInt8)
+
+        # Checked on its own: a cached model does not imply a cached tokenizer
+        if not self.tokenizer_path.exists():
+            self._export_tokenizer()
+
+    def _export_tokenizer(self):
+        from transformers import AutoTokenizer
+
+        hub_name = resolve_hub_name(self.model_name)
+        logger.info(f"Exporting {hub_name} tokenizer: {self.tokenizer_path}")
+        AutoTokenizer.from_pretrained(hub_name).save_pretrained(str(self.export_dir))
+
+    def _export_fp32(self, output_path: Path):
+        """Trace the Hugging Face transformer into an ONNX graph"""
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        hub_name = resolve_hub_name(self.model_name)
+        logger.info(f"Exporting {hub_name} to ONNX: {output_path}")
+
+        tokenizer = AutoTokenizer.from_pretrained(hub_name)
+        model = AutoModel.from_pretrained(hub_name)
+        model.eval()
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        input_names = list(sample.keys())
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                str(output_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+    def _load_runtime(self):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(self.model_path),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {inp.name for inp in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(self.tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+        self.tokenizer.no_padding()
+
+        logger.info(f"Loaded ONNX encoder: {self.model_path.name}")
+
+    def _tokenize(self, texts: List[str]) -> List[Tuple[List[int], List[int]]]:
+        """Tokenize texts, reusing cached encodings for repeated strings"""
+        tokens = [None] * len(texts)
+        misses = []
+
+        with self._token_cache_lock:
+            for i, text in enumerate(texts):
+                cached = self._token_cache.get(text)
+                if cached is not None:
+                    self._token_cache.move_to_end(text)
+                    tokens[i] = cached
+                else:
+                    misses.append(i)
+
+        if misses:
+            encodings = self.tokenizer.encode_batch([texts[i] for i in misses])
+            with self._token_cache_lock:
+                for i, encoding in zip(misses, encodings):
+                    entry = (encoding.ids, encoding.type_ids)
+                    tokens[i] = entry
+                    self._token_cache[texts[i]] = entry
+                while len(self._token_cache) > self._token_cache_size:
+                    self._token_cache.popitem(last=False)
+
+        return tokens
+
+    def _run_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self._tokenize(texts)
+        seq_len = max(len(ids) for ids, _ in tokens)
+
+        input_ids = np.zeros((len(tokens), seq_len), dtype=np.int64)
+        type_ids = np.zeros_like(input_ids)
+        attention_mask = np.zeros_like(input_ids)
+        for row, (ids, types) in enumerate(tokens):
+            input_ids[row, :len(ids)] = ids
+            type_ids[row, :len(types)] = types
+            attention_mask[row, :len(ids)] = 1
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = type_ids
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        return _mean_pool(token_embeddings, attention_mask)
+
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Batch texts of similar length together to minimise padding
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        sorted_texts = [texts[i] for i in order]
+
+        batches = [
+            self._run_batch(sorted_texts[start:start + batch_size])
+            for start in range(0, len(sorted_texts), batch_size)
+        ]
+
+        embeddings = np.empty((len(texts), batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.vstack(batches)
+        return embeddings
+
+
+def create_encoder(backend: str, model_name: str, cache_dir: Path, quantize: bool = True):
+    """Instantiate the configured encoder backend"""
+    if backend == "sentence_transformers":
+        return SentenceTransformerEncoder(model_name, cache_dir)
+    if backend == "onnx":
+        return OnnxEncoder(model_name, cache_dir, quantize=quantize)
+    raise ValueError(f"Unknown encoder backend: {backend} (expected one of {', '.join(ENCODER_BACKENDS)})")
@@ -0,0 +1,365 @@
+"""
+Online user feature store for LCMTV recommendation scoring
+Per-user ring buffers of recent views and rolling daily aggregates, updated
+from new video_views by the processing service and answered from memory
+"""
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..core.logging import get_logger
+
+logger = get_logger("feature_store")
+
+HISTORY_SIZE = 32  # Most recent views kept per user
+WINDOW_DAYS = 7    # Features cover views from the last 7 days
+DAY_SLOTS = WINDOW_DAYS + 1  # Today plus the 7 days before it
+FORMAT_VERSION = 2  # Bumped when a persisted array changes meaning
+
+DEFAULT_FEATURES = {
+    'recent_avg_engagement': 0.5,
+    'recent_watch_count': 0,
+    'recent_completion_rate': 0.0,
+    'last_watch_hour': 12,
+    'current_streak': 0,
+    'category_match': 0,
+    'duration_match': 0
+}
+
+
+def local_seconds(timestamps) -> np.ndarray:
+    """Seconds since the epoch of naive (database-local) timestamps, so // 3600 % 24 is the local hour"""
+    return pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def local_now() -> int:
+    """local_seconds of the current time"""
+    return int(np.datetime64(datetime.now(), 's').astype(np.int64))
+
+
+class UserFeatureStore:
+    """Rolling per-user features for (user, video) scoring.
+
+    Each user keeps the last HISTORY_SIZE (video_id, watched_at) pairs in a
+    ring buffer and DAY_SLOTS daily aggregates (views, completions,
+    engagement score sum) indexed by ``day % DAY_SLOTS``, so recent counts
+    stay exact however many views fall out of the history. Video category
+    and duration are kept alongside for matching candidates.
+
+    ``last_view_id`` is the high-water mark of views in the history.
+    ``settled_view_id`` is the high-water mark of views in the daily
+    aggregates, which only take days that are over, since the web app keeps
+    updating a view for the rest of the day it was created. That day's
+    totals live in ``open_totals`` for ``open_day`` and are replaced, not
+    added to, on every update.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+        self.user_ids = np.array([], dtype=np.int64)
+        self.history_videos = np.zeros((0, HISTORY_SIZE), dtype=np.int32)
+        self.history_times = np.zeros((0, HISTORY_SIZE), dtype=np.int64)
+        self.history_head = np.array([], dtype=np.int32)
+        self.day_stamps = np.zeros((0, DAY_SLOTS), dtype=np.int32)
+        self.day_totals = np.zeros((0, DAY_SLOTS, 3), dtype=np.float32)  # views, completed, engagement sum
+        self.open_day = -1
+        self.open_totals = np.zeros((0, 3), dtype=np.float32)
+
+        self.video_ids = np.array([], dtype=np.int64)
+        self.video_categories = np.array([], dtype=np.float32)
+        self.video_durations = np.array([], dtype=np.float32)
+        self.last_view_id = 0
+        self.settled_view_id = 0
+
+        self._row_by_user: Dict[int, int] = {}
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Read the persisted store; returns False when there is none"""
+        try:
+            mtime = self.path.stat().st_mtime
+            with np.load(self.path) as data:
+                arrays = {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load user features: {e}")
+            return False
+        if int(arrays.get('format_version', 1)) != FORMAT_VERSION:
+            logger.info("User features were written in an older format, they will be rebuilt")
+            return False
+
+        with self._lock:
+            self.user_ids = arrays['user_ids']
+            self.history_videos = arrays['history_videos']
+            self.history_times = arrays['history_times']
+            self.history_head = arrays['history_head']
+            self.day_stamps = arrays['day_stamps']
+            self.day_totals = arrays['day_totals']
+            self.open_day = int(arrays['open_day'])
+            self.open_totals = arrays['open_totals']
+            self.video_ids = arrays['video_ids']
+            self.video_categories = arrays['video_categories']
+            self.video_durations = arrays['video_durations']
+            self.last_view_id = int(arrays['last_view_id'])
+            self.settled_view_id = int(arrays['settled_view_id'])
+            self._row_by_user = {int(user_id): row for row, user_id in enumerate(self.user_ids)}
+            self._loaded_mtime = mtime
+        return True
+
+    def refresh(self) -> bool:
+        """Reload if the pipeline has written a newer file since the last load"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._loaded_mtime:
+            return self.load()
+        return False
+
+    def save(self):
+        """Persist atomically so readers never see a partial file"""
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp_path,
+                user_ids=self.user_ids,
+                history_videos=self.history_videos,
+                history_times=self.history_times,
+                history_head=self.history_head,
+                day_stamps=self.day_stamps,
+                day_totals=self.day_totals,
+                open_day=np.int32(self.open_day),
+                open_totals=self.open_totals,
+                video_ids=self.video_ids,
+                video_categories=self.video_categories,
+                video_durations=self.video_durations,
+                last_view_id=np.int64(self.last_view_id),
+                settled_view_id=np.int64(self.settled_view_id),
+                format_version=np.int32(FORMAT_VERSION)
+            )
+        os.replace(tmp_path, self.path)
+
+    def set_videos(self, video_ids: np.ndarray, categories: np.ndarray, durations: np.ndarray):
+        """Replace the video attributes candidates are matched on"""
+        order = np.argsort(video_ids)
+        with self._lock:
+            self.video_ids = np.asarray(video_ids, dtype=np.int64)[order]
+            self.video_categories = np.asarray(categories, dtype=np.float32)[order]
+            self.video_durations = np.asarray(durations, dtype=np.float32)[order]
+
+    def add_views(self, user_ids: np.ndarray, video_ids: np.ndarray, watched_at: np.ndarray) -> int:
+        """Append a batch of views to the history (``watched_at`` from local_seconds, in view order); returns users touched"""
+        if len(user_ids) == 0:
+            return 0
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        watched_at = np.asarray(watched_at, dtype=np.int64)
+        batch_users, inverse = np.unique(user_ids, return_inverse=True)
+
+        with self._lock:
+            rows = self._rows_for(batch_users)[inverse]
+
+            # Position of each view within its user, newest HISTORY_SIZE kept
+            order = np.lexsort((np.arange(len(rows)), rows))
+            sorted_rows = rows[order]
+            starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+            counts = np.diff(np.r_[starts, len(sorted_rows)])
+            rank = np.arange(len(sorted_rows)) - np.repeat(starts, counts)
+            keep = rank >= np.repeat(counts, counts) - HISTORY_SIZE
+            slots = (self.history_head[sorted_rows] + rank) % HISTORY_SIZE
+            self.history_videos[sorted_rows[keep], slots[keep]] = np.asarray(video_ids)[order][keep]
+            self.history_times[sorted_rows[keep], slots[keep]] = watched_at[order][keep]
+            group_rows = sorted_rows[starts]
+            self.history_head[group_rows] = (self.history_head[group_rows] + counts) % HISTORY_SIZE
+
+        return len(batch_users)
+
+    def add_day_totals(self, user_ids: np.ndarray, days: np.ndarray, totals: np.ndarray) -> int:
+        """Sum settled (views, completed, engagement_sum) rows per (user, epoch day) in; returns users touched.
+
+        A slot is cleared when a newer day claims it.
+        """
+        if len(user_ids) == 0:
+            return 0
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        batch_users, inverse = np.unique(user_ids, return_inverse=True)
+
+        with self._lock:
+            rows = self._rows_for(batch_users)[inverse]
+            grouped = pd.DataFrame(np.asarray(totals, dtype=np.float64), columns=['views', 'completed', 'engagement'])
+            grouped['row'] = rows
+            grouped['day'] = np.asarray(days, dtype=np.int32)
+            grouped = grouped.groupby(['row', 'day'], as_index=False).sum()
+            grouped = grouped[grouped['day'] > grouped['day'].max() - DAY_SLOTS]
+
+            day_rows = grouped['row'].to_numpy()
+            day_values = grouped['day'].to_numpy(dtype=np.int32)
+            day_slots = day_values % DAY_SLOTS
+            stale = self.day_stamps[day_rows, day_slots] < day_values
+            self.day_totals[day_rows[stale], day_slots[stale]] = 0
+            self.day_stamps[day_rows[stale], day_slots[stale]] = day_values[stale]
+            current = self.day_stamps[day_rows, day_slots] == day_values
+            self.day_totals[day_rows[current], day_slots[current]] += (
+                grouped[['views', 'completed', 'engagement']].to_numpy(dtype=np.float32)[current]
+            )
+
+        return len(batch_users)
+
+    def replace_open_day(self, day: int, user_ids: np.ndarray, totals: np.ndarray):
+        """Replace the (views, completed, engagement_sum) totals of the day still being written"""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        with self._lock:
+            rows = self._rows_for(user_ids)
+            self.open_totals = np.zeros_like(self.open_totals)
+            self.open_totals[rows] = np.asarray(totals, dtype=np.float32).reshape(len(rows), 3)
+            self.open_day = int(day)
+
+    def _rows_for(self, batch_users: np.ndarray) -> np.ndarray:
+        """Store rows of the given users, appending rows for new ones (caller holds the lock)"""
+        rows = np.fromiter(
+            (self._row_by_user.get(int(user_id), -1) for user_id in batch_users),
+            dtype=np.int64, count=len(batch_users)
+        )
+        new = rows < 0
+        if np.any(new):
+            start, n_new = len(self.user_ids), int(new.sum())
+            rows[new] = np.arange(start, start + n_new)
+            self.user_ids = np.concatenate([self.user_ids, batch_users[new]])
+            self.history_videos = np.vstack([self.history_videos, np.zeros((n_new, HISTORY_SIZE), dtype=np.int32)])
+            self.history_times = np.vstack([self.history_times, np.zeros((n_new, HISTORY_SIZE), dtype=np.int64)])
+            self.history_head = np.concatenate([self.history_head, np.zeros(n_new, dtype=np.int32)])
+            self.day_stamps = np.vstack([self.day_stamps, np.full((n_new, DAY_SLOTS), -1, dtype=np.int32)])
+            self.day_totals = np.concatenate([self.day_totals, np.zeros((n_new, DAY_SLOTS, 3), dtype=np.float32)])
+            self.open_totals = np.vstack([self.open_totals, np.zeros((n_new, 3), dtype=np.float32)])
+            self._row_by_user.update({int(user_id): int(row) for user_id, row in zip(batch_users[new], rows[new])})
+        return rows
+
+    def _video_attributes(self, video_ids: np.ndarray):
+        """Category and duration of each video id, NaN when unknown (caller holds the lock)"""
+        video_ids = np.asarray(video_ids, dtype=np.int64)
+        if len(self.video_ids) == 0:
+            return np.full(video_ids.shape, np.nan), np.full(video_ids.shape, np.nan)
+        positions = np.minimum(np.searchsorted(self.video_ids, video_ids), len(self.video_ids) - 1)
+        found = self.video_ids[positions] == video_ids
+        return (np.where(found, self.video_categories[positions], np.nan),
+                np.where(found, self.video_durations[positions], np.nan))
+
+    def features(self, user_ids: np.ndarray, video_ids: np.ndarray, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Real-time features for (user, video) pairs, one float32 array per feature.
+
+        ``now`` is in local_seconds; users without views in the window get
+        DEFAULT_FEATURES.
+        """
+        now = local_now() if now is None else int(now)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        features = {name: np.full(len(user_ids), value, dtype=np.float32) for name, value in DEFAULT_FEATURES.items()}
+
+        with self._lock:
+            rows = np.fromiter((self._row_by_user.get(int(user_id), -1) for user_id in user_ids),
+                               dtype=np.int64, count=len(user_ids))
+            known = np.flatnonzero(rows >= 0)
+            rows = rows[known]
+            day_stamps = self.day_stamps[rows]
+            day_totals = self.day_totals[rows]
+            open_day = self.open_day
+            open_totals = self.open_totals[rows]
+            history_times = self.history_times[rows]
+            history_categories, history_durations = self._video_attributes(self.history_videos[rows])
+            candidate_categories, candidate_durations = self._video_attributes(np.asarray(video_ids)[known])
+
+        # Rolling counts from the settled daily slots inside the window, plus the open day
+        today = now // 86400
+        in_window = (day_stamps >= today - WINDOW_DAYS) & (day_stamps <= today)
+        open_in_window = today - WINDOW_DAYS <= open_day <= today
+        totals = (day_totals * in_window[:, :, None]).sum(axis=1) + open_totals * open_in_window
+        views, completed, engagement = totals.T
+        active = views > 0
+        if not np.any(active):
+            return features
+        safe_views = np.maximum(views, 1)
+
+        # Streak: consecutive days with views, ending today (or yesterday if nothing yet today)
+        watched_days = np.stack([
+            ((day_stamps == today - offset) & (day_totals[:, :, 0] > 0)).any(axis=1)
+            | ((open_day == today - offset) & (open_totals[:, 0] > 0))
+            for offset in range(DAY_SLOTS)
+        ], axis=1)
+        streak = np.where(
+            watched_days[:, 0],
+            np.cumprod(watched_days, axis=1).sum(axis=1),
+            np.cumprod(watched_days[:, 1:], axis=1).sum(axis=1)
+        )
+
+        # History entries inside the window, matched against the candidate video
+        recent = (history_times > 0) & (history_times >= now - WINDOW_DAYS * 86400)
+        n_recent = recent.sum(axis=1)
+        last_time = np.where(recent, history_times, -1).max(axis=1)
+        last_hour = np.where(n_recent > 0, (last_time // 3600) % 24, DEFAULT_FEATURES['last_watch_hour'])
+
+        category_match = ((history_categories == candidate_categories[:, None]) & recent).sum(axis=1) / np.maximum(n_recent, 1)
+        # Masked mean: users without recent durations get NaN (no match) instead of a mean of nothing
+        timed = recent & (history_durations > 0)
+        n_timed = timed.sum(axis=1)
+        avg_duration = np.divide(
+            np.where(timed, history_durations, 0).sum(axis=1), n_timed,
+            out=np.full(len(n_timed), np.nan), where=n_timed > 0
+        )
+        with np.errstate(invalid='ignore', divide='ignore'):
+            duration_match = 1 - np.abs(candidate_durations - avg_duration) / np.maximum(candidate_durations, avg_duration)
+        duration_match = np.nan_to_num(np.clip(duration_match, 0, 1))
+
+        computed = {
+            'recent_avg_engagement': engagement / safe_views,
+            'recent_watch_count': views,
+            'recent_completion_rate': completed / safe_views,
+            'last_watch_hour': last_hour,
+            'current_streak': streak,
+            'category_match': category_match,
+            'duration_match': duration_match,
+        }
+        for name, values in computed.items():
+            features[name][known[active]] = np.asarray(values)[active]
+        return features
+
+    def recent_categories(self, user_id: int, now: Optional[float] = None) -> List[int]:
+        """Categories of the user's recent history, most watched first"""
+        now = local_now() if now is None else int(now)
+        with self._lock:
+            row = self._row_by_user.get(int(user_id))
+            if row is None:
+                return []
+            recent = self.history_times[row] >= max(now - WINDOW_DAYS * 86400, 1)
+            categories, _ = self._video_attributes(self.history_videos[row][recent])
+        counts = pd.Series(categories).dropna().value_counts()
+        return [int(category_id) for category_id in counts.index]
+
+    def reset(self):
+        """Drop all users, e.g. before replaying the window"""
+        with self._lock:
+            self.user_ids = np.array([], dtype=np.int64)
+            self.history_videos = np.zeros((0, HISTORY_SIZE), dtype=np.int32)
+            self.history_times = np.zeros((0, HISTORY_SIZE), dtype=np.int64)
+            self.history_head = np.array([], dtype=np.int32)
+            self.day_stamps = np.zeros((0, DAY_SLOTS), dtype=np.int32)
+            self.day_totals = np.zeros((0, DAY_SLOTS, 3), dtype=np.float32)
+            self.open_day = -1
+            self.open_totals = np.zeros((0, 3), dtype=np.float32)
+            self.last_view_id = 0
+            self.settled_view_id = 0
+            self._row_by_user = {}
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self.user_ids),
+            "videos": len(self.video_ids),
+            "last_view_id": self.last_view_id,
+            "settled_view_id": self.settled_view_id,
+            "bytes": int(self.history_videos.nbytes + self.history_times.nbytes + self.day_totals.nbytes)
+        }
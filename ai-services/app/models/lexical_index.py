@@ -0,0 +1,96 @@
+"""
+Lexical (BM25) retrieval for LCMTV search
+In-process inverted index over video titles, descriptions and tags
+"""
+import re
+import numpy as np
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..core.logging import get_logger
+
+logger = get_logger("lexical_index")
+
+# Words, numbers and scripture-style references such as "3:16" or "1:1-5"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[:\-][0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms"""
+    if not text:
+        return []
+    return _TOKEN_PATTERN.findall(str(text).lower())
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> Dict[int, float]:
+    """Fuse several ranked id lists: score(d) = sum over lists of 1 / (k + rank)"""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            fused[int(doc)] += 1.0 / (k + rank)
+    return fused
+
+
+class BM25Index:
+    """Okapi BM25 over pre-tokenized documents.
+
+    Postings store precomputed per-document impact scores, so a query is a
+    handful of vectorized scatter-adds, one per query term.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.n_docs = 0
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def build(self, documents: Sequence[List[str]]) -> "BM25Index":
+        """Index a sequence of token lists (position = document index)"""
+        self.n_docs = len(documents)
+        doc_lengths = np.fromiter((len(doc) for doc in documents), dtype=np.float32, count=self.n_docs)
+        avg_length = float(doc_lengths.mean()) if self.n_docs else 0.0
+
+        term_docs: Dict[str, List[int]] = defaultdict(list)
+        term_freqs: Dict[str, List[int]] = defaultdict(list)
+        for doc_idx, tokens in enumerate(documents):
+            for term, freq in Counter(tokens).items():
+                term_docs[term].append(doc_idx)
+                term_freqs[term].append(freq)
+
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(avg_length, 1e-9))
+
+        self.postings = {}
+        for term, docs in term_docs.items():
+            doc_ids = np.asarray(docs, dtype=np.int32)
+            tf = np.asarray(term_freqs[term], dtype=np.float32)
+            df = len(docs)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            impact = idf * tf * (self.k1 + 1) / (tf + length_norm[doc_ids])
+            self.postings[term] = (doc_ids, impact.astype(np.float32))
+
+        logger.info(f"Built BM25 index: {self.n_docs} documents, {len(self.postings)} terms")
+        return self
+
+    def score(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                doc_ids, impact = posting
+                scores[doc_ids] += impact
+        return scores
+
+    def search(self, query: str, top_k: int = 50, row_mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k document indices and scores with a positive BM25 score, optionally restricted to row_mask"""
+        scores = self.score(query)
+        if row_mask is not None:
+            scores[~row_mask] = 0
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return matched, scores[matched]
+
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = np.argsort(-scores[matched], kind="stable")
+        return matched[order], scores[matched[order]]
@@ -0,0 +1,245 @@
+"""
+Implicit-feedback matrix factorization for LCMTV recommendations
+Alternating least squares over weighted video_views (Hu, Koren & Volinsky),
+with float32 user/item factors persisted to the model cache
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from ..core.logging import get_logger
+from .candidate_ranking import top_n
+
+logger = get_logger("matrix_factorization")
+
+# Padded (row, interaction) slots per batched solve; bounds a block's factor stack
+SOLVE_BLOCK_SLOTS = 1 << 16
+
+
+class ImplicitALS:
+    """Implicit ALS model: every observed (user, video) pair is a positive
+    preference with confidence ``1 + alpha * weight``.
+
+    Each half-step solves one small (factors x factors) system per user (or
+    video). Rows with similar interaction counts are solved a block at a
+    time with batched matmul and np.linalg.solve calls, so the per-row work
+    runs in BLAS/LAPACK instead of a Python loop. Top-N is
+    a dot product of the user's factor with every item factor, or an
+    approximate inner-product search when ``hnswlib`` is installed and the
+    catalogue has at least ``ann_min_items`` videos.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        factors: int = 64,
+        regularization: float = 0.05,
+        alpha: float = 10.0,
+        iterations: int = 15,
+        ann_min_items: int = 50000
+    ):
+        self.path = Path(path)
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.ann_min_items = ann_min_items
+
+        self.user_ids = np.array([], dtype=np.int64)
+        self.item_ids = np.array([], dtype=np.int64)
+        self.user_factors = np.zeros((0, factors), dtype=np.float32)
+        self.item_factors = np.zeros((0, factors), dtype=np.float32)
+        # Items each user interacted with (CSR layout), excluded from their recommendations
+        self.seen_indptr = np.zeros(1, dtype=np.int64)
+        self.seen_indices = np.array([], dtype=np.int32)
+        self.trained_at: Optional[float] = None
+
+        self._row_by_user: Dict[int, int] = {}
+        self._ann_index = None
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def fit(self, user_ids: np.ndarray, video_ids: np.ndarray, weights: np.ndarray, seed: int = 42) -> Dict[str, float]:
+        """Train on (user, video, weight) interactions; duplicate pairs keep the highest weight"""
+        start = time.perf_counter()
+        users, user_rows = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        items, item_rows = np.unique(np.asarray(video_ids, dtype=np.int64), return_inverse=True)
+
+        interactions = self._max_duplicates(user_rows, item_rows, weights, (len(users), len(items)))
+
+        rng = np.random.default_rng(seed)
+        user_factors = (rng.standard_normal((len(users), self.factors)) * 0.01).astype(np.float32)
+        item_factors = (rng.standard_normal((len(items), self.factors)) * 0.01).astype(np.float32)
+        item_interactions = interactions.T.tocsr()
+
+        for _ in range(self.iterations):
+            self._solve(interactions, item_factors, user_factors)
+            self._solve(item_interactions, user_factors, item_factors)
+
+        with self._lock:
+            self.user_ids, self.item_ids = users, items
+            self.user_factors, self.item_factors = user_factors, item_factors
+            self.seen_indptr = interactions.indptr.astype(np.int64)
+            self.seen_indices = interactions.indices.astype(np.int32)
+            self.trained_at = time.time()
+            self._index()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Trained ALS on {interactions.nnz} interactions "
+            f"({len(users)} users x {len(items)} videos) in {elapsed:.1f}s"
+        )
+        return {'interactions': int(interactions.nnz), 'users': len(users), 'videos': len(items), 'seconds': round(elapsed, 2)}
+
+    @staticmethod
+    def _max_duplicates(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, shape: Tuple[int, int]) -> sp.csr_matrix:
+        """CSR matrix keeping the highest weight per pair (a plain csr build would sum them)"""
+        weights = np.asarray(weights, dtype=np.float32)
+        keys = rows.astype(np.int64) * shape[1] + cols
+        order = np.lexsort((-weights, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        keep = order[first]
+        return sp.csr_matrix((weights[keep], (rows[keep], cols[keep])), shape=shape)
+
+    def _solve(self, interactions: sp.csr_matrix, fixed: np.ndarray, target: np.ndarray):
+        """Least-squares update of every row of ``target`` given the ``fixed`` factors"""
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors, dtype=np.float32)
+        indptr, indices, data = interactions.indptr, interactions.indices, interactions.data
+        counts = np.diff(indptr)
+        target[counts == 0] = 0
+
+        # Rows sorted by interaction count, so zero-padding a block to its longest row wastes little
+        rows = np.flatnonzero(counts)
+        rows = rows[np.argsort(counts[rows], kind='stable')]
+        start = 0
+        while start < len(rows):
+            end = min(len(rows), start + max(1, SOLVE_BLOCK_SLOTS // counts[rows[start]]))
+            while end - start > 1 and (end - start) * counts[rows[end - 1]] > SOLVE_BLOCK_SLOTS:
+                end = start + max(1, SOLVE_BLOCK_SLOTS // counts[rows[end - 1]])
+            block = rows[start:end]
+            start = end
+
+            lengths = counts[block]
+            valid = np.arange(lengths[-1]) < lengths[:, None]
+            slots = np.where(valid, indptr[block][:, None] + np.arange(lengths[-1]), 0)
+            factors = fixed[indices[slots]] * valid[..., None]
+            confidence = self.alpha * data[slots] * valid
+            # A = YtY + Yu^T (Cu - I) Yu + lambda I ; b = Yu^T Cu p(u), padded slots have zero factors
+            factors_t = factors.transpose(0, 2, 1)
+            system = gram + (factors_t * confidence[:, None, :]) @ factors
+            rhs = factors_t @ (1.0 + confidence)[..., None]
+            target[block] = np.linalg.solve(system, rhs)[..., 0]
+
+    def _index(self):
+        """Rebuild lookups (and the ANN index, when enabled) after factors change"""
+        self._row_by_user = {int(u): i for i, u in enumerate(self.user_ids)}
+        self._ann_index = None
+        if len(self.item_ids) < self.ann_min_items:
+            return
+        try:
+            import hnswlib
+        except ImportError:
+            logger.info("hnswlib not installed, using exact ALS top-N")
+            return
+        index = hnswlib.Index(space='ip', dim=self.factors)
+        index.init_index(max_elements=len(self.item_ids), ef_construction=200, M=16)
+        index.add_items(self.item_factors, np.arange(len(self.item_ids)))
+        index.set_ef(200)
+        self._ann_index = index
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            user_ids=self.user_ids,
+            item_ids=self.item_ids,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            seen_indptr=self.seen_indptr,
+            seen_indices=self.seen_indices,
+            trained_at=np.float64(self.trained_at or time.time())
+        )
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        try:
+            mtime = self.path.stat().st_mtime
+            with np.load(self.path) as data:
+                arrays = {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load ALS factors: {e}")
+            return False
+
+        with self._lock:
+            self.user_ids, self.item_ids = arrays['user_ids'], arrays['item_ids']
+            self.user_factors, self.item_factors = arrays['user_factors'], arrays['item_factors']
+            self.factors = self.item_factors.shape[1]
+            self.seen_indptr, self.seen_indices = arrays['seen_indptr'], arrays['seen_indices']
+            self.trained_at = float(arrays['trained_at'])
+            self._index()
+            self._loaded_mtime = mtime
+        return True
+
+    def refresh(self) -> bool:
+        """Reload if the processing service has trained newer factors"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._loaded_mtime:
+            return self.load()
+        return False
+
+    def has_user(self, user_id: int) -> bool:
+        return user_id in self._row_by_user
+
+    def recommend(
+        self,
+        user_id: int,
+        n: int,
+        exclude: Iterable[int] = (),
+        active_ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Top n (video_id, score) by factor dot product, skipping videos the user already watched.
+
+        With ``active_ids``, videos outside it (deactivated since training) are skipped too.
+        """
+        row = self._row_by_user.get(user_id)
+        if row is None:
+            return []
+        user_vector = self.user_factors[row]
+        seen = self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]
+        excluded = [seen, np.flatnonzero(np.isin(self.item_ids, list(exclude)))]
+        if active_ids is not None:
+            excluded.append(np.flatnonzero(~np.isin(self.item_ids, active_ids)))
+        excluded = np.concatenate(excluded)
+
+        if self._ann_index is not None:
+            k = min(n + len(excluded), len(self.item_ids))
+            labels, distances = self._ann_index.knn_query(user_vector, k=k)
+            keep = ~np.isin(labels[0], excluded)
+            candidates, scores = labels[0][keep][:n].astype(np.int64), 1.0 - distances[0][keep][:n]
+            return [(int(self.item_ids[i]), float(s)) for i, s in zip(candidates, scores)]
+
+        scores = self.item_factors @ user_vector
+        scores[excluded] = -np.inf
+        candidates = np.flatnonzero(np.isfinite(scores))
+        return [(int(self.item_ids[i]), float(scores[i])) for i in candidates[top_n(scores[candidates], n)]]
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "users": len(self.user_ids),
+            "videos": len(self.item_ids),
+            "factors": self.factors,
+            "ann_index": self._ann_index is not None,
+            "trained_at": self.trained_at,
+            "bytes": int(self.user_factors.nbytes + self.item_factors.nbytes)
+        }
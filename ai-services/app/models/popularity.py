@@ -0,0 +1,226 @@
+"""
+Popularity leaderboards for LCMTV recommendations
+Hourly view buckets maintained incrementally by the processing service and
+turned into time-decayed leaderboards per window and category
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.logging import get_logger
+
+logger = get_logger("popularity")
+
+# Window name -> (length in hours, score half-life in hours)
+POPULARITY_WINDOWS: Dict[str, Tuple[int, float]] = {
+    "24h": (24, 6.0),
+    "7d": (24 * 7, 48.0),
+    "30d": (24 * 30, 240.0),
+}
+
+# Buckets older than the longest window are dropped
+RETENTION_HOURS = max(hours for hours, _ in POPULARITY_WINDOWS.values())
+
+# A fully watched view counts twice as much as a bounce
+COMPLETION_WEIGHT = 1.0
+
+
+def _save_npz(path: Path, **arrays):
+    """Write atomically so readers in other processes never see a partial file"""
+    tmp_path = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+class HourlyViewBuckets:
+    """Per-video view counts in one-hour buckets, covering the longest window.
+
+    Stored sparsely as (hour, video_id, views, completed_views) rows; settled
+    views past ``last_view_id`` are aggregated by the database and merged in.
+    The current day's views can still change, so they are kept apart in
+    ``open_buckets``, replaced on every refresh and never persisted.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.buckets = pd.DataFrame({
+            'hour': pd.Series(dtype=np.int32),
+            'video_id': pd.Series(dtype=np.int64),
+            'views': pd.Series(dtype=np.float32),
+            'completed_views': pd.Series(dtype=np.float32),
+        })
+        self.open_buckets = self.buckets.copy()
+        self.last_view_id = 0
+
+    def load(self) -> bool:
+        try:
+            with np.load(self.path) as data:
+                if 'settled_only' not in data.files:
+                    # Written before today's views were kept apart; rebuilt from the database
+                    return False
+                self.buckets = pd.DataFrame({
+                    'hour': data['hour'],
+                    'video_id': data['video_id'],
+                    'views': data['views'],
+                    'completed_views': data['completed_views'],
+                })
+                self.last_view_id = int(data['last_view_id'])
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load popularity buckets: {e}")
+            return False
+
+    def save(self):
+        _save_npz(
+            self.path,
+            hour=self.buckets['hour'].to_numpy(dtype=np.int32),
+            video_id=self.buckets['video_id'].to_numpy(dtype=np.int64),
+            views=self.buckets['views'].to_numpy(dtype=np.float32),
+            completed_views=self.buckets['completed_views'].to_numpy(dtype=np.float32),
+            last_view_id=np.int64(self.last_view_id),
+            settled_only=np.bool_(True)
+        )
+
+    def merge(self, new_buckets: pd.DataFrame, current_hour: int):
+        """Add aggregated (hour, video_id, views, completed_views) rows and expire old hours"""
+        combined = pd.concat([self.buckets, new_buckets[self.buckets.columns]], ignore_index=True)
+        combined = combined[combined['hour'] > current_hour - RETENTION_HOURS]
+        self.buckets = (
+            combined.groupby(['hour', 'video_id'], as_index=False, sort=False)[['views', 'completed_views']]
+            .sum()
+            .astype({'hour': np.int32, 'video_id': np.int64, 'views': np.float32, 'completed_views': np.float32})
+        )
+
+    def replace_open(self, open_buckets: pd.DataFrame):
+        """Swap in the current day's aggregated rows, read afresh on every refresh"""
+        self.open_buckets = open_buckets[list(self.buckets.columns)].astype(self.buckets.dtypes.to_dict())
+
+    def decayed_scores(self, window: str, current_hour: int) -> pd.Series:
+        """Time-decayed popularity per video for one window.
+
+        score = sum over the window's buckets of
+        (views + COMPLETION_WEIGHT * completed_views) * 0.5 ** (age_hours / half_life)
+        """
+        hours, half_life = POPULARITY_WINDOWS[window]
+        buckets = pd.concat([self.buckets, self.open_buckets], ignore_index=True)
+        age = current_hour - buckets['hour'].to_numpy(dtype=np.int64)
+        in_window = (age >= 0) & (age < hours)
+
+        buckets = buckets[in_window]
+        weight = np.exp2(-age[in_window] / half_life)
+        engagement = buckets['views'].to_numpy() + COMPLETION_WEIGHT * buckets['completed_views'].to_numpy()
+        return pd.Series(engagement * weight, index=buckets['video_id'].to_numpy()).groupby(level=0).sum()
+
+
+class PopularityLeaderboard:
+    """Ranked videos per (window, category), served from memory.
+
+    The processing service writes one file per refresh; every service process
+    re-reads it when its mtime changes. A category leaderboard is the global
+    ranking filtered to that category, sliced once at load time.
+    """
+
+    def __init__(self, path: Path, max_per_category: int = 200):
+        self.path = Path(path)
+        self.max_per_category = max_per_category
+        self.generated_at: Optional[float] = None
+        self._boards: Dict[Tuple[str, Optional[int]], Tuple[np.ndarray, np.ndarray]] = {}
+        self._score_by_video: Dict[str, pd.Series] = {}
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(
+        buckets: HourlyViewBuckets,
+        video_categories: pd.Series,
+        current_hour: int
+    ) -> Dict[str, np.ndarray]:
+        """Arrays for every window, ranked best first and restricted to active videos"""
+        arrays: Dict[str, np.ndarray] = {}
+        for window in POPULARITY_WINDOWS:
+            scores = buckets.decayed_scores(window, current_hour)
+            scores = scores[scores.index.isin(video_categories.index)].sort_values(ascending=False, kind="stable")
+            arrays[f"{window}_video_ids"] = scores.index.to_numpy(dtype=np.int64)
+            arrays[f"{window}_scores"] = scores.to_numpy(dtype=np.float32)
+            arrays[f"{window}_category_ids"] = (
+                video_categories.reindex(scores.index).fillna(-1).to_numpy(dtype=np.int64)
+            )
+        return arrays
+
+    def save(self, arrays: Dict[str, np.ndarray]):
+        _save_npz(self.path, generated_at=np.float64(time.time()), **arrays)
+
+    def load(self) -> bool:
+        try:
+            mtime = self.path.stat().st_mtime
+            with np.load(self.path) as data:
+                arrays = {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load popularity leaderboard: {e}")
+            return False
+
+        boards = {}
+        score_by_video = {}
+        for window in POPULARITY_WINDOWS:
+            video_ids = arrays.get(f"{window}_video_ids")
+            if video_ids is None:
+                continue
+            scores = arrays[f"{window}_scores"]
+            categories = arrays[f"{window}_category_ids"]
+            boards[(window, None)] = (video_ids, scores)
+            score_by_video[window] = pd.Series(scores, index=video_ids)
+            for category_id in np.unique(categories):
+                rows = np.flatnonzero(categories == category_id)[:self.max_per_category]
+                boards[(window, int(category_id))] = (video_ids[rows], scores[rows])
+
+        with self._lock:
+            self._boards = boards
+            self._score_by_video = score_by_video
+            self.generated_at = float(arrays.get('generated_at', 0.0))
+            self._loaded_mtime = mtime
+        return True
+
+    def refresh(self) -> bool:
+        """Reload if the processing service has written a newer leaderboard"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._loaded_mtime:
+            return self.load()
+        return False
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._boards
+
+    def top(self, n: int, window: str = "7d", category_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top n (video_id, score) pairs; empty when the window or category is unknown"""
+        board = self._boards.get((window, category_id))
+        if board is None:
+            return []
+        video_ids, scores = board
+        return [(int(video_id), float(score)) for video_id, score in zip(video_ids[:n], scores[:n])]
+
+    def scores_for(self, video_ids: np.ndarray, window: str = "7d") -> np.ndarray:
+        """Leaderboard score of each given video (0 for unranked videos)"""
+        scores = self._score_by_video.get(window)
+        if scores is None:
+            return np.zeros(len(video_ids), dtype=np.float32)
+        return scores.reindex(video_ids).fillna(0).to_numpy(dtype=np.float32)
+
+    def get_stats(self) -> Dict[str, object]:
+        return {
+            "windows": {window: len(self._boards.get((window, None), ((),))[0]) for window in POPULARITY_WINDOWS},
+            "categories": len({category for _, category in self._boards if category is not None}),
+            "generated_at": self.generated_at
+        }
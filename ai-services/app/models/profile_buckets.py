@@ -0,0 +1,375 @@
+"""
+Incremental user profiles for LCMTV personalization
+Per-user daily buckets of mergeable aggregates (counts, sums, watch-hour and
+category histograms); a profile is the sum of the user's buckets in the window
+"""
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.logging import get_logger
+
+logger = get_logger("profile_buckets")
+
+# Summed per (user, day); means are recovered as sum / count at profile time
+SUM_COLUMNS = (
+    'views', 'watch_duration', 'engagement_sum', 'completed', 'watch_pct_sum', 'weekend_views',
+    'duration_sum', 'duration_count', 'published_age_sum', 'published_age_count', 'freshness_sum',
+)
+HOUR_COLUMNS = tuple(f'h{hour}' for hour in range(24))
+CATEGORY_SUM_COLUMNS = ('views', 'engagement_sum')
+
+# 1970-01-01 was a Thursday (dayofweek 3)
+EPOCH_DAY_OF_WEEK = 3
+
+
+def epoch_day(timestamps: pd.Series) -> np.ndarray:
+    """Days since the Unix epoch of naive timestamps"""
+    return (timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64) // 86400).astype(np.int32)
+
+
+def bucket_path(cache_dir: Path, shard: int = 0, n_shards: int = 1) -> Path:
+    """Bucket file of one user shard (users with user_id % n_shards == shard)"""
+    name = "profile_buckets.npz" if n_shards == 1 else f"profile_buckets-{shard}of{n_shards}.npz"
+    return Path(cache_dir) / name
+
+
+def delta_path(cache_dir: Path, shard: int = 0, n_shards: int = 1) -> Path:
+    """Pending new-view buckets of one user shard, written by the shared view read"""
+    name = "profile_delta.npz" if n_shards == 1 else f"profile_delta-{shard}of{n_shards}.npz"
+    return Path(cache_dir) / name
+
+
+class DailyProfileBuckets:
+    """Per-user daily aggregates covering the profile window.
+
+    ``days`` holds one row per (user_id, day) with SUM_COLUMNS and a 24-bin
+    watch-hour histogram; ``categories`` one row per (user_id, day,
+    category_id). New views past ``last_view_id`` are aggregated and summed
+    in, buckets older than the window are dropped, and only users touched by
+    either change need their profile rebuilt.
+
+    ``last_view_id`` only covers settled views, from days before the
+    database's current day. Views of ``open_day`` onwards can still change,
+    so their buckets are dropped by ``reopen`` and summed in again from a
+    fresh read on every refresh.
+    """
+
+    def __init__(self, path: Path, window_days: Optional[int] = 30):
+        self.path = Path(path)
+        self.window_days = window_days
+        self.days = self._empty_days()
+        self.categories = self._empty_categories()
+        self.category_names: Dict[int, str] = {}
+        self.last_view_id = 0
+        self.open_day: Optional[int] = None
+
+    @staticmethod
+    def _empty_days() -> pd.DataFrame:
+        columns = {'user_id': pd.Series(dtype=np.int32), 'day': pd.Series(dtype=np.int32)}
+        columns.update({col: pd.Series(dtype=np.float32) for col in SUM_COLUMNS})
+        columns.update({col: pd.Series(dtype=np.int32) for col in HOUR_COLUMNS})
+        return pd.DataFrame(columns)
+
+    @staticmethod
+    def _empty_categories() -> pd.DataFrame:
+        return pd.DataFrame({
+            'user_id': pd.Series(dtype=np.int32),
+            'day': pd.Series(dtype=np.int32),
+            'category_id': pd.Series(dtype=np.int32),
+            'views': pd.Series(dtype=np.float32),
+            'engagement_sum': pd.Series(dtype=np.float32),
+        })
+
+    def _read(self, keys: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, np.ndarray]]:
+        """Saved arrays (only ``keys`` when given), or None when the buckets have to be rebuilt"""
+        try:
+            with np.load(self.path) as data:
+                # window_days=None reads whatever window was persisted
+                if self.window_days is not None and int(data['window_days']) != self.window_days:
+                    logger.info(f"Profile window changed to {self.window_days} days, buckets will be rebuilt")
+                    return None
+                if 'open_day' not in data.files:
+                    logger.info("Profile buckets predate open-day tracking, buckets will be rebuilt")
+                    return None
+                return {key: data[key] for key in (keys or data.files)}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to load profile buckets: {e}")
+            return None
+
+    def saved_view_id(self) -> int:
+        """``last_view_id`` of the saved buckets without loading them; 0 when they would be rebuilt"""
+        arrays = self._read(('last_view_id',))
+        return int(arrays['last_view_id']) if arrays is not None else 0
+
+    def load(self) -> bool:
+        arrays = self._read()
+        if arrays is None:
+            return False
+        self.window_days = int(arrays['window_days'])
+
+        self.days = pd.DataFrame({col: arrays[f'days_{col}'] for col in self._empty_days().columns})
+        self.categories = pd.DataFrame({col: arrays[f'categories_{col}'] for col in self._empty_categories().columns})
+        self.category_names = dict(zip(arrays['category_ids'].tolist(), arrays['category_names'].tolist()))
+        self.last_view_id = int(arrays['last_view_id'])
+        self.open_day = int(arrays['open_day']) if int(arrays['open_day']) >= 0 else None
+        return True
+
+    def save(self):
+        arrays = {f'days_{col}': self.days[col].to_numpy() for col in self.days.columns}
+        arrays.update({f'categories_{col}': self.categories[col].to_numpy() for col in self.categories.columns})
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            category_ids=np.array(list(self.category_names), dtype=np.int32),
+            category_names=np.array(list(self.category_names.values()), dtype=str),
+            window_days=np.int32(self.window_days),
+            last_view_id=np.int64(self.last_view_id),
+            open_day=np.int32(-1 if self.open_day is None else self.open_day),
+            **arrays
+        )
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.days = self._empty_days()
+        self.categories = self._empty_categories()
+        self.category_names = {}
+        self.last_view_id = 0
+        self.open_day = None
+
+    @staticmethod
+    def aggregate(views: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Day and category bucket rows from view rows.
+
+        ``views`` needs user_id, watched_at, watch_duration, watch_percentage,
+        completed, engagement_score, video_duration, days_since_published,
+        content_freshness and category_id.
+        """
+        day = epoch_day(views['watched_at'])
+        hour = views['watched_at'].dt.hour.to_numpy()
+        weekend = ((day + EPOCH_DAY_OF_WEEK) % 7) >= 5
+
+        rows = pd.DataFrame({
+            'user_id': views['user_id'].to_numpy(dtype=np.int32),
+            'day': day,
+            'views': np.ones(len(views), dtype=np.float32),
+            'watch_duration': views['watch_duration'].to_numpy(dtype=np.float32),
+            'engagement_sum': views['engagement_score'].to_numpy(dtype=np.float32),
+            'completed': views['completed'].to_numpy(dtype=np.float32),
+            'watch_pct_sum': views['watch_percentage'].to_numpy(dtype=np.float32),
+            'weekend_views': weekend.astype(np.float32),
+            'duration_sum': views['video_duration'].fillna(0).to_numpy(dtype=np.float32),
+            'duration_count': views['video_duration'].notna().to_numpy(dtype=np.float32),
+            'published_age_sum': views['days_since_published'].fillna(0).to_numpy(dtype=np.float32),
+            'published_age_count': views['days_since_published'].notna().to_numpy(dtype=np.float32),
+            'freshness_sum': views['content_freshness'].fillna(0).to_numpy(dtype=np.float32),
+        })
+        hours = np.zeros((len(views), 24), dtype=np.int32)
+        hours[np.arange(len(views)), hour] = 1
+        rows = pd.concat([rows, pd.DataFrame(hours, columns=list(HOUR_COLUMNS))], axis=1)
+        day_rows = rows.groupby(['user_id', 'day'], as_index=False, sort=False).sum()
+
+        has_category = views['category_id'].notna().to_numpy()
+        category_rows = (
+            pd.DataFrame({
+                'user_id': rows['user_id'][has_category],
+                'day': day[has_category],
+                'category_id': views['category_id'][has_category].to_numpy(dtype=np.int32),
+                'views': rows['views'][has_category],
+                'engagement_sum': rows['engagement_sum'][has_category],
+            })
+            .groupby(['user_id', 'day', 'category_id'], as_index=False, sort=False)
+            .sum()
+        )
+        return day_rows, category_rows
+
+    def reopen(self) -> Set[int]:
+        """Drop the buckets of days that were still open at the last refresh; returns their user ids"""
+        if self.open_day is None:
+            return set()
+        reopened = self.days['day'] >= self.open_day
+        touched = set(self.days.loc[reopened, 'user_id'].tolist())
+        self.days = self.days[~reopened].reset_index(drop=True)
+        self.categories = self.categories[self.categories['day'] < self.open_day].reset_index(drop=True)
+        self.open_day = None
+        return touched
+
+    def merge(self, day_rows: pd.DataFrame, category_rows: pd.DataFrame, current_day: int) -> Set[int]:
+        """Sum new bucket rows in, expire days outside the window; returns the touched user ids"""
+        first_day = current_day - self.window_days + 1
+        expired_users = set(self.days.loc[self.days['day'] < first_day, 'user_id'].tolist())
+        touched = expired_users | set(day_rows['user_id'].tolist())
+
+        days = pd.concat([self.days, day_rows[self.days.columns]], ignore_index=True)
+        days = days[days['day'] >= first_day]
+        self.days = (
+            days.groupby(['user_id', 'day'], as_index=False, sort=False).sum()
+            .astype(self._empty_days().dtypes.to_dict())
+        )
+
+        categories = pd.concat([self.categories, category_rows[self.categories.columns]], ignore_index=True)
+        categories = categories[categories['day'] >= first_day]
+        self.categories = (
+            categories.groupby(['user_id', 'day', 'category_id'], as_index=False, sort=False).sum()
+            .astype(self._empty_categories().dtypes.to_dict())
+        )
+        return touched
+
+    def profiles(self, user_ids: Iterable[int]) -> pd.DataFrame:
+        """Profiles in the build_user_profiles layout for the given users (those with buckets)"""
+        user_ids = np.fromiter(user_ids, dtype=np.int64)
+        days = self.days[self.days['user_id'].isin(user_ids)]
+        if days.empty:
+            return pd.DataFrame()
+
+        totals = days.groupby('user_id')[list(SUM_COLUMNS + HOUR_COLUMNS)].sum()
+        views = totals['views']
+        user_codes = pd.factorize(days['user_id'], sort=True)[0]
+        day_counts = np.zeros((len(totals), 7), dtype=np.float64)
+        np.add.at(day_counts, (user_codes, (days['day'].to_numpy() + EPOCH_DAY_OF_WEEK) % 7), days['views'].to_numpy())
+        hour_of_day = totals[list(HOUR_COLUMNS)].to_numpy().argmax(axis=1)
+        day_of_week = day_counts.argmax(axis=1)
+
+        profiles = pd.DataFrame({
+            'video_id': views.astype(np.int32),
+            'watch_duration': totals['watch_duration'],
+            'engagement_score': totals['engagement_sum'] / views,
+            'is_weekend': totals['weekend_views'] / views,
+            'avg_watch_pct': totals['watch_pct_sum'] / views,
+            'completion_rate': totals['completed'] / views,
+            'total_videos': views.astype(np.int32),
+            'preferred_duration': totals['duration_sum'] / totals['duration_count'].replace(0, np.nan),
+            'freshness_preference': totals['published_age_sum'] / totals['published_age_count'].replace(0, np.nan),
+            'avg_content_freshness': totals['freshness_sum'] / totals['published_age_count'].replace(0, np.nan),
+        }, index=totals.index).round(4)
+        profiles['hour_of_day'] = profiles['preferred_hour'] = hour_of_day
+        profiles['day_of_week'] = profiles['preferred_day'] = day_of_week
+        profiles['weekend_preference'] = profiles['is_weekend']
+
+        profiles = profiles.join(self._category_preferences(user_ids))
+        logger.info(f"Built {len(profiles)} profiles from daily buckets")
+        return profiles.reset_index()
+
+    def _category_preferences(self, user_ids: np.ndarray) -> pd.DataFrame:
+        """Favorite category and top 5 categories by weighted engagement, as build_user_profiles ranks them"""
+        categories = self.categories[self.categories['user_id'].isin(user_ids)]
+        totals = categories.groupby(['user_id', 'category_id'], as_index=False)[list(CATEGORY_SUM_COLUMNS)].sum()
+        totals['category_name'] = totals['category_id'].map(self.category_names)
+        totals['weighted_score'] = (
+            (totals['engagement_sum'] / totals['views']) * 0.7 +
+            (totals['views'] / totals.groupby('user_id')['views'].transform('max')) * 0.3
+        )
+
+        favorite = (
+            totals.sort_values(['user_id', 'views', 'category_id'], ascending=[True, False, True], kind='stable')
+            .drop_duplicates('user_id')
+            .set_index('user_id')[['category_id', 'category_name']]
+        )
+
+        top = totals.sort_values(['user_id', 'weighted_score'], ascending=[True, False], kind='stable')
+        top = top.groupby('user_id').head(5)
+        top['rank'] = top.groupby('user_id').cumcount() + 1
+        wide = top.pivot(index='user_id', columns='rank', values='category_name')
+        wide.columns = [f'preferred_category_{rank}' for rank in wide.columns]
+        return favorite.join(wide)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "users": int(self.days['user_id'].nunique()),
+            "day_buckets": len(self.days),
+            "category_buckets": len(self.categories),
+            "last_view_id": self.last_view_id,
+            "open_day": self.open_day,
+        }
+
+
+class ProfileDelta:
+    """Bucket rows of one shard's new views, handed from the shared view read to the shard.
+
+    ``since`` is the shard's ``last_view_id`` the views were read past (0 for
+    a rebuild from the whole window); ``last_view_id`` and ``open_day`` are
+    the watermark and first open day the views move the buckets to.
+    """
+
+    def __init__(self, path: Path, since: int = 0):
+        self.path = Path(path)
+        self.since = since
+        self.last_view_id = since
+        self.open_day: Optional[int] = None
+        self.views = 0
+        self.category_names: Dict[int, str] = {}
+        self.days = DailyProfileBuckets._empty_days()
+        self.categories = DailyProfileBuckets._empty_categories()
+        self._day_rows = []
+        self._category_rows = []
+
+    def add(self, views: pd.DataFrame):
+        """Aggregate a block of view rows (with ``id`` and ``settled``) into bucket rows"""
+        settled = views['settled'].astype(bool)
+        if settled.any():
+            self.last_view_id = max(self.last_view_id, int(views.loc[settled, 'id'].max()))
+        if not settled.all():
+            open_day = int(epoch_day(views.loc[~settled, 'watched_at']).min())
+            self.open_day = open_day if self.open_day is None else min(self.open_day, open_day)
+        named = views[['category_id', 'category_name']].dropna().drop_duplicates('category_id')
+        self.category_names.update(zip(named['category_id'].astype(int), named['category_name'].astype(str)))
+
+        days, categories = DailyProfileBuckets.aggregate(views)
+        self._day_rows.append(days)
+        self._category_rows.append(categories)
+        self.views += len(views)
+
+    def apply(self, buckets: DailyProfileBuckets, current_day: int) -> Set[int]:
+        """Move the buckets' watermark and sum the rows in; returns the touched user ids"""
+        buckets.last_view_id = max(buckets.last_view_id, self.last_view_id)
+        if self.open_day is not None:
+            buckets.open_day = self.open_day if buckets.open_day is None else min(buckets.open_day, self.open_day)
+        buckets.category_names.update(self.category_names)
+        return buckets.merge(self.days, self.categories, current_day)
+
+    def save(self):
+        if self._day_rows:
+            self.days = pd.concat(self._day_rows, ignore_index=True)
+            self.categories = pd.concat(self._category_rows, ignore_index=True)
+            self._day_rows, self._category_rows = [], []
+        arrays = {f'days_{col}': self.days[col].to_numpy() for col in self.days.columns}
+        arrays.update({f'categories_{col}': self.categories[col].to_numpy() for col in self.categories.columns})
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            category_ids=np.array(list(self.category_names), dtype=np.int32),
+            category_names=np.array(list(self.category_names.values()), dtype=str),
+            since=np.int64(self.since),
+            last_view_id=np.int64(self.last_view_id),
+            open_day=np.int32(-1 if self.open_day is None else self.open_day),
+            views=np.int64(self.views),
+            **arrays
+        )
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        try:
+            with np.load(self.path) as data:
+                arrays = {key: data[key] for key in data.files}
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load profile delta: {e}")
+            return False
+
+        self.days = pd.DataFrame({col: arrays[f'days_{col}'] for col in self.days.columns})
+        self.categories = pd.DataFrame({col: arrays[f'categories_{col}'] for col in self.categories.columns})
+        self.category_names = dict(zip(arrays['category_ids'].tolist(), arrays['category_names'].tolist()))
+        self.since = int(arrays['since'])
+        self.last_view_id = int(arrays['last_view_id'])
+        self.open_day = int(arrays['open_day']) if int(arrays['open_day']) >= 0 else None
+        self.views = int(arrays['views'])
+        return True
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
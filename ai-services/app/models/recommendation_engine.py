@@ -9,8 +9,17 @@ from sklearn.preprocessing import StandardScaler
 from typing import List, Dict, Any, Optional, Tuple
 import logging
 from datetime import datetime, timedelta
+from pathlib import Path
+from ..core.config import settings
 from ..core.database import execute_query, get_user_behavior_data, update_recommendation_cache, get_cached_recommendations
 from ..core.logging import get_logger
+from ..utils.analytics_snapshot import AnalyticsSnapshot, engagement_tier, get_snapshot
+from ..utils.data_pipeline import data_pipeline
+from .candidate_ranking import GENERATOR_REASONS, CandidatePool, StageTimer, rerank, scale_to_unit, top_n
+from .matrix_factorization import ImplicitALS
+from .popularity import PopularityLeaderboard
+from .taste_vectors import TasteVectorStore, load_video_embeddings
+from .trending import TrendingDetector
 
 logger = get_logger("recommendation")
 
@@ -24,6 +33,135 @@ class RecommendationEngine:
         self.user_data_cache = {}
         self.cache_timeout = 3600  # 1 hour
 
+        # Semantic index embeddings and user taste vectors, read from the model cache
+        self.video_ids = np.array([], dtype=np.int64)
+        self.video_embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._row_by_video = pd.Series(dtype=np.int64)
+        self.taste_vectors = TasteVectorStore(Path(settings.model_cache_dir) / "taste_vectors.npz")
+        self.taste_weight = settings.taste_blend_weight
+
+        # Per-video engagement aligned with video_ids, rebuilt with the matrices
+        self.engagement_stats = pd.DataFrame()
+        self.engagement_scores = np.array([], dtype=np.float32)
+        self.active_rows = np.array([], dtype=bool)
+
+        # Time-decayed leaderboards written by the processing service
+        self.popularity = PopularityLeaderboard(Path(settings.model_cache_dir) / "popularity.npz")
+        self.trending = TrendingDetector(Path(settings.model_cache_dir) / "trending.npz")
+
+        # Implicit ALS factors trained by the processing service
+        self.als = ImplicitALS(
+            Path(settings.model_cache_dir) / "als_factors.npz",
+            ann_min_items=settings.als_ann_min_items
+        )
+
+        # Upper bound on candidates each generator contributes to hybrid re-ranking
+        self.candidate_pool_size = 50
+
+    def load_video_embeddings(self) -> int:
+        """(Re)load the semantic index embeddings used for taste recommendations"""
+        self.video_ids, self.video_embeddings = load_video_embeddings(Path(settings.model_cache_dir))
+        self._row_by_video = pd.Series(np.arange(len(self.video_ids)), index=self.video_ids)
+        self.taste_vectors.load()
+        logger.info(f"Loaded {len(self.video_ids)} video embeddings for taste recommendations")
+        self._align_engagement_scores()
+        return len(self.video_ids)
+
+    def build_engagement_stats(self) -> pd.DataFrame:
+        """Aggregate per-video engagement once for every active video.
+
+        Content-based recommendations read these instead of aggregating
+        video_views for the context video's category on each call.
+        """
+        logger.info("Building per-video engagement stats")
+
+        query = """
+        SELECT
+            v.id as video_id,
+            v.category_id,
+            c.name as category_name,
+            v.view_count,
+            v.like_count,
+            v.duration,
+            vs.avg_completion_rate,
+            vs.unique_viewers,
+            vs.total_views
+        FROM videos v
+        LEFT JOIN categories c ON v.category_id = c.id
+        LEFT JOIN (
+            SELECT
+                video_id,
+                AVG(watch_percentage) as avg_completion_rate,
+                COUNT(DISTINCT user_id) as unique_viewers,
+                COUNT(*) as total_views
+            FROM video_views
+            GROUP BY video_id
+        ) vs ON vs.video_id = v.id
+        WHERE v.is_active = 1
+        """
+
+        snapshot = get_snapshot()
+        stats = self._snapshot_engagement_stats(snapshot) if snapshot is not None else pd.DataFrame(execute_query(query) or [])
+        if stats.empty:
+            logger.warning("No videos found for engagement stats")
+            self.engagement_stats = pd.DataFrame()
+            self._align_engagement_scores()
+            return self.engagement_stats
+
+        stats = stats.set_index('video_id')
+        for column in ('view_count', 'like_count', 'avg_completion_rate', 'unique_viewers', 'total_views'):
+            stats[column] = pd.to_numeric(stats[column], errors='coerce').fillna(0).astype(np.float32)
+        stats['duration'] = pd.to_numeric(stats['duration'], errors='coerce')
+
+        # Same ingredients as the old per-call ORDER BY, each scaled to 0-1
+        engagement_rate = (stats['like_count'] / stats['view_count'].where(stats['view_count'] > 0)).fillna(0)
+        max_views = max(float(stats['total_views'].max()), 1.0)
+        stats['engagement_score'] = (
+            (stats['avg_completion_rate'] / 100).clip(0, 1) * 0.4 +
+            engagement_rate.clip(0, 1) * 0.4 +
+            (np.log1p(stats['total_views']) / np.log1p(max_views)) * 0.2
+        ).astype(np.float32)
+
+        self.engagement_stats = stats
+        self._align_engagement_scores()
+        logger.info(f"Built engagement stats for {len(stats)} videos")
+        return stats
+
+    @staticmethod
+    def _snapshot_engagement_stats(snapshot: AnalyticsSnapshot) -> pd.DataFrame:
+        """The engagement stats query evaluated over the analytics snapshot"""
+        videos = snapshot.table('videos', ['id', 'category_id', 'view_count', 'like_count', 'duration', 'is_active'])
+        videos = videos[videos['is_active'] == 1].drop(columns='is_active')
+        if videos.empty:
+            return pd.DataFrame()
+        categories = snapshot.table('categories', ['id', 'name'])
+        views = snapshot.views(columns=['video_id', 'user_id', 'watch_percentage'])
+        view_stats = views.groupby('video_id').agg(
+            avg_completion_rate=('watch_percentage', 'mean'),
+            unique_viewers=('user_id', 'nunique'),
+            total_views=('video_id', 'size')
+        ) if not views.empty else pd.DataFrame(columns=['avg_completion_rate', 'unique_viewers', 'total_views'])
+
+        return (
+            videos.rename(columns={'id': 'video_id'})
+            .merge(categories.rename(columns={'id': 'category_id', 'name': 'category_name'}), on='category_id', how='left')
+            .merge(view_stats, left_on='video_id', right_index=True, how='left')
+        )
+
+    def _align_engagement_scores(self):
+        """Engagement score per embedding row (0 for videos without stats)"""
+        if self.engagement_stats.empty:
+            self.engagement_scores = np.zeros(len(self.video_ids), dtype=np.float32)
+            self.active_rows = np.ones(len(self.video_ids), dtype=bool)
+            return
+        self.active_rows = np.isin(self.video_ids, self.engagement_stats.index.to_numpy())
+        self.engagement_scores = (
+            self.engagement_stats['engagement_score']
+            .reindex(self.video_ids)
+            .fillna(0)
+            .to_numpy(dtype=np.float32)
+        )
+
     def build_user_item_matrix(self) -> pd.DataFrame:
         """Build user-item interaction matrix from video_views data"""
         logger.info("Building user-item interaction matrix")
@@ -48,14 +186,19 @@ class RecommendationEngine:
         AND vv.created_at >= DATE_SUB(NOW(), INTERVAL 90 DAY)  -- Last 90 days
         """
 
-        results = execute_query(query)
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            df = snapshot.active_user_views(90, ['completed', 'watch_percentage', 'created_at'])
+            if not df.empty:
+                df['interaction_score'] = engagement_tier(df['completed'], df['watch_percentage'])
+                df['days_since_watch'] = (pd.Timestamp.now() - df['created_at']).dt.days
+        else:
+            df = pd.DataFrame(execute_query(query) or [])
 
-        if not results:
+        if df.empty:
             logger.warning("No user interaction data found")
             return pd.DataFrame()
 
-        df = pd.DataFrame(results)
-
         # Apply time decay (recent interactions weigh more)
         df['time_weight'] = np.exp(-df['days_since_watch'] / 30)  # 30-day half-life
         df['weighted_score'] = df['interaction_score'] * df['time_weight']
@@ -91,83 +234,62 @@ class RecommendationEngine:
         logger.info(f"Calculated similarity matrix for {self.item_similarity_matrix.shape[0]} items")
         return self.item_similarity_matrix
 
-    def get_collaborative_recommendations(
+    def _collaborative_scores(
         self,
         user_id: int,
-        n_recommendations: int = 10,
         min_similarity_threshold: float = 0.1
-    ) -> List[Dict[str, Any]]:
-        """Generate collaborative filtering recommendations"""
-        logger.info(f"Generating collaborative recommendations for user {user_id}")
+    ) -> Optional[Tuple[pd.Series, np.ndarray]]:
+        """Item-CF score and supporting-video count for every item, or None without history.
 
+        score(j) = sum over watched items i with sim(i, j) >= threshold of
+        rating(i) * sim(i, j), as one matrix product over the watched rows.
+        Watched items score 0.
+        """
         if self.user_item_matrix is None:
             self.build_user_item_matrix()
-
         if self.user_item_matrix.empty or user_id not in self.user_item_matrix.index:
-            logger.info(f"No collaborative data for user {user_id}, using popular recommendations")
-            return self.get_popular_recommendations(n_recommendations)
+            return None
+        if self.item_similarity_matrix is None:
+            self.calculate_item_similarity()
 
-        user_ratings = self.user_item_matrix.loc[user_id]
+        ratings = self.user_item_matrix.loc[user_id].to_numpy(dtype=np.float64)
+        watched = np.flatnonzero(ratings > 0)
+        if len(watched) == 0:
+            return None
 
-        # Find videos the user has interacted with
-        watched_videos = user_ratings[user_ratings > 0].index.tolist()
+        similar = self.item_similarity_matrix[watched] >= min_similarity_threshold
+        contributions = np.where(similar, self.item_similarity_matrix[watched], 0.0)
+        scores = ratings[watched] @ contributions
+        support = similar.sum(axis=0)
+        scores[watched] = 0
+        support[watched] = 0
+
+        return pd.Series(scores, index=self.user_item_matrix.columns), support
+
+    def get_collaborative_recommendations(
+        self,
+        user_id: int,
+        n_recommendations: int = 10,
+        min_similarity_threshold: float = 0.1
+    ) -> List[Dict[str, Any]]:
+        """Generate collaborative filtering recommendations"""
+        logger.info(f"Generating collaborative recommendations for user {user_id}")
 
-        if not watched_videos:
+        collaborative = self._collaborative_scores(user_id, min_similarity_threshold)
+        if collaborative is None:
+            logger.info(f"No collaborative data for user {user_id}, using popular recommendations")
             return self.get_popular_recommendations(n_recommendations)
 
-        # Calculate recommendation scores
-        recommendations = {}
-
-        for video_id in watched_videos:
-            user_rating = user_ratings[video_id]
-
-            if video_id not in self.user_item_matrix.columns:
-                continue
-
-            # Find similar videos
-            video_idx = self.user_item_matrix.columns.get_loc(video_id)
-            similar_scores = self.item_similarity_matrix[video_idx]
-
-            # Weight by user's rating and similarity
-            for idx, similarity in enumerate(similar_scores):
-                if similarity < min_similarity_threshold:
-                    continue
-
-                similar_video_id = self.user_item_matrix.columns[idx]
-
-                # Don't recommend videos already watched
-                if similar_video_id in watched_videos:
-                    continue
-
-                weighted_score = similarity * user_rating
-
-                if similar_video_id not in recommendations:
-                    recommendations[similar_video_id] = {
-                        'score': 0,
-                        'similarities': []
-                    }
-
-                recommendations[similar_video_id]['score'] += weighted_score
-                recommendations[similar_video_id]['similarities'].append({
-                    'video_id': video_id,
-                    'similarity': similarity,
-                    'user_rating': user_rating
-                })
-
-        # Convert to sorted list
-        sorted_recommendations = sorted(
-            recommendations.items(),
-            key=lambda x: x[1]['score'],
-            reverse=True
-        )[:n_recommendations]
-
-        result = []
-        for video_id, data in sorted_recommendations:
-            result.append({
-                'video_id': int(video_id),
-                'score': float(data['score']),
-                'reason': f"Based on {len(data['similarities'])} similar videos you've watched"
-            })
+        scores, support = collaborative
+        candidates = np.flatnonzero(support > 0)
+        result = [
+            {
+                'video_id': int(scores.index[idx]),
+                'score': float(scores.iat[idx]),
+                'reason': f"Based on {int(support[idx])} similar videos you've watched"
+            }
+            for idx in candidates[top_n(scores.to_numpy()[candidates], n_recommendations)]
+        ]
 
         logger.info(f"Generated {len(result)} collaborative recommendations for user {user_id}")
         return result
@@ -175,11 +297,62 @@ class RecommendationEngine:
     def get_content_based_recommendations(
         self,
         video_id: int,
-        n_recommendations: int = 10
+        n_recommendations: int = 10,
+        similarity_weight: float = 0.7
     ) -> List[Dict[str, Any]]:
-        """Generate content-based recommendations using category and metadata"""
+        """Generate content-based recommendations from the embedding index.
+
+        Candidates are the context video's nearest neighbors in the semantic
+        index, re-scored with the precomputed engagement stats, so a call is an
+        in-memory lookup. Videos that are not indexed yet fall back to the
+        category query.
+        """
         logger.info(f"Generating content-based recommendations for video {video_id}")
 
+        rows = np.flatnonzero(self.video_ids == video_id)
+        if len(rows) == 0:
+            return self._get_category_recommendations(video_id, n_recommendations)
+
+        context_row = rows[0]
+        similarities = self.video_embeddings @ self.video_embeddings[context_row]
+        scores = similarity_weight * similarities + (1 - similarity_weight) * self.engagement_scores
+        scores[context_row] = -np.inf
+
+        # Only recommend videos that are still active
+        scores[~self.active_rows] = -np.inf
+
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if len(candidates) > n_recommendations:
+            candidates = candidates[np.argpartition(-scores[candidates], n_recommendations - 1)[:n_recommendations]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        category = self._video_category(video_id)
+        recommendations = []
+        for idx in candidates:
+            candidate_id = int(self.video_ids[idx])
+            if category and self._video_category(candidate_id) == category:
+                reason = f"Popular in {category} category"
+            else:
+                reason = "Similar to the video you're watching"
+            recommendations.append({
+                'video_id': candidate_id,
+                'score': float(scores[idx]),
+                'reason': reason
+            })
+
+        return recommendations
+
+    def _video_category(self, video_id: int) -> Optional[str]:
+        if self.engagement_stats.empty or video_id not in self.engagement_stats.index:
+            return None
+        return self.engagement_stats.at[video_id, 'category_name']
+
+    def _get_category_recommendations(
+        self,
+        video_id: int,
+        n_recommendations: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Same-category videos with high engagement, for videos missing from the index"""
         # Get video metadata
         video_query = """
         SELECT v.*, c.name as category_name
@@ -228,8 +401,112 @@ class RecommendationEngine:
 
         return recommendations
 
-    def get_popular_recommendations(self, n_recommendations: int = 10) -> List[Dict[str, Any]]:
-        """Fallback: Get most popular videos"""
+    def get_taste_recommendations(
+        self,
+        user_id: int,
+        n_recommendations: int = 10,
+        context_video_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Videos closest to the user's taste vector, blended with the context video.
+
+        Scores are (1 - w) * similarity to the context video + w * similarity to
+        the user's taste, computed as one matrix-vector product over the
+        embedding index; no SQL is involved.
+        """
+        self.taste_vectors.refresh()
+        user_vector = self.taste_vectors.get(user_id)
+        if user_vector is None or len(user_vector) != self.video_embeddings.shape[1]:
+            return []
+
+        target = user_vector
+        context_rows = np.flatnonzero(self.video_ids == context_video_id) if context_video_id else []
+        if len(context_rows):
+            target = (1 - self.taste_weight) * self.video_embeddings[context_rows[0]] + self.taste_weight * user_vector
+
+        scores = self.video_embeddings @ target.astype(np.float32)
+
+        # Skip what the user has already watched and the video being watched
+        excluded = [context_video_id] if context_video_id else []
+        if self.user_item_matrix is not None and user_id in self.user_item_matrix.index:
+            user_ratings = self.user_item_matrix.loc[user_id]
+            excluded.extend(user_ratings[user_ratings > 0].index.tolist())
+        if excluded:
+            scores[np.isin(self.video_ids, excluded)] = -np.inf
+
+        # Only recommend videos that are still active
+        scores[~self.active_rows] = -np.inf
+
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if len(candidates) > n_recommendations:
+            candidates = candidates[np.argpartition(-scores[candidates], n_recommendations - 1)[:n_recommendations]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        reason = "Similar to this video and your viewing history" if len(context_rows) else "Matches your viewing history"
+        return [
+            {'video_id': int(self.video_ids[idx]), 'score': float(scores[idx]), 'reason': reason}
+            for idx in candidates
+        ]
+
+    def get_popular_recommendations(
+        self,
+        n_recommendations: int = 10,
+        window: str = "7d",
+        category_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Fallback: Get most popular videos.
+
+        Served from the in-memory leaderboard for the window ("24h", "7d",
+        "30d") and optional category; the full aggregation query only runs
+        before the processing service has written a leaderboard.
+        """
+        self.popularity.refresh()
+        if not self.popularity.is_empty:
+            reason = "Popular and highly rated" if category_id is None else "Popular in this category"
+            return [
+                {'video_id': video_id, 'score': score, 'reason': reason}
+                for video_id, score in self.popularity.top(n_recommendations, window, category_id)
+            ]
+
+        return self._get_popular_recommendations_sql(n_recommendations)
+
+    def get_als_recommendations(
+        self,
+        user_id: int,
+        n_recommendations: int = 10,
+        context_video_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Matrix-factorization recommendations from the persisted ALS factors.
+
+        Users the model has not seen (or before the first training run) get
+        popular recommendations instead.
+        """
+        self.als.refresh()
+        if not self.als.has_user(user_id):
+            logger.info(f"No ALS factors for user {user_id}, using popular recommendations")
+            return self.get_popular_recommendations(n_recommendations)
+
+        exclude = [context_video_id] if context_video_id else []
+        # Only recommend videos that are still active (all of them before engagement stats are built)
+        active_ids = self.engagement_stats.index.to_numpy() if not self.engagement_stats.empty else None
+        return [
+            {'video_id': video_id, 'score': score, 'reason': "Viewers with similar taste watched this"}
+            for video_id, score in self.als.recommend(user_id, n_recommendations, exclude, active_ids)
+        ]
+
+    def get_trending_recommendations(self, n_recommendations: int = 10) -> List[Dict[str, Any]]:
+        """Videos whose last hour of views is furthest above their own 24-hour baseline"""
+        self.trending.refresh()
+        return [
+            {
+                'video_id': video_id,
+                'score': z_score,
+                'reason': f"Trending now: {int(recent_views)} views in the last hour"
+            }
+            for video_id, z_score, recent_views in self.trending.top(n_recommendations)
+        ]
+
+    def _get_popular_recommendations_sql(self, n_recommendations: int = 10) -> List[Dict[str, Any]]:
+        """Most popular videos aggregated directly from video_views"""
         logger.info("Generating popular video recommendations")
 
         query = """
@@ -271,9 +548,18 @@ class RecommendationEngine:
         self,
         user_id: int,
         context_video_id: Optional[int] = None,
-        n_recommendations: int = 10
+        n_recommendations: int = 10,
+        timings: Optional[Dict[str, float]] = None
     ) -> List[Dict[str, Any]]:
-        """Combine collaborative and content-based recommendations"""
+        """Staged hybrid recommendations: candidate generation, then re-ranking.
+
+        Item-CF neighbors, embedding neighbors of the context video and of the
+        user's taste vector, trending videos and popular videos in the user's
+        categories each contribute at most ``candidate_pool_size`` candidates.
+        The union is scored in one vectorized pass over a feature matrix (see
+        candidate_ranking.RERANK_WEIGHTS). Per-stage milliseconds are written
+        into ``timings`` when a dict is passed.
+        """
         logger.info(f"Generating hybrid recommendations for user {user_id}")
 
         # Check cache first
@@ -283,51 +569,138 @@ class RecommendationEngine:
             return [{'video_id': row['video_id'], 'score': row['recommendation_score'],
                     'reason': 'Personalized recommendation'} for row in cached]
 
-        # Get collaborative recommendations
-        collaborative = self.get_collaborative_recommendations(user_id, n_recommendations * 2)
-
-        # Get content-based recommendations if context video provided
-        content_based = []
-        if context_video_id:
-            content_based = self.get_content_based_recommendations(context_video_id, n_recommendations // 2)
-
-        # Merge and deduplicate
-        all_recommendations = {}
-
-        # Add collaborative recommendations
-        for rec in collaborative:
-            video_id = rec['video_id']
-            all_recommendations[video_id] = {
-                'video_id': video_id,
-                'score': rec['score'] * 0.7,  # Weight collaborative
-                'reason': rec['reason']
+        timer = StageTimer()
+        pool_size = self.candidate_pool_size
+
+        with timer.stage('user_context'):
+            collaborative = self._collaborative_scores(user_id)
+            self.taste_vectors.refresh()
+            data_pipeline.user_features.refresh()
+            recent_categories = data_pipeline.user_features.recent_categories(user_id)
+
+        # Never recommend what the user already watched or is watching
+        excluded = [context_video_id] if context_video_id else []
+        if collaborative is not None:
+            user_ratings = self.user_item_matrix.loc[user_id]
+            excluded.extend(user_ratings[user_ratings > 0].index.tolist())
+        pool = CandidatePool(excluded)
+
+        with timer.stage('generate_item_cf'):
+            if collaborative is not None:
+                scores, support = collaborative
+                candidates = np.flatnonzero(support > 0)
+                pool.add('item_cf', scores.index[candidates[top_n(scores.to_numpy()[candidates], pool_size)]])
+
+        with timer.stage('generate_content_neighbors'):
+            if context_video_id:
+                neighbors = self.get_content_based_recommendations(context_video_id, pool_size)
+                pool.add('content_neighbors', [rec['video_id'] for rec in neighbors])
+
+        with timer.stage('generate_taste_neighbors'):
+            neighbors = self.get_taste_recommendations(user_id, pool_size)
+            pool.add('taste_neighbors', [rec['video_id'] for rec in neighbors])
+
+        with timer.stage('generate_trending'):
+            pool.add('trending', [rec['video_id'] for rec in self.get_trending_recommendations(pool_size)])
+
+        with timer.stage('generate_popular'):
+            categories = self._preferred_categories(recent_categories, context_video_id)
+            for category_id in categories:
+                popular = self.get_popular_recommendations(pool_size // len(categories), category_id=category_id)
+                pool.add('popular_in_category', [rec['video_id'] for rec in popular])
+            if not categories or len(pool) < n_recommendations:
+                pool.add('popular', [rec['video_id'] for rec in self.get_popular_recommendations(pool_size)])
+
+        with timer.stage('features'):
+            video_ids = pool.video_ids
+            features = self._candidate_features(user_id, video_ids, context_video_id, collaborative)
+
+        with timer.stage('rerank'):
+            scores = rerank(features, len(video_ids))
+            ranked = top_n(scores, n_recommendations)
+
+        sorted_recommendations = [
+            {
+                'video_id': int(video_ids[idx]),
+                'score': float(scores[idx]),
+                'reason': GENERATOR_REASONS[pool.sources[int(video_ids[idx])]]
             }
-
-        # Add content-based recommendations
-        for rec in content_based:
-            video_id = rec['video_id']
-            if video_id not in all_recommendations:
-                all_recommendations[video_id] = {
-                    'video_id': video_id,
-                    'score': rec['score'] * 0.3,  # Weight content-based
-                    'reason': rec['reason']
-                }
-
-        # Sort and limit
-        sorted_recommendations = sorted(
-            all_recommendations.values(),
-            key=lambda x: x['score'],
-            reverse=True
-        )[:n_recommendations]
+            for idx in ranked
+        ]
 
         # Cache results for 1 hour
         expires_at = datetime.now() + timedelta(hours=1)
         for rec in sorted_recommendations:
             update_recommendation_cache(user_id, rec['video_id'], rec['score'], expires_at)
 
-        logger.info(f"Generated {len(sorted_recommendations)} hybrid recommendations for user {user_id}")
+        stage_timings = timer.finish()
+        if timings is not None:
+            timings.update(stage_timings)
+
+        logger.info(
+            f"Generated {len(sorted_recommendations)} hybrid recommendations for user {user_id} "
+            f"from {len(pool)} candidates in {stage_timings['total']:.1f}ms"
+        )
         return sorted_recommendations
 
+    def _preferred_categories(self, recent_categories: List[int], context_video_id: Optional[int], limit: int = 2) -> List[int]:
+        """Context video's category followed by the user's most watched recent categories"""
+        categories = []
+        if context_video_id and not self.engagement_stats.empty and context_video_id in self.engagement_stats.index:
+            context_category = self.engagement_stats.at[context_video_id, 'category_id']
+            if pd.notna(context_category):
+                categories.append(int(context_category))
+
+        for category_id in recent_categories:
+            if len(categories) >= limit:
+                break
+            if category_id not in categories:
+                categories.append(category_id)
+        return categories[:limit]
+
+    def _candidate_features(
+        self,
+        user_id: int,
+        video_ids: np.ndarray,
+        context_video_id: Optional[int],
+        collaborative: Optional[Tuple[pd.Series, np.ndarray]]
+    ) -> Dict[str, np.ndarray]:
+        """Feature columns for every candidate, each scaled to roughly 0-1"""
+        n_candidates = len(video_ids)
+        features: Dict[str, np.ndarray] = {}
+
+        # Embedding similarity to the context video and to the taste vector in one product
+        features['content_similarity'] = np.zeros(n_candidates, dtype=np.float32)
+        features['taste_similarity'] = np.zeros(n_candidates, dtype=np.float32)
+        rows = self._row_by_video.reindex(video_ids)
+        indexed = rows.notna().to_numpy()
+        targets = {}
+        if context_video_id in self._row_by_video.index:
+            targets['content_similarity'] = self.video_embeddings[int(self._row_by_video[context_video_id])]
+        user_vector = self.taste_vectors.get(user_id)
+        if user_vector is not None and len(user_vector) == self.video_embeddings.shape[1]:
+            targets['taste_similarity'] = user_vector
+        if targets and indexed.any():
+            similarities = self.video_embeddings[rows[indexed].astype(int).to_numpy()] @ np.column_stack(list(targets.values()))
+            for column, name in enumerate(targets):
+                features[name][indexed] = np.clip(similarities[:, column], 0, 1)
+
+        if collaborative is not None:
+            features['collaborative'] = scale_to_unit(collaborative[0].reindex(video_ids).fillna(0).to_numpy())
+        features['trending'] = np.tanh(np.clip(self.trending.scores_for(video_ids), 0, None) / 3)
+        features['popularity'] = scale_to_unit(self.popularity.scores_for(video_ids, "7d"))
+
+        if self.engagement_stats.empty:
+            features['engagement'] = np.zeros(n_candidates, dtype=np.float32)
+        else:
+            engagement = self.engagement_stats['engagement_score'].reindex(video_ids)
+            features['engagement'] = pd.to_numeric(engagement).fillna(0).to_numpy(dtype=np.float32)
+
+        real_time = data_pipeline.get_real_time_features_batch(np.full(n_candidates, user_id), video_ids)
+        features['category_match'] = real_time['category_match']
+        features['duration_match'] = real_time['duration_match']
+        return features
+
     def get_user_insights(self, user_id: int) -> Dict[str, Any]:
         """Get insights about user behavior for analytics"""
         user_data = get_user_behavior_data(user_id, days_back=30)
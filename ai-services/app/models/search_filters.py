@@ -0,0 +1,107 @@
+"""
+Pre-filter index for LCMTV search
+Sorted row-id arrays per category, role, language and duration bucket, plus a
+publish-date ordering, combined into a row mask before the vector scan
+"""
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from ..core.logging import get_logger
+
+logger = get_logger("search_filters")
+
+# Same cut-offs as the "short/medium/long video" hints in the searchable content
+DURATION_BUCKETS = {
+    "short": (0, 300),
+    "medium": (300, 1800),
+    "long": (1800, np.inf),
+}
+
+# Column defaults from the videos schema, used for rows (or cached indexes) without a value
+DEFAULT_TARGET_ROLE = "general"
+DEFAULT_LANGUAGE = "en"
+
+
+def _row_ids_by_value(values: pd.Series) -> Dict[object, np.ndarray]:
+    """Sorted int32 row ids for every distinct value of a column"""
+    return {
+        value: np.asarray(rows, dtype=np.int32)
+        for value, rows in values.groupby(values, sort=False).indices.items()
+    }
+
+
+class FilterIndex:
+    """Row-id postings for the filterable video attributes of one search index"""
+
+    def __init__(self, video_data: pd.DataFrame):
+        self.n_rows = len(video_data)
+
+        def column(name: str, default=None) -> pd.Series:
+            if name in video_data:
+                return video_data[name] if default is None else video_data[name].fillna(default)
+            return pd.Series(default, index=video_data.index)
+
+        categories = pd.to_numeric(column('category_id'), errors='coerce')
+        self.by_category = _row_ids_by_value(categories.dropna().astype(int))
+        self.by_role = _row_ids_by_value(column('target_role', DEFAULT_TARGET_ROLE).astype(str))
+        self.by_language = _row_ids_by_value(column('original_language', DEFAULT_LANGUAGE).astype(str))
+
+        durations = pd.to_numeric(column('duration'), errors='coerce').to_numpy(dtype=np.float64)
+        self.by_duration = {
+            bucket: np.flatnonzero((durations >= low) & (durations < high)).astype(np.int32)
+            for bucket, (low, high) in DURATION_BUCKETS.items()
+        }
+
+        # Rows ordered by publish time; a date range is a contiguous slice of this order
+        published = pd.to_datetime(column('published_at'), errors='coerce')
+        valid = np.flatnonzero(published.notna().to_numpy())
+        timestamps = published.to_numpy(dtype='datetime64[s]')[valid].astype(np.int64)
+        order = np.argsort(timestamps, kind="stable")
+        self.publish_rows = valid[order].astype(np.int32)
+        self.publish_times = timestamps[order]
+
+    def _union(self, postings: Dict[object, np.ndarray], keys: Iterable) -> np.ndarray:
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for key in keys:
+            rows = postings.get(key)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _published_between(self, after: Optional[datetime], before: Optional[datetime]) -> np.ndarray:
+        lo = 0 if after is None else np.searchsorted(self.publish_times, int(pd.Timestamp(after).timestamp()), side="left")
+        hi = len(self.publish_times) if before is None else np.searchsorted(self.publish_times, int(pd.Timestamp(before).timestamp()), side="right")
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.publish_rows[lo:hi]] = True
+        return mask
+
+    def mask(
+        self,
+        category_ids: Optional[List[int]] = None,
+        target_roles: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None,
+        durations: Optional[List[str]] = None,
+        published_after: Optional[datetime] = None,
+        published_before: Optional[datetime] = None
+    ) -> Optional[np.ndarray]:
+        """Boolean row mask for the given filters (OR within a filter, AND across filters).
+
+        Returns None when no filter is set so callers can keep the unfiltered fast path.
+        """
+        masks = []
+        if category_ids:
+            masks.append(self._union(self.by_category, category_ids))
+        if target_roles:
+            masks.append(self._union(self.by_role, target_roles))
+        if languages:
+            masks.append(self._union(self.by_language, languages))
+        if durations:
+            masks.append(self._union(self.by_duration, durations))
+        if published_after is not None or published_before is not None:
+            masks.append(self._published_between(published_after, published_before))
+
+        if not masks:
+            return None
+        return np.logical_and.reduce(masks) if len(masks) > 1 else masks[0]
@@ -4,71 +4,237 @@ Uses vector embeddings for natural language video search
 """
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Dict, Any, Optional, Tuple
 import logging
+import itertools
 import json
 import os
+import threading
 from pathlib import Path
 
 from ..core.database import execute_query, get_db_connection
 from ..core.logging import get_logger
 from ..core.config import settings
+from ..utils.analytics_snapshot import AnalyticsSnapshot, get_snapshot
+from .encoders import create_encoder, encoder_signature
+from .lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from .search_filters import FilterIndex
+from .taste_vectors import TasteVectorStore
+from .user_preferences import UserPreferenceCache
 
 logger = get_logger("semantic_search")
 
 
+def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """L2-normalize embedding rows so cosine similarity becomes a dot product"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def _parse_tags(raw_tags: Any) -> List[str]:
+    """Normalize the videos.tags column (JSON array or plain string) to a list"""
+    if not isinstance(raw_tags, (str, list)) or not raw_tags:
+        return []
+    try:
+        tags = json.loads(raw_tags) if isinstance(raw_tags, str) else raw_tags
+    except (TypeError, ValueError):
+        return [str(raw_tags)]
+
+    if isinstance(tags, list):
+        return [str(tag) for tag in tags]
+    return [str(tags)]
+
+
+class SearchIndex:
+    """Everything one build of the search index consists of, never modified after construction.
+
+    The engine swaps a whole SearchIndex in with a single assignment, so a
+    search that holds a reference keeps scoring and formatting against one
+    consistent build while a rebuild installs the next. ``generation``
+    identifies the build; rankings and cursors carry it.
+    """
+
+    def __init__(self, generation: int, embeddings: np.ndarray, video_data: pd.DataFrame,
+                 records: List[Dict[str, Any]], lexical_index: BM25Index, filter_index: FilterIndex):
+        self.generation = generation
+        self.embeddings = embeddings
+        self.video_data = video_data
+        self.records = records
+        self.row_categories = np.array([str(record.get('category_name', '')) for record in records], dtype=object)
+        self.lexical_index = lexical_index
+        self.filter_index = filter_index
+
+
 class SemanticSearchEngine:
     """AI-powered semantic search using vector embeddings"""
 
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, encoder_backend: str = None):
         self.model_name = model_name or settings.sentence_transformer_model
+        self.encoder_backend = encoder_backend or settings.encoder_backend
+        # Cached embeddings are only comparable with queries from the same backend, model and quantization
+        self.encoder_signature = encoder_signature(self.encoder_backend, self.model_name, settings.onnx_quantize)
         self.model = None
-        self.video_embeddings = None
-        self.video_data = None
-        self.index_built = False
+        self.index: Optional[SearchIndex] = None
+        self._generations = itertools.count(1)
+
+        # Rank constant for reciprocal-rank fusion in hybrid search
+        self.rrf_k = 60
+
+        # Score multiplier for candidates in a user's preferred categories
+        self.preference_boost = 1.3
+        self.user_preferences = UserPreferenceCache(
+            ttl_seconds=settings.user_preferences_ttl_seconds,
+            max_size=settings.user_preferences_cache_size
+        )
+
+        # Share of a user's taste vector blended into the query vector
+        self.taste_weight = settings.taste_blend_weight
+
+        # Guards model loading and index builds against concurrent callers
+        self._model_lock = threading.Lock()
+        self._index_lock = threading.Lock()
 
         # Create model cache directory
         self.cache_dir = Path(settings.model_cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / "content_index.npz"
+        self.data_file = self.cache_dir / "content_data.pkl"
+        self.taste_vectors = TasteVectorStore(self.cache_dir / "taste_vectors.npz")
 
     def load_model(self):
-        """Load the sentence transformer model"""
-        if self.model is None:
-            logger.info(f"Loading semantic search model: {self.model_name}")
+        """Load the configured encoder backend.
+
+        The ML libraries are imported here rather than at module level so that
+        processes serving a cached index never pay for them.
+        """
+        if self.model is not None:
+            return
+
+        with self._model_lock:
+            if self.model is not None:
+                return
+
+            logger.info(f"Loading semantic search model: {self.model_name} ({self.encoder_backend})")
             try:
-                self.model = SentenceTransformer(
+                self.model = create_encoder(
+                    self.encoder_backend,
                     self.model_name,
-                    cache_folder=str(self.cache_dir)
+                    self.cache_dir,
+                    quantize=settings.onnx_quantize
                 )
                 logger.info("✓ Semantic search model loaded successfully")
             except Exception as e:
                 logger.error(f"Failed to load semantic search model: {e}")
                 raise
 
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode query strings into L2-normalized float32 embeddings"""
+        self.load_model()
+        return _normalize_rows(self.model.encode(queries))
+
+    def load_cached_index(self) -> bool:
+        """Load the persisted index without touching the model or the database"""
+        if not (self.index_file.exists() and self.data_file.exists()):
+            return False
+
+        try:
+            cached_data = np.load(self.index_file)
+            embeddings = cached_data['embeddings']
+            signature = str(cached_data['encoder']) if 'encoder' in cached_data.files else None
+            video_data = pd.read_pickle(self.data_file)
+        except Exception as e:
+            logger.warning(f"Failed to load cached index: {e}")
+            return False
+
+        if signature != self.encoder_signature:
+            logger.info(f"Cached index was encoded by {signature}, rebuilding for {self.encoder_signature}")
+            return False
+
+        # Check if data is still valid (basic check)
+        if len(video_data) == 0 or len(video_data) != len(embeddings):
+            return False
+
+        self._set_index(embeddings, video_data)
+        logger.info(f"Loaded cached semantic index with {len(self.video_data)} videos")
+        return True
+
+    def _set_index(self, embeddings: np.ndarray, video_data: pd.DataFrame):
+        """Install a new index, normalized for dot-product scoring"""
+        video_data = video_data.reset_index(drop=True)
+        records = video_data.to_dict('records')
+
+        # Parse tags and lowercase the matchable fields once, not per result
+        for record in records:
+            record['_tags'] = _parse_tags(record.get('tags'))
+            record['_lower'] = {
+                field: str(record.get(field, '')).lower()
+                for field in ('title', 'description', 'category_name', 'channel_title')
+            }
+            record['_lower']['tags'] = [tag.lower() for tag in record['_tags']]
+
+        lexical_index = BM25Index().build([self._lexical_tokens(record) for record in records])
+        filter_index = FilterIndex(video_data)
+
+        # One assignment, so concurrent searches see either the old build or the new one
+        self.index = SearchIndex(
+            next(self._generations), _normalize_rows(embeddings), video_data, records, lexical_index, filter_index
+        )
+
+    @property
+    def index_built(self) -> bool:
+        return self.index is not None
+
+    @property
+    def index_generation(self) -> int:
+        """Generation of the installed index (0 before the first build)"""
+        index = self.index
+        return index.generation if index is not None else 0
+
+    @property
+    def video_embeddings(self) -> Optional[np.ndarray]:
+        index = self.index
+        return index.embeddings if index is not None else None
+
+    @property
+    def video_data(self) -> Optional[pd.DataFrame]:
+        index = self.index
+        return index.video_data if index is not None else None
+
+    @property
+    def filter_index(self) -> Optional[FilterIndex]:
+        index = self.index
+        return index.filter_index if index is not None else None
+
+    @staticmethod
+    def _lexical_tokens(record: Dict[str, Any]) -> List[str]:
+        """Field-weighted BM25 terms: title and tags count more than description"""
+        lower = record['_lower']
+        tokens = tokenize(lower['title']) * 3
+        for tag in lower['tags']:
+            tokens.extend(tokenize(tag) * 2)
+        tokens.extend(tokenize(lower['channel_title']))
+        tokens.extend(tokenize(lower['category_name']))
+        tokens.extend(tokenize(lower['description']))
+        return tokens
+
+    def ensure_index(self):
+        """Make sure an index is available, building it at most once concurrently"""
+        if self.index_built:
+            return
+
+        with self._index_lock:
+            if not self.index_built:
+                self.build_content_index()
+
     def build_content_index(self, force_rebuild: bool = False) -> Tuple[np.ndarray, pd.DataFrame]:
         """Build semantic index of all video content"""
         logger.info("Building semantic content index")
 
-        # Check if index already exists and is recent
-        index_file = self.cache_dir / "content_index.npz"
-        data_file = self.cache_dir / "content_data.pkl"
-
-        if not force_rebuild and index_file.exists() and data_file.exists():
-            try:
-                # Load cached index
-                cached_data = np.load(index_file)
-                self.video_embeddings = cached_data['embeddings']
-                self.video_data = pd.read_pickle(data_file)
-
-                # Check if data is still valid (basic check)
-                if len(self.video_data) > 0:
-                    logger.info(f"Loaded cached semantic index with {len(self.video_data)} videos")
-                    self.index_built = True
-                    return self.video_embeddings, self.video_data
-            except Exception as e:
-                logger.warning(f"Failed to load cached index: {e}")
+        # Serve the persisted index when available
+        if not force_rebuild and self.load_cached_index():
+            return self.video_embeddings, self.video_data
 
         # Build new index
         self.load_model()
@@ -87,6 +253,8 @@ class SemanticSearchEngine:
             v.like_count,
             v.duration,
             v.published_at,
+            v.target_role,
+            v.original_language,
             TIMESTAMPDIFF(DAY, v.published_at, NOW()) as days_since_publish
         FROM videos v
         LEFT JOIN categories c ON v.category_id = c.id
@@ -94,15 +262,13 @@ class SemanticSearchEngine:
         ORDER BY v.view_count DESC, v.published_at DESC
         """
 
-        results = execute_query(query)
+        snapshot = get_snapshot()
+        df = self._snapshot_video_content(snapshot) if snapshot is not None else pd.DataFrame(execute_query(query) or [])
 
-        if not results:
+        if df.empty:
             logger.warning("No video data found for semantic indexing")
             return np.array([]), pd.DataFrame()
 
-        # Convert to DataFrame
-        df = pd.DataFrame(results)
-
         # Create searchable content for each video
         logger.info("Creating searchable content representations")
         df['searchable_content'] = df.apply(self._create_searchable_content, axis=1)
@@ -116,20 +282,36 @@ class SemanticSearchEngine:
         )
 
         # Store results
-        self.video_embeddings = embeddings
-        self.video_data = df
-        self.index_built = True
+        self._set_index(embeddings, df)
 
         # Cache the index
         try:
-            np.savez_compressed(index_file, embeddings=embeddings)
-            df.to_pickle(data_file)
+            np.savez_compressed(
+                self.index_file, embeddings=self.video_embeddings, encoder=np.array(self.encoder_signature)
+            )
+            df.to_pickle(self.data_file)
             logger.info("✓ Semantic index cached successfully")
         except Exception as e:
             logger.warning(f"Failed to cache semantic index: {e}")
 
         logger.info(f"✓ Built semantic index with {len(df)} videos")
-        return embeddings, df
+        return self.video_embeddings, self.video_data
+
+    @staticmethod
+    def _snapshot_video_content(snapshot: AnalyticsSnapshot) -> pd.DataFrame:
+        """The content index query evaluated over the analytics snapshot"""
+        videos = snapshot.table('videos')
+        if videos.empty:
+            return videos
+        videos = videos[(videos['is_active'] == 1) & videos['title'].notna()].drop(columns='is_active')
+        categories = snapshot.table('categories', ['id', 'name']).rename(columns={'id': 'category_id', 'name': 'category_name'})
+        df = videos.merge(categories, on='category_id', how='left')
+        df['days_since_publish'] = (pd.Timestamp.now() - pd.to_datetime(df['published_at'])).dt.days
+        columns = ['id', 'title', 'description', 'tags', 'channel_title', 'category_id', 'category_name',
+                   'view_count', 'like_count', 'duration', 'published_at', 'target_role', 'original_language',
+                   'days_since_publish']
+        df = df.sort_values(['view_count', 'published_at'], ascending=False, kind='stable')
+        return df[columns].reset_index(drop=True)
 
     def _create_searchable_content(self, row: pd.Series) -> str:
         """Create comprehensive searchable content from video data"""
@@ -144,19 +326,7 @@ class SemanticSearchEngine:
             content_parts.append(str(row['description']))
 
         # Tags (if stored as JSON)
-        if row['tags']:
-            try:
-                if isinstance(row['tags'], str):
-                    tags = json.loads(row['tags'])
-                else:
-                    tags = row['tags']
-
-                if isinstance(tags, list):
-                    content_parts.extend([str(tag) for tag in tags])
-                elif isinstance(tags, str):
-                    content_parts.append(tags)
-            except:
-                content_parts.append(str(row['tags']))
+        content_parts.extend(_parse_tags(row['tags']))
 
         # Channel name
         if row['channel_title']:
@@ -194,108 +364,244 @@ class SemanticSearchEngine:
         query: str,
         top_k: int = 20,
         threshold: float = 0.1,
-        user_id: Optional[int] = None
+        user_id: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
-        """Perform semantic search on video content"""
-        if not self.index_built:
-            self.build_content_index()
+        """Perform semantic search on video content.
 
-        if self.video_embeddings is None or len(self.video_embeddings) == 0:
+        ``query_embedding`` lets callers that batch-encode queries skip the encode step.
+        ``filters`` are FilterIndex.mask keyword arguments, applied before ranking
+        so a filtered query still returns a full page.
+        """
+        ranking = self.rank(
+            query, search_type="semantic", depth=top_k, threshold=threshold,
+            user_id=user_id, query_embedding=query_embedding, filters=filters
+        )
+        results = self.format_results(query, ranking)
+
+        logger.info(f"Found {len(results)} semantic search results")
+        return results
+
+    def rank(
+        self,
+        query: str,
+        search_type: str = "hybrid",
+        depth: int = 200,
+        threshold: float = 0.1,
+        user_id: Optional[int] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, np.ndarray]:
+        """Rank up to ``depth`` candidate rows without building any result objects.
+
+        The returned arrays are aligned by rank and cheap to cache, so later pages
+        can be formatted from them without recomputing similarity. The ranking
+        keeps the index build it was computed on (``index``, ``generation``),
+        so its row positions stay valid across a rebuild.
+        """
+        self.ensure_index()
+        index = self.index
+
+        empty = {
+            'indices': np.array([], dtype=np.int64),
+            'similarities': np.array([], dtype=np.float32),
+            'fusion_scores': None,
+            'lexical_match': None,
+            'personalized': None,
+            'index': index,
+            'generation': index.generation if index is not None else 0
+        }
+        if index is None or len(index.embeddings) == 0:
             logger.warning("No semantic index available for search")
-            return []
+            return empty
 
-        self.load_model()
+        logger.info(f"Performing {search_type} search for: '{query}'")
 
-        logger.info(f"Performing semantic search for: '{query}'")
-
-        # Encode query
-        query_embedding = self.model.encode([query])[0]
-
-        # Calculate similarities
-        similarities = cosine_similarity([query_embedding], self.video_embeddings)[0]
-
-        # Get top results above threshold
-        top_indices = np.argsort(similarities)[::-1]
-        top_indices = top_indices[similarities[top_indices] > threshold][:top_k]
-
-        results = []
-        for idx in top_indices:
-            video = self.video_data.iloc[idx]
-
-            # Get additional metadata for enriched results
-            video_details = self._get_video_details(video['id'])
-
-            result = {
-                'video_id': int(video['id']),
-                'title': str(video['title']),
-                'description': str(video.get('description', ''))[:200],
-                'channel_title': str(video.get('channel_title', '')),
-                'category_name': str(video.get('category_name', '')),
-                'similarity_score': float(similarities[idx]),
-                'relevance_reason': self._generate_relevance_reason(query, video, similarities[idx]),
-                'thumbnail_url': video_details.get('thumbnail_url'),
-                'duration': video_details.get('duration'),
-                'view_count': video_details.get('view_count'),
-                'published_at': str(video.get('published_at', '')),
-                'days_since_publish': int(video.get('days_since_publish', 0))
-            }
+        row_mask = index.filter_index.mask(**(filters or {}))
+        user_vector = self._taste_vector(user_id, index.embeddings.shape[1]) if user_id else None
+        similarities, ordering = self._semantic_scores(index, query, query_embedding, row_mask, user_vector)
 
-            results.append(result)
+        if search_type == "semantic":
+            indices = self._top_indices(ordering, depth, threshold, similarities)
+            return dict(empty, indices=indices, similarities=similarities[indices])
 
-        logger.info(f"Found {len(results)} semantic search results")
-        return results
+        # Hybrid: fuse semantic and lexical pools deeper than the requested depth
+        pool_size = max(depth * 3, 50)
+        semantic_ranked = self._top_indices(ordering, pool_size, threshold, similarities)
+        lexical_ranked, _ = index.lexical_index.search(query, pool_size, row_mask)
 
-    def _get_video_details(self, video_id: int) -> Dict[str, Any]:
-        """Get additional video details for search results"""
+        fused = reciprocal_rank_fusion([semantic_ranked, lexical_ranked], k=self.rrf_k)
+        indices = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+        fusion_scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+        personalized = np.zeros(len(indices), dtype=bool)
+
+        if user_id:
+            # Add personalization based on user preferences, before truncation
+            fusion_scores, personalized = self._personalize_ranking(index, indices, fusion_scores, user_id)
+
+        order = np.argsort(-fusion_scores, kind="stable")[:depth]
+        indices = indices[order]
+
+        return {
+            **empty,
+            'indices': indices,
+            'similarities': similarities[indices],
+            'fusion_scores': fusion_scores[order],
+            'lexical_match': np.isin(indices, lexical_ranked),
+            'personalized': personalized[order]
+        }
+
+    def format_results(
+        self,
+        query: str,
+        ranking: Dict[str, np.ndarray],
+        start: int = 0,
+        stop: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Build API result dicts for ranks [start, stop) of a ranking"""
+        return list(self.iter_results(query, ranking, start, stop))
+
+    def iter_results(
+        self,
+        query: str,
+        ranking: Dict[str, np.ndarray],
+        start: int = 0,
+        stop: Optional[int] = None
+    ):
+        """Lazily build result dicts, one rank at a time; database details are fetched once per page.
+
+        Rows are looked up in the index build the ranking was computed on.
+        """
+        records = ranking['index'].records if ranking['index'] is not None else []
+        stop = len(ranking['indices']) if stop is None else min(stop, len(ranking['indices']))
+        page = ranking['indices'][start:stop]
+        details = self._get_video_details([int(records[idx]['id']) for idx in page]) if len(page) else {}
+
+        for rank in range(start, stop):
+            video = records[int(ranking['indices'][rank])]
+            result = self._format_result(
+                video, query, ranking['similarities'][rank], details.get(int(video['id']), {})
+            )
+
+            if ranking['fusion_scores'] is not None:
+                result['fusion_score'] = float(ranking['fusion_scores'][rank])
+                result['lexical_match'] = bool(ranking['lexical_match'][rank])
+            if ranking['personalized'] is not None and ranking['personalized'][rank]:
+                result['personalized'] = True
+                result['relevance_reason'] += " • Matches your preferences"
+
+            yield result
+
+    def _semantic_scores(
+        self,
+        index: SearchIndex,
+        query: str,
+        query_embedding: Optional[np.ndarray] = None,
+        row_mask: Optional[np.ndarray] = None,
+        user_vector: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine similarity of the query against every indexed video, and the scores to order by.
+
+        With a row mask only the allowed rows are scanned; the rest score -inf.
+        With a user taste vector the ordering score is (1 - w) * query
+        similarity + w * user similarity; both come from one scan against the
+        stacked vectors. Thresholds and reported scores use the query
+        similarity alone, so the blend only reorders on-topic results.
+        """
+        if query_embedding is None:
+            query_embedding = self.encode_queries([query])[0]
+
+        vectors = np.asarray(query_embedding, dtype=np.float32)[:, None]
+        if user_vector is not None:
+            vectors = np.hstack([vectors, np.asarray(user_vector, dtype=np.float32)[:, None]])
+
+        if row_mask is None:
+            scores = index.embeddings @ vectors
+        else:
+            rows = np.flatnonzero(row_mask)
+            scores = np.full((len(index.embeddings), vectors.shape[1]), -np.inf, dtype=np.float32)
+            scores[rows] = index.embeddings[rows] @ vectors
+
+        similarities = scores[:, 0]
+        if user_vector is None:
+            return similarities, similarities
+        return similarities, (1 - self.taste_weight) * similarities + self.taste_weight * scores[:, 1]
+
+    @staticmethod
+    def _top_indices(
+        scores: np.ndarray,
+        top_k: int,
+        threshold: float,
+        threshold_scores: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Indices of the top_k scores whose threshold_scores (default: scores) pass threshold, best first"""
+        candidates = np.flatnonzero((scores if threshold_scores is None else threshold_scores) > threshold)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def _format_result(
+        self, video: Dict[str, Any], query: str, similarity: float, video_details: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the API result dict for one index record"""
+        return {
+            'video_id': int(video['id']),
+            'title': str(video['title']),
+            'description': str(video.get('description', ''))[:200],
+            'channel_title': str(video.get('channel_title', '')),
+            'category_name': str(video.get('category_name', '')),
+            'similarity_score': float(similarity),
+            'relevance_reason': self._generate_relevance_reason(query, video, similarity),
+            'thumbnail_url': video_details.get('thumbnail_url'),
+            'duration': video_details.get('duration'),
+            'view_count': video_details.get('view_count'),
+            'published_at': str(video.get('published_at', '')),
+            'days_since_publish': int(video.get('days_since_publish', 0))
+        }
+
+    def _get_video_details(self, video_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Current details of a page of result videos, in one query"""
         try:
-            query = """
-            SELECT thumbnail_url, duration, view_count, published_at
-            FROM videos WHERE id = %s
+            query = f"""
+            SELECT id, thumbnail_url, duration, view_count, published_at
+            FROM videos WHERE id IN ({', '.join(['%s'] * len(video_ids))})
             """
-            result = execute_query(query, (video_id,))
-            return result[0] if result else {}
+            result = execute_query(query, tuple(video_ids)) or []
+            return {int(row['id']): row for row in result}
         except Exception as e:
-            logger.warning(f"Failed to get video details for {video_id}: {e}")
+            logger.warning(f"Failed to get video details for {len(video_ids)} videos: {e}")
             return {}
 
-    def _generate_relevance_reason(self, query: str, video: pd.Series, score: float) -> str:
-        """Generate human-readable relevance explanation"""
+    def _generate_relevance_reason(self, query: str, video: Dict[str, Any], score: float) -> str:
+        """Generate human-readable relevance explanation.
+
+        Uses the lowercased fields and parsed tags precomputed in ``_set_index``.
+        """
         reasons = []
         query_lower = query.lower()
+        text = video['_lower']
 
         # Title match
-        title_lower = str(video.get('title', '')).lower()
-        if query_lower in title_lower:
+        if query_lower in text['title']:
             reasons.append("Title matches your search")
 
         # Description match
-        desc_lower = str(video.get('description', '')).lower()
-        if query_lower in desc_lower:
+        if query_lower in text['description']:
             reasons.append("Description contains relevant content")
 
         # Category match
-        category_lower = str(video.get('category_name', '')).lower()
-        if query_lower in category_lower:
+        if query_lower in text['category_name']:
             reasons.append(f"From {video.get('category_name')} category")
 
         # Channel match
-        channel_lower = str(video.get('channel_title', '')).lower()
-        if query_lower in channel_lower:
+        if query_lower in text['channel_title']:
             reasons.append(f"By {video.get('channel_title')}")
 
         # Tag matches
-        if video.get('tags'):
-            try:
-                tags = video['tags']
-                if isinstance(tags, str):
-                    tags = json.loads(tags)
-
-                if isinstance(tags, list):
-                    matching_tags = [tag for tag in tags if query_lower in str(tag).lower()]
-                    if matching_tags:
-                        reasons.append(f"Tags: {', '.join(matching_tags[:2])}")
-            except:
-                pass
+        matching_tags = [tag for tag, tag_lower in zip(video['_tags'], text['tags']) if query_lower in tag_lower]
+        if matching_tags:
+            reasons.append(f"Tags: {', '.join(matching_tags[:2])}")
 
         # Content type hints
         duration = video.get('duration', 0)
@@ -326,68 +632,70 @@ class SemanticSearchEngine:
         self,
         query: str,
         user_id: Optional[int] = None,
-        top_k: int = 20
+        top_k: int = 20,
+        query_embedding: Optional[np.ndarray] = None,
+        threshold: float = 0.1,
+        filters: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
-        """Combine semantic search with personalization"""
-        semantic_results = self.semantic_search(query, top_k=top_k, user_id=user_id)
+        """Fuse semantic and BM25 lexical rankings, then personalize.
 
-        if user_id:
-            # Add personalization based on user preferences
-            semantic_results = self._personalize_search_results(semantic_results, user_id)
+        Both retrievers contribute a candidate pool several times deeper than
+        top_k; reciprocal-rank fusion lets exact matches on names, scripture
+        references and series titles surface even when their embedding
+        similarity is middling.
+        """
+        ranking = self.rank(
+            query, search_type="hybrid", depth=top_k, threshold=threshold,
+            user_id=user_id, query_embedding=query_embedding, filters=filters
+        )
+        results = self.format_results(query, ranking)
 
-        return semantic_results
+        logger.info(f"Found {len(results)} hybrid search results")
+        return results
 
-    def _personalize_search_results(self, results: List[Dict[str, Any]], user_id: int) -> List[Dict[str, Any]]:
-        """Personalize search results based on user preferences"""
-        try:
-            # Get user preferences
-            pref_query = "SELECT preferred_categories, time_preferences FROM user_preferences WHERE user_id = %s"
-            pref_result = execute_query(pref_query, (user_id,))
-
-            if not pref_result:
-                return results
-
-            preferences = pref_result[0]
-
-            # Parse preferred categories
-            preferred_categories = []
-            if preferences.get('preferred_categories'):
-                try:
-                    preferred_categories = json.loads(preferences['preferred_categories'])
-                except:
-                    pass
-
-            # Boost results from preferred categories
-            for result in results:
-                category_name = result.get('category_name', '')
-                if category_name in preferred_categories:
-                    result['similarity_score'] *= 1.3  # Boost score
-                    result['personalized'] = True
-                    result['relevance_reason'] += " • Matches your preferences"
-
-            # Sort by boosted scores
-            results.sort(key=lambda x: x['similarity_score'], reverse=True)
+    def _taste_vector(self, user_id: int, dimension: int) -> Optional[np.ndarray]:
+        """The user's taste vector, if the pipeline has built one in the index's embedding space"""
+        self.taste_vectors.refresh()
+        vector = self.taste_vectors.get(user_id)
+        if vector is None or len(vector) != dimension:
+            return None
+        return vector
 
-        except Exception as e:
-            logger.warning(f"Failed to personalize search results: {e}")
+    def _personalize_ranking(
+        self,
+        index: SearchIndex,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        user_id: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Boost candidates from the user's preferred categories.
+
+        Preferences come from the TTL cache, so repeated searches by the same
+        user (e.g. one per keystroke) do not hit the database.
+        """
+        preferred_categories = self.user_preferences.get(user_id)['preferred_categories']
+        if not preferred_categories:
+            return scores, np.zeros(len(indices), dtype=bool)
 
-        return results
+        personalized = np.isin(index.row_categories[indices], preferred_categories)
+        scores = np.where(personalized, scores * self.preference_boost, scores).astype(np.float32)
+        return scores, personalized
 
     def find_similar_videos(self, video_id: int, top_k: int = 10) -> List[Dict[str, Any]]:
         """Find videos similar to a given video"""
-        if not self.index_built:
-            self.build_content_index()
+        self.ensure_index()
+        index = self.index
 
         try:
             # Get the video's embedding
-            video_idx = self.video_data[self.video_data['id'] == video_id].index
+            video_idx = index.video_data[index.video_data['id'] == video_id].index
             if len(video_idx) == 0:
                 return []
 
-            video_embedding = self.video_embeddings[video_idx[0]]
+            video_embedding = index.embeddings[video_idx[0]]
 
             # Calculate similarities with all other videos
-            similarities = cosine_similarity([video_embedding], self.video_embeddings)[0]
+            similarities = index.embeddings @ video_embedding
 
             # Get top similar videos (excluding the video itself)
             top_indices = np.argsort(similarities)[::-1]
@@ -395,7 +703,7 @@ class SemanticSearchEngine:
 
             results = []
             for idx in top_indices:
-                video = self.video_data.iloc[idx]
+                video = index.records[idx]
                 results.append({
                     'video_id': int(video['id']),
                     'title': str(video['title']),
@@ -423,13 +731,20 @@ class SemanticSearchEngine:
 
     def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the semantic index"""
-        if not self.index_built:
+        index = self.index
+        if index is None:
             return {"status": "not_built"}
 
         return {
             "status": "ready",
-            "total_videos": len(self.video_data) if self.video_data is not None else 0,
-            "embedding_dimensions": self.video_embeddings.shape[1] if self.video_embeddings is not None else 0,
+            "generation": index.generation,
+            "total_videos": len(index.video_data),
+            "embedding_dimensions": index.embeddings.shape[1],
+            "lexical_terms": len(index.lexical_index.postings),
             "model_name": self.model_name,
+            "encoder_backend": self.encoder_backend,
+            "encoder_signature": self.encoder_signature,
+            "model_loaded": self.model is not None,
+            "taste_vectors": self.taste_vectors.get_stats(),
             "cache_dir": str(self.cache_dir)
         }
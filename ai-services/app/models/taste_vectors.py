@@ -0,0 +1,206 @@
+"""
+User taste vectors for LCMTV personalization
+Decay-weighted mean embedding of each user's watched videos, kept in the same
+space as the semantic search index and persisted as a compact float16 matrix
+"""
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..core.logging import get_logger
+
+logger = get_logger("taste_vectors")
+
+
+def load_video_embeddings(cache_dir: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """Video ids and L2-normalized embeddings of the persisted search index.
+
+    Reads the files written by SemanticSearchEngine; no model or database needed.
+    Returns empty arrays when no index has been built yet.
+    """
+    cache_dir = Path(cache_dir)
+    try:
+        embeddings = np.load(cache_dir / "content_index.npz")['embeddings'].astype(np.float32)
+        video_ids = pd.read_pickle(cache_dir / "content_data.pkl")['id'].to_numpy(dtype=np.int64)
+    except FileNotFoundError:
+        return np.array([], dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return video_ids, embeddings / norms
+
+
+class TasteVectorStore:
+    """Per-user taste vectors with exponential time decay.
+
+    Each user keeps the weighted mean of their watched-video embeddings, the
+    total (decayed) weight behind it and when it was last updated. Adding views
+    decays the old total to the current time and folds the new embeddings in,
+    so updates only touch new ``video_views`` rows. ``last_view_id`` records the
+    high-water mark of views already applied.
+    """
+
+    def __init__(self, path: Path, half_life_days: float = 30.0):
+        self.path = Path(path)
+        self.decay_rate = np.log(2) / (half_life_days * 86400)
+
+        self.user_ids = np.array([], dtype=np.int64)
+        self.vectors = np.zeros((0, 0), dtype=np.float16)
+        self.weights = np.array([], dtype=np.float32)
+        self.updated_at = np.array([], dtype=np.float64)
+        self.last_view_id = 0
+
+        self._row_by_user: Dict[int, int] = {}
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1]
+
+    def load(self) -> bool:
+        """Read the persisted store; returns False when there is none"""
+        try:
+            mtime = self.path.stat().st_mtime
+            with np.load(self.path) as data:
+                user_ids = data['user_ids']
+                vectors = data['vectors']
+                weights = data['weights']
+                updated_at = data['updated_at']
+                last_view_id = int(data['last_view_id'])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load taste vectors: {e}")
+            return False
+
+        with self._lock:
+            self.user_ids, self.vectors, self.weights, self.updated_at = user_ids, vectors, weights, updated_at
+            self.last_view_id = last_view_id
+            self._row_by_user = {int(user_id): row for row, user_id in enumerate(user_ids)}
+            self._loaded_mtime = mtime
+        return True
+
+    def refresh(self) -> bool:
+        """Reload if the pipeline has written a newer file since the last load"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._loaded_mtime:
+            return self.load()
+        return False
+
+    def save(self):
+        """Persist atomically so readers never see a partial file"""
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        with self._lock:
+            np.savez(
+                tmp_path,
+                user_ids=self.user_ids,
+                vectors=self.vectors,
+                weights=self.weights,
+                updated_at=self.updated_at,
+                last_view_id=np.int64(self.last_view_id)
+            )
+        os.replace(tmp_path, self.path)
+
+    def get(self, user_id: int) -> Optional[np.ndarray]:
+        """Unit-length float32 taste vector, or None for users without history"""
+        with self._lock:
+            row = self._row_by_user.get(int(user_id))
+            if row is None:
+                return None
+            vector = self.vectors[row].astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def add_views(
+        self,
+        user_ids: np.ndarray,
+        embeddings: np.ndarray,
+        view_weights: np.ndarray,
+        timestamps: np.ndarray,
+        now: Optional[float] = None
+    ) -> int:
+        """Fold a batch of views (one embedding per view) into the taste vectors.
+
+        ``timestamps`` are epoch seconds; each view's weight decays from its own
+        time and every existing vector decays from its ``updated_at``, both to
+        ``now``. Returns the number of users touched.
+        """
+        if len(user_ids) == 0:
+            return 0
+        now = time.time() if now is None else now
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        view_weights = np.asarray(view_weights, dtype=np.float64) * np.exp(
+            -self.decay_rate * np.maximum(now - np.asarray(timestamps, dtype=np.float64), 0)
+        )
+
+        batch_users, inverse = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        weighted_sums = np.zeros((len(batch_users), embeddings.shape[1]), dtype=np.float64)
+        np.add.at(weighted_sums, inverse, embeddings * view_weights[:, None])
+        batch_weights = np.bincount(inverse, weights=view_weights, minlength=len(batch_users))
+
+        with self._lock:
+            if len(self.user_ids) == 0:
+                self.vectors = np.zeros((0, embeddings.shape[1]), dtype=np.float16)
+            elif self.dimension != embeddings.shape[1]:
+                raise ValueError(f"Taste vectors have dimension {self.dimension}, views have {embeddings.shape[1]}")
+
+            rows = np.fromiter(
+                (self._row_by_user.get(int(user_id), -1) for user_id in batch_users),
+                dtype=np.int64, count=len(batch_users)
+            )
+            existing = rows >= 0
+            if np.any(existing):
+                old_rows = rows[existing]
+                old_weights = self.weights[old_rows] * np.exp(
+                    -self.decay_rate * np.maximum(now - self.updated_at[old_rows], 0)
+                )
+                weighted_sums[existing] += self.vectors[old_rows].astype(np.float64) * old_weights[:, None]
+                batch_weights[existing] += old_weights
+
+            means = weighted_sums / np.maximum(batch_weights, 1e-12)[:, None]
+
+            new_users = batch_users[~existing]
+            if len(new_users):
+                start = len(self.user_ids)
+                rows[~existing] = np.arange(start, start + len(new_users))
+                self.user_ids = np.concatenate([self.user_ids, new_users])
+                self.vectors = np.vstack([self.vectors, np.zeros((len(new_users), self.dimension), dtype=np.float16)])
+                self.weights = np.concatenate([self.weights, np.zeros(len(new_users), dtype=np.float32)])
+                self.updated_at = np.concatenate([self.updated_at, np.zeros(len(new_users))])
+                self._row_by_user.update({int(user_id): int(row) for user_id, row in zip(new_users, rows[~existing])})
+
+            self.vectors[rows] = means.astype(np.float16)
+            self.weights[rows] = batch_weights.astype(np.float32)
+            self.updated_at[rows] = now
+
+        return len(batch_users)
+
+    def reset(self, dimension: int = 0):
+        """Drop every vector, e.g. after the search index switched embedding models"""
+        with self._lock:
+            self._reset(dimension)
+
+    def _reset(self, dimension: int):
+        self.user_ids = np.array([], dtype=np.int64)
+        self.vectors = np.zeros((0, dimension), dtype=np.float16)
+        self.weights = np.array([], dtype=np.float32)
+        self.updated_at = np.array([], dtype=np.float64)
+        self.last_view_id = 0
+        self._row_by_user = {}
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self.user_ids),
+            "dimension": self.dimension,
+            "last_view_id": self.last_view_id,
+            "bytes": int(self.vectors.nbytes)
+        }
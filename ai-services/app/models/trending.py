@@ -0,0 +1,188 @@
+"""
+Trending-now detection for LCMTV recommendations
+Per-video view counts in a ring buffer of short time slots; a video trends
+when its last hour is far above its own recent baseline
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.logging import get_logger
+
+logger = get_logger("trending")
+
+SLOT_SECONDS = 15 * 60
+
+# 48 hours of 15-minute slots: the last hour is compared against the 24 hours before it
+N_SLOTS = 192
+RECENT_SLOTS = 4
+BASELINE_SLOTS = 96
+
+# content_engagement events that count toward trending, at a fraction of a view
+ENGAGEMENT_EVENT_TYPES = ("reaction_add", "comment_post", "share", "like")
+ENGAGEMENT_EVENT_WEIGHT = 0.5
+
+
+def slot_of(timestamp: float) -> int:
+    """Absolute slot number of an epoch timestamp"""
+    return int(timestamp // SLOT_SECONDS)
+
+
+class TrendingDetector:
+    """Sliding-window view counts per video and a velocity z-score ranking.
+
+    ``counts`` is an (n_videos, N_SLOTS) float32 ring buffer indexed by
+    ``slot % N_SLOTS``; advancing the clock zeroes the slots that wrap around,
+    so memory stays fixed no matter how many events arrive. ``last_view_id``
+    and ``last_event_id`` are the high-water marks of the source tables.
+    """
+
+    def __init__(self, path: Path, min_recent_views: float = 5.0):
+        self.path = Path(path)
+        self.min_recent_views = min_recent_views
+
+        self.video_ids = np.array([], dtype=np.int64)
+        self.counts = np.zeros((0, N_SLOTS), dtype=np.float32)
+        self.current_slot = 0
+        self.last_view_id = 0
+        self.last_event_id = 0
+
+        self._row_by_video: Dict[int, int] = {}
+        self._ranking: Tuple[np.ndarray, np.ndarray, np.ndarray] = self.compute_ranking()
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def advance(self, slot: int):
+        """Move the clock to ``slot``, clearing the slots that fall out of the window"""
+        if slot <= self.current_slot:
+            return
+        steps = min(slot - self.current_slot, N_SLOTS)
+        cleared = (np.arange(self.current_slot + 1, self.current_slot + 1 + steps)) % N_SLOTS
+        self.counts[:, cleared] = 0
+        self.current_slot = slot
+
+    def add(self, video_ids: np.ndarray, slots: np.ndarray, weights: np.ndarray):
+        """Count weighted events; events older than the window are ignored"""
+        video_ids = np.asarray(video_ids, dtype=np.int64)
+        slots = np.asarray(slots, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        self.advance(int(slots.max()) if len(slots) else self.current_slot)
+        keep = slots > self.current_slot - N_SLOTS
+        video_ids, slots, weights = video_ids[keep], slots[keep], weights[keep]
+        if len(video_ids) == 0:
+            return
+
+        new_videos = np.setdiff1d(video_ids, self.video_ids)
+        if len(new_videos):
+            start = len(self.video_ids)
+            self.video_ids = np.concatenate([self.video_ids, new_videos])
+            self.counts = np.vstack([self.counts, np.zeros((len(new_videos), N_SLOTS), dtype=np.float32)])
+            self._row_by_video.update({int(v): start + i for i, v in enumerate(new_videos)})
+
+        rows = np.fromiter((self._row_by_video[int(v)] for v in video_ids), dtype=np.int64, count=len(video_ids))
+        np.add.at(self.counts, (rows, slots % N_SLOTS), weights)
+
+    def compact(self):
+        """Forget videos with no events left in the window"""
+        active = self.counts.any(axis=1)
+        if active.all():
+            return
+        self.video_ids = self.video_ids[active]
+        self.counts = self.counts[active]
+        self._row_by_video = {int(v): i for i, v in enumerate(self.video_ids)}
+
+    def _window(self, newest_offset: int, length: int) -> np.ndarray:
+        """Counts for ``length`` slots ending ``newest_offset`` slots before the current one"""
+        newest = self.current_slot - newest_offset
+        return self.counts[:, np.arange(newest - length + 1, newest + 1) % N_SLOTS]
+
+    def compute_ranking(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(video_ids, z_scores, recent_views) of trending videos, best first.
+
+        z = (recent - expected) / sqrt(variance + expected + 1), where expected
+        and variance come from the video's baseline slots scaled to the recent
+        window; the Poisson term keeps sparse videos from spiking on a few views.
+        """
+        if len(self.video_ids) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32), np.array([], dtype=np.float32)
+
+        recent = self._window(0, RECENT_SLOTS).sum(axis=1)
+        baseline = self._window(RECENT_SLOTS, BASELINE_SLOTS)
+        expected = baseline.mean(axis=1) * RECENT_SLOTS
+        variance = baseline.var(axis=1) * RECENT_SLOTS
+        z_scores = (recent - expected) / np.sqrt(variance + expected + 1.0)
+
+        trending = np.flatnonzero((recent >= self.min_recent_views) & (z_scores > 0))
+        trending = trending[np.argsort(-z_scores[trending], kind="stable")]
+        return self.video_ids[trending], z_scores[trending].astype(np.float32), recent[trending].astype(np.float32)
+
+    def top(self, n: int) -> List[Tuple[int, float, float]]:
+        """Top n (video_id, z_score, recent_views) from the last loaded ranking"""
+        video_ids, z_scores, recent = self._ranking
+        return [
+            (int(video_ids[i]), float(z_scores[i]), float(recent[i]))
+            for i in range(min(n, len(video_ids)))
+        ]
+
+    def scores_for(self, video_ids: np.ndarray) -> np.ndarray:
+        """Trending z-score of each given video (0 for videos not trending)"""
+        trending_ids, z_scores, _ = self._ranking
+        lookup = dict(zip(trending_ids.tolist(), z_scores.tolist()))
+        return np.fromiter((lookup.get(int(v), 0.0) for v in video_ids), dtype=np.float32, count=len(video_ids))
+
+    def save(self):
+        tmp_path = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            video_ids=self.video_ids,
+            counts=self.counts,
+            current_slot=np.int64(self.current_slot),
+            last_view_id=np.int64(self.last_view_id),
+            last_event_id=np.int64(self.last_event_id)
+        )
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        try:
+            mtime = self.path.stat().st_mtime
+            with np.load(self.path) as data:
+                video_ids = data['video_ids']
+                counts = data['counts']
+                current_slot = int(data['current_slot'])
+                last_view_id = int(data['last_view_id'])
+                last_event_id = int(data['last_event_id'])
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to load trending counts: {e}")
+            return False
+
+        with self._lock:
+            self.video_ids, self.counts, self.current_slot = video_ids, counts, current_slot
+            self.last_view_id, self.last_event_id = last_view_id, last_event_id
+            self._row_by_video = {int(v): i for i, v in enumerate(video_ids)}
+            self._ranking = self.compute_ranking()
+            self._loaded_mtime = mtime
+        return True
+
+    def refresh(self) -> bool:
+        """Reload if the processing service has written newer counts"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != self._loaded_mtime:
+            return self.load()
+        return False
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "videos_tracked": len(self.video_ids),
+            "trending": len(self._ranking[0]),
+            "current_slot": self.current_slot,
+            "bytes": int(self.counts.nbytes)
+        }
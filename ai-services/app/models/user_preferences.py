@@ -0,0 +1,111 @@
+"""
+User preference lookups for LCMTV personalization
+TTL-cached reads of the user_preferences table with a batch loader
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..core.database import execute_query
+from ..core.logging import get_logger
+from ..utils.cache import TTLCache
+
+logger = get_logger("user_preferences")
+
+# Cached for users without a user_preferences row, so they are not re-queried every search
+NO_PREFERENCES: Dict[str, Any] = {'preferred_categories': [], 'time_preferences': {}, 'content_preferences': {}}
+
+
+def _parse_json(raw: Any, default):
+    if raw is None or raw == '':
+        return default
+    if isinstance(raw, (list, dict)):
+        return raw
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_preferences(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode the JSON columns of one user_preferences row"""
+    categories = _parse_json(row.get('preferred_categories'), [])
+    return {
+        'preferred_categories': [str(c) for c in categories] if isinstance(categories, list) else [],
+        'time_preferences': _parse_json(row.get('time_preferences'), {}),
+        'content_preferences': _parse_json(row.get('content_preferences'), {})
+    }
+
+
+class UserPreferenceCache:
+    """Parsed user preferences keyed by user id.
+
+    Entries expire after ``ttl_seconds``; the profile-update job calls
+    ``invalidate`` once new preferences are written so changes show up
+    without waiting for expiry.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_size: int = 10000):
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_size=max_size)
+
+    def get(self, user_id: int) -> Dict[str, Any]:
+        """Preferences for one user (NO_PREFERENCES when the user has none)"""
+        return self.get_many([user_id])[int(user_id)]
+
+    def get_many(self, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Preferences for several users, loading all cache misses in one query"""
+        found: Dict[int, Dict[str, Any]] = {}
+        missing: List[int] = []
+        for user_id in dict.fromkeys(int(u) for u in user_ids):
+            cached = self._cache.get(user_id)
+            if cached is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = cached
+
+        if missing:
+            found.update(self._load(missing))
+        return found
+
+    def _load(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        placeholders = ", ".join(["%s"] * len(user_ids))
+        query = f"""
+        SELECT user_id, preferred_categories, time_preferences, content_preferences
+        FROM user_preferences WHERE user_id IN ({placeholders})
+        """
+        try:
+            rows = execute_query(query, tuple(user_ids))
+        except Exception as e:
+            # Not cached, so the next search retries once the database is back
+            logger.warning(f"Failed to load preferences for {len(user_ids)} users: {e}")
+            return {user_id: NO_PREFERENCES for user_id in user_ids}
+
+        loaded = {user_id: NO_PREFERENCES for user_id in user_ids}
+        for row in rows or []:
+            loaded[int(row['user_id'])] = parse_preferences(row)
+
+        for user_id, preferences in loaded.items():
+            self._cache.set(user_id, preferences)
+        return loaded
+
+    def invalidate(self, user_ids: Optional[Iterable[int]] = None, reload: bool = False) -> int:
+        """Drop cached preferences for the given users (all users when None).
+
+        With ``reload``, users that were cached (i.e. recently active) are
+        re-read in a single query instead of on their next search.
+        Returns the number of users reloaded.
+        """
+        if user_ids is None:
+            self._cache.clear()
+            return 0
+
+        user_ids = [int(u) for u in user_ids]
+        active = [u for u in user_ids if self._cache.get(u) is not None] if reload else []
+        for user_id in user_ids:
+            self._cache.invalidate(user_id)
+
+        if active:
+            self._load(active)
+        return len(active)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return self._cache.get_stats()
@@ -4,14 +4,17 @@ Handles periodic data processing and user profile updates
 """
 from fastapi import FastAPI, BackgroundTasks
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import asyncio
-from datetime import datetime
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
 import json
+import httpx
 
 from ..core.config import settings
 from ..core.logging import setup_logging, get_logger
-from ..utils.data_pipeline import data_pipeline
+from . import processing_jobs
 
 # Setup logging
 setup_logging()
@@ -31,12 +34,37 @@ processing_status = {
     "next_run": None,
     "current_task": None,
     "progress": 0,
-    "errors": []
+    "errors": [],
+    "stages": {},
+    "tasks": {}
 }
 
+# Failures kept for /status across runs, oldest dropped first
+MAX_ERRORS = 50
+
+# Task -> (days_back, interval, offset of the first run from SCHEDULE_EPOCH).
+# A task is due at every interval from its first run and waits for the task
+# before it to finish, so it is never skipped for starting a minute late.
+SCHEDULE_EPOCH = datetime(2024, 1, 7)  # A Sunday, at midnight
+SCHEDULE: Dict[str, Tuple[int, timedelta, timedelta]] = {
+    "update_profiles": (30, timedelta(days=1), timedelta(hours=2)),        # Daily at 2 AM
+    "full_refresh": (90, timedelta(weeks=1), timedelta(hours=3)),          # Sundays at 3 AM
+    "train_als": (90, timedelta(days=1), timedelta(hours=4)),              # Daily at 4 AM, reads the snapshot
+    "refresh_snapshot": (30, timedelta(hours=1), timedelta(minutes=45)),   # Hourly at :45
+    "update_taste_vectors": (90, timedelta(hours=1), timedelta(minutes=30)),
+    "update_popularity": (30, timedelta(minutes=5), timedelta(0)),
+    "update_trending": (2, timedelta(minutes=5), timedelta(minutes=2)),    # Trending uses 15-minute slots
+    "update_features": (7, timedelta(minutes=5), timedelta(minutes=3)),
+}
+SCHEDULER_TICK_SECONDS = 10
+
+# Pipeline stages run in worker processes, so CPU-bound builds neither block
+# the event loop (/status, /health) nor share one core through the GIL
+process_pool = None
+
 
 class ProcessingRequest(BaseModel):
-    task: str  # "update_profiles", "export_training_data", "full_refresh"
+    task: str  # "update_profiles", "update_taste_vectors", "update_popularity", "update_trending", "update_features", "refresh_snapshot", "train_als", "export_training_data", "full_refresh"
     days_back: Optional[int] = 30
     force_refresh: bool = False
 
@@ -49,6 +77,8 @@ class ProcessingStatus(BaseModel):
     progress: int
     errors: list
     status: str
+    stages: Dict[str, Any] = {}
+    tasks: Dict[str, Any] = {}
 
 
 @app.on_event("startup")
@@ -56,10 +86,21 @@ async def startup_event():
     """Initialize data processing service"""
     logger.info("Starting LCMTV Data Processing Service")
 
+    global process_pool
+    process_pool = processing_jobs.create_pool()
+    logger.info(f"Processing pool started with {processing_jobs.worker_count()} workers")
+
     # Schedule periodic tasks
     asyncio.create_task(schedule_periodic_tasks())
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the worker pool"""
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -80,7 +121,9 @@ async def get_processing_status():
         current_task=processing_status["current_task"],
         progress=processing_status["progress"],
         errors=processing_status["errors"][-10:],  # Last 10 errors
-        status="running" if processing_status["is_running"] else "idle"
+        status="running" if processing_status["is_running"] else "idle",
+        stages=processing_status["stages"],
+        tasks=processing_status["tasks"]
     )
 
 
@@ -95,7 +138,9 @@ async def trigger_processing(request: ProcessingRequest, background_tasks: Backg
             current_task=processing_status["current_task"],
             progress=processing_status["progress"],
             errors=["Processing already running"],
-            status="busy"
+            status="busy",
+            stages=processing_status["stages"],
+            tasks=processing_status["tasks"]
         )
 
     # Start background processing
@@ -113,19 +158,39 @@ async def trigger_processing(request: ProcessingRequest, background_tasks: Backg
 
 
 async def run_processing_task(task: str, days_back: int = 30, force_refresh: bool = False):
-    """Execute data processing task in background"""
+    """Execute data processing task in background.
+
+    Each task keeps its own entry in ``processing_status["tasks"]`` (state,
+    last run, last success, last error); failures are appended to the shared
+    error list and stay there after other tasks succeed.
+    """
     global processing_status
 
+    task_status = processing_status["tasks"].setdefault(task, {})
+    task_status.update(state="running", started_at=datetime.now().isoformat())
+    started = time.perf_counter()
     try:
         processing_status["is_running"] = True
         processing_status["current_task"] = task
         processing_status["progress"] = 0
-        processing_status["errors"] = []
+        processing_status["stages"] = {}
 
         logger.info(f"Starting data processing task: {task}")
 
         if task == "update_profiles":
-            await update_user_profiles(days_back)
+            await update_user_profiles(days_back, rebuild=force_refresh)
+        elif task == "update_taste_vectors":
+            await update_taste_vectors(days_back)
+        elif task == "update_popularity":
+            await update_popularity()
+        elif task == "update_trending":
+            await update_trending()
+        elif task == "update_features":
+            await update_user_features()
+        elif task == "refresh_snapshot":
+            await refresh_analytics_snapshot()
+        elif task == "train_als":
+            await train_als_model(days_back)
         elif task == "export_training_data":
             await export_training_data(days_back)
         elif task == "full_refresh":
@@ -134,108 +199,224 @@ async def run_processing_task(task: str, days_back: int = 30, force_refresh: boo
             raise ValueError(f"Unknown task: {task}")
 
         processing_status["last_run"] = datetime.now().isoformat()
+        task_status.update(state="done", last_run=processing_status["last_run"],
+                           last_success=processing_status["last_run"])
         logger.info(f"Data processing task completed: {task}")
 
     except Exception as e:
         error_msg = f"Processing task failed: {str(e)}"
         logger.error(error_msg)
-        processing_status["errors"].append({
+        error = {
             "timestamp": datetime.now().isoformat(),
             "task": task,
             "error": error_msg
-        })
+        }
+        processing_status["errors"].append(error)
+        del processing_status["errors"][:-MAX_ERRORS]
+        task_status.update(state="failed", last_run=error["timestamp"], last_error=error)
 
     finally:
+        task_status["seconds"] = round(time.perf_counter() - started, 2)
         processing_status["is_running"] = False
         processing_status["current_task"] = None
         processing_status["progress"] = 100
 
 
-async def update_user_profiles(days_back: int):
-    """Update user profiles with latest behavior data"""
-    logger.info(f"Updating user profiles with {days_back} days of data")
+async def run_stage(stage: str, *args, label: Optional[str] = None) -> Dict[str, Any]:
+    """Run a pipeline stage in the worker pool, recording its state, timing and result"""
+    global process_pool
+    pool = process_pool
+    entry = processing_status["stages"].setdefault(label or stage, {})
+    entry.update(state="running", started_at=datetime.now().isoformat())
+    started = time.perf_counter()
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(pool, processing_jobs.run_stage, stage, *args)
+    except Exception as e:
+        entry.update(state="failed", seconds=round(time.perf_counter() - started, 2), error=str(e))
+        if isinstance(e, BrokenProcessPool) and process_pool is pool:
+            # A worker died (e.g. out of memory); later stages get a fresh pool
+            process_pool = processing_jobs.create_pool()
+        raise
+    else:
+        entry.update(state="done", seconds=round(time.perf_counter() - started, 2), result=result)
+        return result
+    finally:
+        stages = processing_status["stages"].values()
+        finished = sum(stage_state["state"] in ("done", "failed") for stage_state in stages)
+        processing_status["progress"] = int(100 * finished / len(stages))
 
-    # Step 1: Collect interactions
-    processing_status["progress"] = 10
-    interactions_df = data_pipeline.collect_user_interactions(days_back)
 
-    if interactions_df.empty:
-        logger.warning("No interaction data found for profile updates")
-        return
+def plan_stages(*labels: str):
+    """Register the stages a task will run up front, so progress counts the pending ones"""
+    processing_status["stages"] = {label: {"state": "pending"} for label in labels}
 
-    # Step 2: Build user profiles
-    processing_status["progress"] = 50
-    user_profiles_df = data_pipeline.build_user_profiles(interactions_df)
 
-    if user_profiles_df.empty:
-        logger.warning("No user profiles generated")
+async def gather_stages(*stages) -> list:
+    """Run stages side by side; all of them finish before the first failure is raised"""
+    results = await asyncio.gather(*stages, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def profile_shard_labels(n_shards: int) -> list:
+    return ["profiles"] if n_shards == 1 else [f"profiles[{shard}]" for shard in range(n_shards)]
+
+
+def profile_stage_labels(n_shards: int) -> list:
+    return ["profile_views", *profile_shard_labels(n_shards)]
+
+
+async def update_user_profiles(days_back: int, rebuild: bool = False):
+    """Fold new views into the daily profile buckets and rewrite the changed users' preferences"""
+    # Users are sharded by id across the pool; each shard keeps its own bucket file.
+    # The new views are read once and split by shard before the shards run.
+    n_shards = processing_jobs.worker_count()
+    logger.info(f"Updating user profiles over a {days_back}-day window in {n_shards} shards")
+
+    await run_stage("profile_views", days_back, rebuild, n_shards)
+    results = await gather_stages(*(
+        run_stage("profiles", days_back, shard, n_shards, label=label)
+        for shard, label in enumerate(profile_shard_labels(n_shards))
+    ))
+    user_ids = sorted(user_id for result in results for user_id in result.pop('user_ids'))
+    logger.info(f"Refreshed profile buckets: {results}")
+
+    if not user_ids:
+        logger.info("No user profiles changed")
         return
 
-    # Step 3: Update database
-    processing_status["progress"] = 80
-    data_pipeline.update_user_profiles(user_profiles_df)
+    # Drop the search service's cached preferences for these users
+    await notify_preferences_updated(user_ids)
+    logger.info(f"Updated profiles for {len(user_ids)} users")
 
-    processing_status["progress"] = 100
-    logger.info(f"Updated profiles for {len(user_profiles_df)} users")
 
+async def notify_preferences_updated(user_ids: list):
+    """Invalidate cached user preferences in the search service (best effort)"""
+    url = f"{settings.search_service_url}/api/v1/search/user-preferences/invalidate"
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.post(url, json={"user_ids": user_ids, "reload": True})
+            response.raise_for_status()
+        logger.info(f"Invalidated cached preferences for {len(user_ids)} users")
+    except Exception as e:
+        # Cached entries still expire after USER_PREFERENCES_TTL
+        logger.warning(f"Failed to invalidate search preference cache: {e}")
+
+
+async def update_taste_vectors(days_back: int):
+    """Fold new views into the user taste vectors used by search and recommendations"""
+    logger.info("Updating user taste vectors")
+    result = await run_stage("taste_vectors", days_back)
+    logger.info(f"Updated taste vectors: {result}")
+
+
+async def update_popularity():
+    """Fold new views into the hourly buckets and republish the popularity leaderboards"""
+    result = await run_stage("popularity")
+    logger.info(f"Updated popularity leaderboards: {result}")
+
+
+async def update_trending():
+    """Fold new views and engagement events into the trending counts"""
+    result = await run_stage("trending")
+    logger.info(f"Updated trending counts: {result}")
+
+
+async def update_user_features():
+    """Fold new views into the online user features used at request time"""
+    result = await run_stage("features")
+    logger.info(f"Updated online user features: {result}")
+
+
+async def refresh_analytics_snapshot():
+    """Append new views to the local Parquet snapshot that model builds read instead of MySQL"""
+    result = await run_stage("refresh_snapshot")
+    logger.info(f"Refreshed analytics snapshot: {result}")
 
-async def export_training_data(days_back: int):
-    """Export training data for model updates"""
-    logger.info(f"Exporting training data for {days_back} days")
 
-    import os
-    output_dir = "data/training"
-    os.makedirs(output_dir, exist_ok=True)
+async def train_als_model(days_back: int):
+    """Retrain the implicit ALS recommender; services pick up the new factors on their next request"""
+    logger.info(f"Training ALS model on {days_back} days of views")
+    result = await run_stage("train_als", days_back)
+    logger.info(f"Trained ALS model: {result}")
 
-    processing_status["progress"] = 25
-    result = data_pipeline.export_training_data(output_dir, days_back)
 
-    processing_status["progress"] = 100
+async def export_training_data(days_back: int):
+    """Append new days of interactions to the Parquet training export"""
+    logger.info(f"Exporting training data for {days_back} days")
+    result = await run_stage("export", "data/training", days_back, processing_jobs.worker_count())
     logger.info(f"Exported training data: {result}")
 
 
 async def full_data_refresh():
     """Perform complete data refresh"""
     logger.info("Starting full data refresh")
+    plan_stages(
+        "refresh_snapshot", *profile_stage_labels(processing_jobs.worker_count()),
+        "taste_vectors", "train_als", "popularity", "export"
+    )
 
-    # Update profiles (30 days)
-    processing_status["progress"] = 10
-    await update_user_profiles(30)
+    # Catch the analytics snapshot up first; the builds below read it
+    await refresh_analytics_snapshot()
 
-    # Update profiles (90 days for training)
-    processing_status["progress"] = 40
-    await update_user_profiles(90)
+    # Rebuild the profile buckets from the whole 30-day window, then export them with the interactions
+    async def profiles_then_export():
+        await update_user_profiles(30, rebuild=True)
+        await export_training_data(90)
 
-    # Export training data
-    processing_status["progress"] = 70
-    await export_training_data(90)
+    # The remaining builds write separate stores, so they run side by side across the pool
+    await gather_stages(
+        profiles_then_export(),
+        update_taste_vectors(90),
+        train_als_model(90),
+        update_popularity()
+    )
 
-    processing_status["progress"] = 100
     logger.info("Full data refresh completed")
 
 
+def next_due(task: str, after: datetime) -> datetime:
+    """First scheduled time of a task strictly after ``after``"""
+    _, interval, offset = SCHEDULE[task]
+    first_run = SCHEDULE_EPOCH + offset
+    return first_run + ((after - first_run) // interval + 1) * interval
+
+
+def take_due_task(due_at: Dict[str, datetime], now: datetime) -> Optional[str]:
+    """The longest-overdue task, moved on to its next slot; None when nothing is due.
+
+    A task overdue by several intervals runs once.
+    """
+    due = [task for task, at in due_at.items() if at <= now]
+    if not due:
+        return None
+    task = min(due, key=due_at.get)
+    due_at[task] = next_due(task, now)
+    return task
+
+
 async def schedule_periodic_tasks():
-    """Schedule periodic data processing tasks"""
+    """Start scheduled tasks as they fall due, one at a time, oldest due first"""
+    now = datetime.now()
+    due_at = {task: next_due(task, now) for task in SCHEDULE}
     while True:
         try:
-            now = datetime.now()
-
-            # Update user profiles daily at 2 AM
-            if now.hour == 2 and now.minute == 0 and not processing_status["is_running"]:
-                logger.info("Running scheduled user profile update")
-                asyncio.create_task(run_processing_task("update_profiles", 30, False))
+            if not processing_status["is_running"]:
+                task = take_due_task(due_at, datetime.now())
+                if task is not None:
+                    logger.info(f"Running scheduled task: {task}")
+                    asyncio.create_task(run_processing_task(task, SCHEDULE[task][0], False))
 
-            # Full refresh weekly on Sunday at 3 AM
-            elif (now.weekday() == 6 and now.hour == 3 and now.minute == 0
-                  and not processing_status["is_running"]):
-                logger.info("Running scheduled full data refresh")
-                asyncio.create_task(run_processing_task("full_refresh", 90, False))
+            for task, at in due_at.items():
+                processing_status["tasks"].setdefault(task, {})["next_run"] = at.isoformat()
+            processing_status["next_run"] = min(due_at.values()).isoformat()
 
         except Exception as e:
             logger.error(f"Error in periodic task scheduler: {str(e)}")
 
-        # Check every minute
-        await asyncio.sleep(60)
+        await asyncio.sleep(SCHEDULER_TICK_SECONDS)
 
 
 @app.post("/admin/force-refresh")
@@ -0,0 +1,52 @@
+"""
+Worker-side pipeline stages for the LCMTV data processing service
+Stages run in the service's process pool; each worker imports its own
+data pipeline, so only stage names, arguments and result dicts cross
+process boundaries
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict
+
+from ..core.config import settings
+from ..core.logging import setup_logging
+
+
+def worker_count() -> int:
+    """Pool size: PROCESSING_WORKERS, or every core when unset"""
+    return settings.processing_workers or os.cpu_count() or 1
+
+
+def create_pool() -> ProcessPoolExecutor:
+    # spawn, not fork: the service process runs an event loop and HTTP client threads
+    return ProcessPoolExecutor(
+        max_workers=worker_count(), mp_context=get_context("spawn"), initializer=setup_logging
+    )
+
+
+def _pipeline():
+    from ..utils.data_pipeline import data_pipeline
+    return data_pipeline
+
+
+STAGES: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "refresh_snapshot": lambda: _pipeline().refresh_analytics_snapshot(),
+    "profile_views": lambda window_days, rebuild, n_shards: _pipeline().read_profile_views(
+        window_days, rebuild, n_shards=n_shards
+    ),
+    "profiles": lambda window_days, shard, n_shards: _pipeline().apply_profile_views(window_days, shard, n_shards),
+    "taste_vectors": lambda days_back: _pipeline().update_taste_vectors(days_back),
+    "popularity": lambda: _pipeline().update_popularity(),
+    "trending": lambda: _pipeline().update_trending(),
+    "features": lambda: _pipeline().update_user_features(),
+    "train_als": lambda days_back: _pipeline().train_als_model(days_back),
+    "export": lambda output_path, days_back, profile_shards: _pipeline().export_training_data(
+        output_path, days_back, profile_shards=profile_shards
+    ),
+}
+
+
+def run_stage(stage: str, *args) -> Dict[str, Any]:
+    """Run one pipeline stage in a worker process; the entry point submitted to the pool"""
+    return STAGES[stage](*args)
@@ -4,13 +4,14 @@ FastAPI service for LCMTV Recommendation Engine
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import logging
 from datetime import datetime
 import asyncio
 
 from ..core.config import settings
 from ..core.logging import setup_logging, get_logger
+from ..core.serialization import FastJSONResponse
 from ..models.recommendation_engine import RecommendationEngine
 
 # Setup logging
@@ -23,7 +24,8 @@ app = FastAPI(
     description="AI-powered video recommendation engine",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -38,6 +40,13 @@ app.add_middleware(
 # Initialize recommendation engine
 recommendation_engine = RecommendationEngine()
 
+# Reported in responses for each selectable algorithm
+ALGORITHM_VERSIONS = {
+    "hybrid": "1.0.0",
+    "als": "implicit_als",
+    "collaborative": "item_cosine",
+}
+
 
 # Pydantic models
 class RecommendationRequest(BaseModel):
@@ -46,6 +55,9 @@ class RecommendationRequest(BaseModel):
     limit: int = Field(10, ge=1, le=50, description="Number of recommendations to return")
     include_explanations: bool = Field(True, description="Include recommendation explanations")
     use_cache: bool = Field(True, description="Use cached recommendations if available")
+    algorithm: Literal["hybrid", "als", "collaborative"] = Field(
+        "hybrid", description="Recommendation model: staged hybrid, implicit ALS or item-item collaborative"
+    )
 
 
 class RecommendationResponse(BaseModel):
@@ -54,6 +66,8 @@ class RecommendationResponse(BaseModel):
     generated_at: str = Field(..., description="Timestamp when recommendations were generated")
     algorithm_version: str = Field(..., description="Version of recommendation algorithm")
     cache_used: bool = Field(..., description="Whether cached results were used")
+    stage_timings_ms: Optional[Dict[str, float]] = Field(None, description="Milliseconds per pipeline stage")
+    window: Optional[Literal["24h", "7d", "30d"]] = Field(None, description="Popularity window of the ranking")
 
 
 class UserInsightsRequest(BaseModel):
@@ -76,6 +90,8 @@ async def startup_event():
         logger.info("Pre-building recommendation matrices...")
         recommendation_engine.build_user_item_matrix()
         recommendation_engine.calculate_item_similarity()
+        recommendation_engine.build_engagement_stats()
+        recommendation_engine.load_video_embeddings()
         logger.info("Recommendation engine initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize recommendation engine: {e}")
@@ -105,12 +121,26 @@ async def get_recommendations(request: RecommendationRequest, background_tasks:
     logger.info(f"Processing recommendation request for user {request.user_id}")
 
     try:
-        # Get recommendations
-        recommendations = recommendation_engine.get_hybrid_recommendations(
-            user_id=request.user_id,
-            context_video_id=request.context_video_id,
-            n_recommendations=request.limit
-        )
+        # Get recommendations; stage timings stay empty when the cache answered
+        stage_timings: Dict[str, float] = {}
+        if request.algorithm == "als":
+            recommendations = recommendation_engine.get_als_recommendations(
+                user_id=request.user_id,
+                n_recommendations=request.limit,
+                context_video_id=request.context_video_id
+            )
+        elif request.algorithm == "collaborative":
+            recommendations = recommendation_engine.get_collaborative_recommendations(
+                user_id=request.user_id,
+                n_recommendations=request.limit
+            )
+        else:
+            recommendations = recommendation_engine.get_hybrid_recommendations(
+                user_id=request.user_id,
+                context_video_id=request.context_video_id,
+                n_recommendations=request.limit,
+                timings=stage_timings
+            )
 
         # Enrich with video metadata if requested
         if request.include_explanations:
@@ -120,13 +150,15 @@ async def get_recommendations(request: RecommendationRequest, background_tasks:
 
         logger.info(f"Generated {len(recommendations)} recommendations for user {request.user_id} in {processing_time:.3f}s")
 
-        return RecommendationResponse(
-            recommendations=recommendations,
-            total_count=len(recommendations),
-            generated_at=datetime.now().isoformat(),
-            algorithm_version="1.0.0",
-            cache_used=False  # TODO: Implement cache detection
-        )
+        # Engine dicts may carry numpy scalars; the fast encoder handles them without model validation
+        return FastJSONResponse({
+            "recommendations": recommendations,
+            "total_count": len(recommendations),
+            "generated_at": datetime.now().isoformat(),
+            "algorithm_version": ALGORITHM_VERSIONS[request.algorithm],
+            "cache_used": request.algorithm == "hybrid" and not stage_timings,
+            "stage_timings_ms": stage_timings or None
+        })
 
     except Exception as e:
         logger.error(f"Recommendation error for user {request.user_id}: {str(e)}")
@@ -134,27 +166,54 @@ async def get_recommendations(request: RecommendationRequest, background_tasks:
 
 
 @app.post("/api/v1/recommendations/popular", response_model=RecommendationResponse)
-async def get_popular_recommendations(limit: int = 10):
+async def get_popular_recommendations(
+    limit: int = 10,
+    window: Literal["24h", "7d", "30d"] = "7d",
+    category_id: Optional[int] = None
+):
     """Get popular video recommendations (fallback)"""
     try:
-        recommendations = recommendation_engine.get_popular_recommendations(limit)
+        recommendations = recommendation_engine.get_popular_recommendations(limit, window, category_id)
 
         # Enrich with metadata
         recommendations = await enrich_recommendations_with_metadata(recommendations)
 
-        return RecommendationResponse(
-            recommendations=recommendations,
-            total_count=len(recommendations),
-            generated_at=datetime.now().isoformat(),
-            algorithm_version="popular_fallback",
-            cache_used=False
-        )
+        return FastJSONResponse({
+            "recommendations": recommendations,
+            "total_count": len(recommendations),
+            "generated_at": datetime.now().isoformat(),
+            "algorithm_version": "popular_fallback",
+            "window": window,
+            "cache_used": False
+        })
 
     except Exception as e:
         logger.error(f"Popular recommendations error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to get popular recommendations")
 
 
+@app.post("/api/v1/recommendations/trending", response_model=RecommendationResponse)
+async def get_trending_recommendations(limit: int = 10):
+    """Get videos with the fastest-rising view counts right now"""
+    try:
+        recommendations = recommendation_engine.get_trending_recommendations(limit)
+
+        # Enrich with metadata
+        recommendations = await enrich_recommendations_with_metadata(recommendations)
+
+        return FastJSONResponse({
+            "recommendations": recommendations,
+            "total_count": len(recommendations),
+            "generated_at": datetime.now().isoformat(),
+            "algorithm_version": "trending_zscore",
+            "cache_used": False
+        })
+
+    except Exception as e:
+        logger.error(f"Trending recommendations error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to get trending recommendations")
+
+
 @app.post("/api/v1/user/insights", response_model=UserInsightsResponse)
 async def get_user_insights(request: UserInsightsRequest):
     """Get user behavior insights"""
@@ -201,6 +260,10 @@ async def rebuild_matrices_background():
         logger.info("Rebuilding item similarity matrix...")
         recommendation_engine.calculate_item_similarity()
 
+        logger.info("Rebuilding engagement stats and reloading video embeddings...")
+        recommendation_engine.build_engagement_stats()
+        recommendation_engine.load_video_embeddings()
+
         logger.info("Matrix rebuild completed successfully")
 
     except Exception as e:
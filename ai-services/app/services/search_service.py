@@ -3,15 +3,25 @@ FastAPI service for LCMTV Semantic Search
 Provides AI-powered natural language video search
 """
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, Tuple
 import logging
+import asyncio
+import base64
+import hashlib
+import json
 from datetime import datetime
 
 from ..core.config import settings
 from ..core.logging import setup_logging, get_logger
+from ..core.serialization import FastJSONResponse, dumps
 from ..models.semantic_search import SemanticSearchEngine
+from ..models.autocomplete import PrefixAutocomplete
+from ..utils.micro_batcher import MicroBatcher
+from ..utils.cache import TTLCache
 
 # Setup logging
 setup_logging()
@@ -23,7 +33,8 @@ app = FastAPI(
     description="Semantic search engine for video content",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS
@@ -38,14 +49,43 @@ app.add_middleware(
 # Initialize search engine
 search_engine = SemanticSearchEngine()
 
+# Ranked candidate ids per search, so later pages skip recomputation
+ranking_cache = TTLCache(
+    ttl_seconds=settings.search_cursor_ttl_seconds,
+    max_size=settings.search_cursor_cache_size
+)
+
+# Per-keystroke suggestions served from memory
+autocomplete = PrefixAutocomplete()
+autocomplete.load_query_log(search_engine.cache_dir / "autocomplete_queries.json")
+
+# Concurrent queries are encoded together in one model call
+query_encoder = MicroBatcher(
+    search_engine.encode_queries,
+    max_batch_size=settings.search_batch_max_size,
+    max_wait_ms=settings.search_batch_max_wait_ms
+)
+
 
 # Pydantic models
+class SearchFilters(BaseModel):
+    category_ids: Optional[List[int]] = None
+    target_roles: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+    durations: Optional[List[Literal["short", "medium", "long"]]] = None
+    published_after: Optional[datetime] = None
+    published_before: Optional[datetime] = None
+
+
 class SearchRequest(BaseModel):
     query: str
     user_id: Optional[int] = None
     limit: int = 20
     include_metadata: bool = True
     search_type: str = "hybrid"  # "semantic", "hybrid"
+    filters: Optional[SearchFilters] = None
+    cursor: Optional[str] = None  # next_cursor from the previous page
+    stream: bool = False  # respond with NDJSON lines
 
 
 class SearchResult(BaseModel):
@@ -71,6 +111,13 @@ class SearchResponse(BaseModel):
     query_processed: str
     search_type: str
     generated_at: str
+    total_candidates: int = 0
+    next_cursor: Optional[str] = None
+
+
+class PreferenceInvalidationRequest(BaseModel):
+    user_ids: Optional[List[int]] = None  # None invalidates every user
+    reload: bool = True  # re-read recently active users in one query
 
 
 class SimilarVideosRequest(BaseModel):
@@ -89,19 +136,61 @@ class SimilarVideosResponse(BaseModel):
 async def startup_event():
     """Initialize the search engine on startup"""
     logger.info("Starting LCMTV Search Service")
+    loop = asyncio.get_running_loop()
+
+    # Fast path: serve straight from the persisted index without loading the model
+    if search_engine.load_cached_index():
+        logger.info("Semantic search engine initialized from cached index")
+        refresh_autocomplete()
+        if settings.search_warm_model:
+            loop.run_in_executor(None, warm_model_background)
+        return
+
+    # No usable cache: build in the background so startup stays non-blocking
+    logger.info("No cached semantic index, building in background...")
+    loop.run_in_executor(None, build_index_background)
+
+
+def warm_model_background():
+    """Load the encoder model ahead of the first query"""
+    try:
+        search_engine.load_model()
+    except Exception as e:
+        logger.error(f"Failed to warm semantic search model: {e}")
+
+
+def build_index_background():
+    """Build the semantic index off the event loop"""
     try:
-        # Pre-build semantic index for better performance
-        logger.info("Pre-building semantic search index...")
-        search_engine.build_content_index()
+        search_engine.ensure_index()
+        refresh_autocomplete()
         logger.info("Semantic search engine initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize search engine: {e}")
 
 
+def refresh_autocomplete():
+    """Rebuild suggestions from the current index catalog"""
+    try:
+        if search_engine.video_data is not None:
+            autocomplete.build_from_catalog(search_engine.video_data)
+    except Exception as e:
+        logger.error(f"Failed to build autocomplete index: {e}")
+
+
+def rebuild_autocomplete():
+    """Merge newly promoted queries into the suggestion index"""
+    try:
+        autocomplete.rebuild()
+    except Exception as e:
+        logger.error(f"Failed to rebuild autocomplete index: {e}")
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down LCMTV Search Service")
+    autocomplete.save_query_log(search_engine.cache_dir / "autocomplete_queries.json")
 
 
 @app.get("/health")
@@ -117,61 +206,146 @@ async def health_check():
     }
 
 
+def ranking_cache_key(request: SearchRequest, filters: Optional[Dict[str, Any]], generation: int) -> str:
+    """Stable key for everything that determines a ranking, including the index build it ranks"""
+    payload = json.dumps(
+        {"query": request.query, "type": request.search_type, "user": request.user_id, "filters": filters,
+         "generation": generation},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def encode_cursor(key: str, generation: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{key}:{generation}:{offset}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, int]:
+    """(ranking key, index generation, offset) of a cursor"""
+    try:
+        key, generation, offset = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(":", 2)
+        generation, offset = int(generation), int(offset)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Cursors are only issued inside the ranked candidates
+    if not 0 <= offset <= settings.search_candidate_depth:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key, generation, offset
+
+
+# Response field -> value used when the engine dict omits it
+SEARCH_RESULT_DEFAULTS = {
+    name: None if field.is_required() else field.default
+    for name, field in SearchResult.model_fields.items()
+}
+
+
+def to_search_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Project an engine result dict onto the SearchResult fields.
+
+    Engine dicts are already typed by ``_format_result``, so the response is
+    built from plain dicts instead of validating a model per result.
+    """
+    return {name: result.get(name, default) for name, default in SEARCH_RESULT_DEFAULTS.items()}
+
+
 @app.post("/api/v1/search", response_model=SearchResponse)
 async def semantic_search(request: SearchRequest):
-    """Perform semantic search on video content"""
+    """Perform semantic search on video content.
+
+    Pages after the first are requested with the ``next_cursor`` of the previous
+    response; they are cut from the cached ranking instead of re-running the
+    search. With ``stream`` set, results are sent as NDJSON lines followed by a
+    final metadata line.
+    """
     start_time = datetime.now()
     logger.info(f"Processing search request: '{request.query}' (user: {request.user_id})")
 
+    if request.search_type not in ("semantic", "hybrid"):
+        raise HTTPException(status_code=400, detail=f"Unknown search type: {request.search_type}")
+    if not 1 <= request.limit <= settings.search_max_limit:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.search_max_limit}")
+
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else None
+    generation = search_engine.index_generation
+
+    offset = 0
+    if request.cursor:
+        cursor_key, cursor_generation, offset = decode_cursor(request.cursor)
+        if cursor_key != ranking_cache_key(request, filters, cursor_generation):
+            raise HTTPException(status_code=400, detail="Cursor does not match this search")
+        # Row positions from another index build point at other videos
+        if cursor_generation != generation:
+            raise HTTPException(status_code=400, detail="Cursor expired: the search index was rebuilt")
+
     try:
-        # Perform search based on type
-        if request.search_type == "semantic":
-            raw_results = search_engine.semantic_search(
-                query=request.query,
-                top_k=request.limit,
-                user_id=request.user_id
-            )
-        elif request.search_type == "hybrid":
-            raw_results = search_engine.hybrid_search(
+        ranking = ranking_cache.get(ranking_cache_key(request, filters, generation))
+        if ranking is None:
+            query_embedding = await query_encoder.submit(request.query)
+            # Index loading, the similarity scan and preference lookups block; keep them off the event loop
+            ranking = await run_in_threadpool(
+                search_engine.rank,
                 query=request.query,
+                search_type=request.search_type,
+                depth=max(settings.search_candidate_depth, offset + request.limit),
                 user_id=request.user_id,
-                top_k=request.limit
-            )
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown search type: {request.search_type}")
-
-        # Convert to response format
-        results = []
-        for result in raw_results:
-            search_result = SearchResult(
-                video_id=result['video_id'],
-                title=result['title'],
-                description=result['description'],
-                channel_title=result['channel_title'],
-                category_name=result.get('category_name'),
-                similarity_score=result['similarity_score'],
-                relevance_reason=result['relevance_reason'],
-                thumbnail_url=result.get('thumbnail_url'),
-                duration=result.get('duration'),
-                view_count=result.get('view_count'),
-                published_at=result.get('published_at'),
-                days_since_publish=result.get('days_since_publish'),
-                personalized=result.get('personalized', False)
+                query_embedding=query_embedding,
+                filters=filters
             )
-            results.append(search_result)
+            # Keyed by the build actually ranked: a search that overlapped a rebuild never
+            # lands under the new generation's key
+            ranking_cache.set(ranking_cache_key(request, filters, ranking['generation']), ranking)
+
+        total_candidates = len(ranking['indices'])
+        stop = offset + request.limit
+        next_cursor = (
+            encode_cursor(ranking_cache_key(request, filters, ranking['generation']), ranking['generation'], stop)
+            if stop < total_candidates else None
+        )
+
+        if offset == 0 and total_candidates and autocomplete.record_query(request.query, request.user_id):
+            # Merging newly promoted queries rebuilds the whole index; keep it off the event loop
+            asyncio.get_running_loop().run_in_executor(None, rebuild_autocomplete)
+
+        if request.stream:
+            # A sync generator: StreamingResponse iterates it in the threadpool
+            def stream_results():
+                count = 0
+                for result in search_engine.iter_results(request.query, ranking, offset, stop):
+                    count += 1
+                    yield dumps(to_search_result(result)) + b"\n"
+                yield dumps({
+                    "total_results": count,
+                    "total_candidates": total_candidates,
+                    "next_cursor": next_cursor,
+                    "query_processed": request.query,
+                    "search_type": request.search_type,
+                    "generated_at": datetime.now().isoformat()
+                }) + b"\n"
+
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+        # Convert to response format (the page's video details come from one MySQL query)
+        results = await run_in_threadpool(
+            lambda: [to_search_result(result) for result in search_engine.iter_results(request.query, ranking, offset, stop)]
+        )
 
         search_time = (datetime.now() - start_time).total_seconds() * 1000
 
         logger.info(f"Search completed: {len(results)} results in {search_time:.1f}ms")
 
-        return SearchResponse(
-            results=results,
-            total_results=len(results),
-            search_time_ms=search_time,
-            query_processed=request.query,
-            search_type=request.search_type,
-            generated_at=datetime.now().isoformat()
-        )
+        # Trusted engine output: return it directly instead of re-validating against SearchResponse
+        return FastJSONResponse({
+            "results": results,
+            "total_results": len(results),
+            "search_time_ms": search_time,
+            "query_processed": request.query,
+            "search_type": request.search_type,
+            "generated_at": datetime.now().isoformat(),
+            "total_candidates": total_candidates,
+            "next_cursor": next_cursor
+        })
 
     except Exception as e:
         logger.error(f"Search error for query '{request.query}': {str(e)}")
@@ -222,17 +396,40 @@ async def rebuild_search_index(background_tasks: BackgroundTasks, force: bool =
         raise HTTPException(status_code=500, detail="Failed to start index rebuild")
 
 
-async def rebuild_index_background(force: bool = False):
-    """Background task to rebuild search index"""
+def rebuild_index_background(force: bool = False):
+    """Background task to rebuild search index (sync, so it runs in the threadpool)"""
     try:
         logger.info("Rebuilding semantic search index...")
         search_engine.build_content_index(force_rebuild=force)
+        ranking_cache.clear()
+        refresh_autocomplete()
+        autocomplete.save_query_log(search_engine.cache_dir / "autocomplete_queries.json")
         logger.info("Search index rebuild completed successfully")
 
     except Exception as e:
         logger.error(f"Search index rebuild failed: {str(e)}")
 
 
+@app.post("/api/v1/search/user-preferences/invalidate")
+async def invalidate_user_preferences(request: PreferenceInvalidationRequest):
+    """Drop cached user preferences after the profile-update job rewrites them"""
+    try:
+        reloaded = search_engine.user_preferences.invalidate(request.user_ids, reload=request.reload)
+        # Rankings of affected users carry the old personalization boost
+        ranking_cache.clear()
+
+        return {
+            "status": "invalidated",
+            "users": "all" if request.user_ids is None else len(request.user_ids),
+            "reloaded": reloaded,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        logger.error(f"Preference invalidation error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to invalidate user preferences")
+
+
 @app.get("/api/v1/search/stats")
 async def get_search_stats():
     """Get search engine statistics"""
@@ -243,8 +440,13 @@ async def get_search_stats():
             "index_stats": index_stats,
             "model_info": {
                 "model_name": search_engine.model_name,
+                "encoder_backend": search_engine.encoder_backend,
                 "cache_dir": str(search_engine.cache_dir)
             },
+            "query_batching": query_encoder.get_stats(),
+            "autocomplete": autocomplete.get_stats(),
+            "ranking_cache": ranking_cache.get_stats(),
+            "user_preferences": search_engine.user_preferences.get_stats(),
             "generated_at": datetime.now().isoformat()
         }
 
@@ -257,15 +459,7 @@ async def get_search_stats():
 async def get_search_suggestions(query: str, limit: int = 5):
     """Get search suggestions based on partial query"""
     try:
-        # This would implement autocomplete functionality
-        # For now, return some basic suggestions
-        suggestions = [
-            f"{query} videos",
-            f"{query} tutorial",
-            f"{query} news",
-            f"{query} documentary",
-            f"latest {query}"
-        ][:limit]
+        suggestions = autocomplete.suggest(query, limit)
 
         return {
             "query": query,
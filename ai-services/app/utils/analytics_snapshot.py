@@ -0,0 +1,232 @@
+"""
+Local analytics snapshot for LCMTV AI Services
+Columnar copies of video_views (date-partitioned, appended past a high-water
+id) and the small tables it joins to, so model builds read Parquet from the
+model cache instead of running heavy joins on the production MySQL
+"""
+import json
+import os
+import shutil
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from ..core.config import settings
+from ..core.database import execute_query, stream_query
+from ..core.logging import get_logger
+from .training_export import (
+    PARTITION_COLUMN, PartitionedParquetWriter, exported_dates, load_training_interactions, write_parquet
+)
+
+logger = get_logger("analytics_snapshot")
+
+# Read in primary-key order, so rows past the high-water id stream without a sort.
+# The web app stops updating a view once its creation day is over; only such
+# settled rows move the high-water id.
+VIEWS_QUERY = """
+SELECT id, user_id, video_id, session_id, watch_duration, total_duration,
+       watch_percentage, completed, created_at,
+       created_at < CURDATE() AS settled
+FROM video_views
+WHERE id > %s
+AND created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+ORDER BY id
+"""
+VIEW_DTYPES = {
+    'id': np.int64,
+    'user_id': 'Int32',  # Anonymous views still count towards per-video stats
+    'video_id': np.int32,
+    'watch_duration': np.float32,
+    'total_duration': np.float32,
+    'watch_percentage': np.float32,
+    'completed': np.int8,
+}
+
+# Small tables, rewritten whole on every refresh
+DIMENSION_QUERIES = {
+    'videos': """
+    SELECT id, title, description, tags, channel_title, category_id, view_count, like_count,
+           duration, published_at, target_role, original_language, is_active
+    FROM videos
+    """,
+    'categories': "SELECT id, name, slug FROM categories",
+    'users': "SELECT id, created_at, role FROM users",
+}
+
+
+def engagement_tier(completed: pd.Series, watch_percentage: pd.Series) -> np.ndarray:
+    """Implicit rating of a view: 5 completed, 4/3/2 by watch percentage, else 1 (as the SQL CASE)"""
+    return np.select(
+        [completed.fillna(0).to_numpy() == 1, watch_percentage >= 75, watch_percentage >= 50, watch_percentage >= 25],
+        [5.0, 4.0, 3.0, 2.0],
+        default=1.0
+    )
+
+
+class AnalyticsSnapshot:
+    """Parquet snapshot of video_views and its dimension tables.
+
+    ``refresh`` appends views past ``last_view_id`` as new files in their
+    date partitions, rewrites the dimension tables, drops partitions older
+    than the retention window and records the high-water mark and refresh
+    time in ``manifest.json``.
+
+    ``last_view_id`` only covers settled views, from before the database's
+    current day. The partitions that held unsettled views (``open_dates``)
+    are read again on the next refresh and replaced whole, so the snapshot
+    picks up the watch percentage and completion the web app writes later.
+    """
+
+    def __init__(self, root: Path, retention_days: int = 120):
+        self.root = Path(root)
+        self.views_dir = self.root / "video_views"
+        self.retention_days = retention_days
+        self.last_view_id = 0
+        self.open_dates: List[date] = []
+        self.refreshed_at: Optional[datetime] = None
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def load(self) -> bool:
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Failed to read analytics snapshot manifest: {e}")
+            return False
+        self.last_view_id = int(manifest['last_view_id'])
+        self.refreshed_at = datetime.fromisoformat(manifest['refreshed_at'])
+        if 'open_dates' in manifest:
+            self.open_dates = [date.fromisoformat(day) for day in manifest['open_dates']]
+        else:
+            # Written before open days were tracked: re-read the whole retention window once
+            self.last_view_id = 0
+            self.open_dates = exported_dates(self.views_dir)
+        return True
+
+    def is_fresh(self, max_age_minutes: int) -> bool:
+        return self.refreshed_at is not None and datetime.now() - self.refreshed_at <= timedelta(minutes=max_age_minutes)
+
+    def refresh(self, chunk_size: int = 100000) -> Dict[str, Any]:
+        """Append new views, replace the open days, rewrite dimension tables and expire old partitions"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+        writer = PartitionedParquetWriter(self.views_dir, partition_source='created_at')
+        last_view_id = self.last_view_id
+        open_dates = set()
+        try:
+            for columns, rows in stream_query(VIEWS_QUERY, (self.last_view_id, self.retention_days), chunk_size):
+                views = self._typed_views(columns, rows)
+                settled = views.pop('settled').astype(bool)
+                if settled.any():
+                    last_view_id = max(last_view_id, int(views.loc[settled, 'id'].max()))
+                open_dates.update(views.loc[~settled, 'created_at'].dt.date)
+                writer.write(views)
+        except Exception:
+            writer.abort()
+            raise
+
+        # The re-read rows of the open days replace their partitions; readers skip '_' directories
+        reopened_dir = self.views_dir / f"_reopened-{uuid.uuid4().hex[:8]}"
+        for day in self.open_dates:
+            partition = self.views_dir / f"{PARTITION_COLUMN}={day.isoformat()}"
+            if partition.exists():
+                reopened_dir.mkdir(parents=True, exist_ok=True)
+                os.replace(partition, reopened_dir / partition.name)
+        writer.commit()
+
+        table_rows = {}
+        for name, query in DIMENSION_QUERIES.items():
+            table = pd.DataFrame(execute_query(query) or [])
+            table_rows[name] = write_parquet(table, self.root / f"{name}.parquet")['rows']
+
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).date()
+        expired = [day for day in exported_dates(self.views_dir) if day < cutoff]
+        for day in expired:
+            shutil.rmtree(self.views_dir / f"{PARTITION_COLUMN}={day.isoformat()}")
+
+        reopened_days = len(self.open_dates)
+        self.last_view_id = last_view_id
+        self.open_dates = sorted(open_dates)
+        self.refreshed_at = datetime.now()
+        tmp_path = self.manifest_path.with_name("manifest.tmp.json")
+        tmp_path.write_text(json.dumps({
+            'last_view_id': self.last_view_id,
+            'open_dates': [day.isoformat() for day in self.open_dates],
+            'refreshed_at': self.refreshed_at.isoformat(),
+        }))
+        os.replace(tmp_path, self.manifest_path)
+        shutil.rmtree(reopened_dir, ignore_errors=True)
+
+        logger.info(
+            f"Analytics snapshot refreshed: {writer.rows} views written, {reopened_days} open days replaced, "
+            f"{len(expired)} days expired"
+        )
+        return {'new_views': writer.rows, 'reopened_days': reopened_days, 'expired_days': len(expired),
+                'last_view_id': self.last_view_id, **table_rows}
+
+    @staticmethod
+    def _typed_views(columns: Sequence[str], rows: list) -> pd.DataFrame:
+        views = pd.DataFrame.from_records(rows, columns=columns)
+        for col, dtype in VIEW_DTYPES.items():
+            values = pd.to_numeric(views[col], errors='coerce')
+            views[col] = values.astype(dtype) if dtype in ('Int32', np.float32) else values.fillna(0).astype(dtype)
+        views['created_at'] = pd.to_datetime(views['created_at'])
+        views['session_id'] = views['session_id'].astype('category')
+        return views
+
+    def views(self, days_back: Optional[int] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Snapshot views from the last ``days_back`` days (NOW() - INTERVAL semantics)"""
+        if days_back is None:
+            return load_training_interactions(self.views_dir, columns)
+
+        since = datetime.now() - timedelta(days=days_back)
+        read_columns = None if columns is None else list(dict.fromkeys([*columns, 'created_at']))
+        views = load_training_interactions(self.views_dir, read_columns, start_date=since.date())
+        if views.empty:
+            return views
+        views = views[views['created_at'] >= since]
+        return views if columns is None else views[list(columns)]
+
+    def active_user_views(self, days_back: int, columns: Sequence[str] = ()) -> pd.DataFrame:
+        """Signed-in users' views of active videos, as the matrix builders join them"""
+        views = self.views(days_back, list(dict.fromkeys(['user_id', 'video_id', *columns])))
+        if views.empty:
+            return views
+        videos = self.table('videos', ['id', 'is_active'])
+        active_ids = videos.loc[videos['is_active'] == 1, 'id']
+        views = views[views['user_id'].notna() & views['video_id'].isin(active_ids)]
+        return views.astype({'user_id': np.int64, 'video_id': np.int64})
+
+    def table(self, name: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """A dimension table, memory-mapped"""
+        return pq.read_table(
+            self.root / f"{name}.parquet",
+            columns=list(columns) if columns is not None else None,
+            memory_map=True
+        ).to_pandas()
+
+
+_snapshot: Optional[AnalyticsSnapshot] = None
+
+
+def get_snapshot() -> Optional[AnalyticsSnapshot]:
+    """The analytics snapshot when enabled and recently refreshed, else None (read MySQL)"""
+    global _snapshot
+    if not settings.snapshot_enabled:
+        return None
+    root = Path(settings.model_cache_dir) / "snapshot"
+    if _snapshot is None or _snapshot.root != root:
+        _snapshot = AnalyticsSnapshot(root, settings.snapshot_retention_days)
+    if not _snapshot.load() or not _snapshot.is_fresh(settings.snapshot_max_age_minutes):
+        return None
+    return _snapshot
@@ -5,15 +5,151 @@ Handles user behavior data collection, processing, and feature engineering
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+import json
 import logging
+import time
 from collections import defaultdict
+from pathlib import Path
 
-from ..core.database import execute_query, get_db_connection
+from ..core.config import settings
+from ..core.database import execute_query, get_db_connection, stream_query
 from ..core.logging import get_logger
+from ..models.feature_store import WINDOW_DAYS, UserFeatureStore, local_now, local_seconds
+from ..models.matrix_factorization import ImplicitALS
+from ..models.popularity import RETENTION_HOURS, HourlyViewBuckets, PopularityLeaderboard
+from ..models.profile_buckets import DailyProfileBuckets, ProfileDelta, bucket_path, delta_path, epoch_day
+from ..models.trending import (
+    ENGAGEMENT_EVENT_TYPES, ENGAGEMENT_EVENT_WEIGHT, N_SLOTS, SLOT_SECONDS, TrendingDetector, slot_of
+)
+from ..models.taste_vectors import TasteVectorStore, load_video_embeddings
+from .analytics_snapshot import AnalyticsSnapshot, engagement_tier, get_snapshot
+from .training_export import PartitionedParquetWriter, exported_dates, table_size_bytes, write_parquet
 
 logger = get_logger("data_pipeline")
 
+# Narrow dtypes for streamed interaction rows (nullable columns use float32 or Int32)
+INTERACTION_DTYPES = {
+    'user_id': np.int32,
+    'video_id': np.int32,
+    'watch_duration': np.int32,
+    'total_duration': np.int32,
+    'watch_percentage': np.float32,
+    'completed': np.int8,
+    'category_id': 'Int32',
+    'view_count': np.float32,
+    'like_count': np.float32,
+    'video_duration': np.float32,
+    'user_age_days': np.float32,
+}
+# Range-scans idx_video_views_created_user over the days_back window, index-only
+# for video_views, with one primary-key lookup per row into videos and users.
+# Only the window's rows are then sorted by (user_id, created_at), so chunks hold
+# complete users; history before the window is never read.
+# Check the plan with benchmarks/check_query_plans.py.
+INTERACTIONS_QUERY = """
+SELECT
+    vv.user_id,
+    vv.video_id,
+    vv.watch_duration,
+    vv.total_duration,
+    vv.watch_percentage,
+    vv.completed,
+    vv.created_at as watch_timestamp,
+    DATE(vv.created_at) as watch_date,
+
+    -- Video metadata
+    v.title as video_title,
+    v.category_id,
+    v.view_count,
+    v.like_count,
+    v.duration as video_duration,
+    v.published_at,
+
+    -- Category info
+    c.name as category_name,
+    c.slug as category_slug,
+
+    -- User context
+    u.created_at as user_created_at,
+    u.role,
+    TIMESTAMPDIFF(DAY, u.created_at, NOW()) as user_age_days,
+
+    -- Session info
+    vv.session_id
+
+FROM video_views vv
+JOIN videos v ON vv.video_id = v.id
+LEFT JOIN categories c ON v.category_id = c.id
+LEFT JOIN users u ON vv.user_id = u.id
+WHERE vv.user_id IS NOT NULL
+AND vv.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+AND v.is_active = 1
+ORDER BY vv.user_id, vv.created_at
+"""
+
+# Column order of INTERACTIONS_QUERY
+INTERACTION_COLUMNS = [
+    'user_id', 'video_id', 'watch_duration', 'total_duration', 'watch_percentage', 'completed',
+    'watch_timestamp', 'watch_date', 'video_title', 'category_id', 'view_count', 'like_count',
+    'video_duration', 'published_at', 'category_name', 'category_slug', 'user_created_at', 'role',
+    'user_age_days', 'session_id',
+]
+INTERACTION_DATETIMES = ('watch_timestamp', 'watch_date', 'published_at', 'user_created_at')
+INTERACTION_CATEGORICALS = ('video_title', 'category_name', 'category_slug', 'role', 'session_id')
+# Per-user aggregates over the queried range, not stable across appended exports
+EXPORT_WINDOW_COLUMNS = (
+    'avg_watch_pct', 'std_watch_pct', 'completion_rate', 'avg_engagement', 'total_videos', 'relative_engagement'
+)
+
+# Views past the profile buckets' high-water id, read in primary-key order; one
+# read serves every user shard
+PROFILE_VIEWS_QUERY = """
+SELECT
+    vv.id,
+    vv.user_id,
+    vv.watch_duration,
+    vv.watch_percentage,
+    vv.completed,
+    vv.created_at as watched_at,
+    v.category_id,
+    c.name as category_name,
+    v.view_count,
+    v.like_count,
+    v.duration as video_duration,
+    v.published_at,
+    -- The web app stops updating a view once its creation day is over
+    vv.created_at < CURDATE() as settled
+FROM video_views vv
+JOIN videos v ON vv.video_id = v.id
+LEFT JOIN categories c ON v.category_id = c.id
+WHERE vv.id > %s
+AND vv.user_id IS NOT NULL
+AND vv.created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+AND v.is_active = 1
+ORDER BY vv.id
+"""
+
+
+def numeric_frame(rows: Optional[List[Dict[str, Any]]], columns: Iterable[str]) -> pd.DataFrame:
+    """Aggregate query rows as a frame of numeric columns (empty frames keep the columns)"""
+    columns = list(columns)
+    frame = pd.DataFrame(rows or [], columns=columns)
+    for column in columns:
+        frame[column] = pd.to_numeric(frame[column])
+    return frame
+
+
+def concat_interaction_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate typed chunks, unioning categoricals instead of falling back to object"""
+    if len(chunks) == 1:
+        return chunks[0]
+    categoricals = [col for col in chunks[0].columns if isinstance(chunks[0][col].dtype, pd.CategoricalDtype)]
+    combined = pd.concat([chunk.drop(columns=categoricals) for chunk in chunks], ignore_index=True)
+    for col in categoricals:
+        combined[col] = pd.api.types.union_categoricals([chunk[col] for chunk in chunks])
+    return combined[chunks[0].columns]
+
 
 class DataPipeline:
     """Data processing pipeline for AI model training and inference"""
@@ -22,150 +158,173 @@ class DataPipeline:
         self.user_behavior_cache = {}
         self.cache_timeout = 1800  # 30 minutes
 
-    def collect_user_interactions(self, days_back: int = 30) -> pd.DataFrame:
+        # Online per-user features written by the processing service
+        self.user_features = UserFeatureStore(Path(settings.model_cache_dir) / "user_features.npz")
+
+    def collect_user_interactions(self, days_back: int = 30, chunk_size: int = 100000) -> pd.DataFrame:
         """Collect comprehensive user interaction data"""
         logger.info(f"Collecting user interaction data for last {days_back} days")
 
-        query = """
-        SELECT
-            vv.user_id,
-            vv.video_id,
-            vv.watch_duration,
-            vv.total_duration,
-            vv.watch_percentage,
-            vv.completed,
-            vv.created_at as watch_timestamp,
-            DATE(vv.created_at) as watch_date,
-
-            -- Video metadata
-            v.title as video_title,
-            v.category_id,
-            v.view_count,
-            v.like_count,
-            v.duration as video_duration,
-            v.published_at,
-
-            -- Category info
-            c.name as category_name,
-            c.slug as category_slug,
-
-            -- User context
-            u.created_at as user_created_at,
-            u.role,
-            TIMESTAMPDIFF(DAY, u.created_at, NOW()) as user_age_days,
-
-            -- Session info
-            vv.session_id,
-            COUNT(*) OVER (PARTITION BY vv.session_id) as session_video_count
-
-        FROM video_views vv
-        JOIN videos v ON vv.video_id = v.id
-        LEFT JOIN categories c ON v.category_id = c.id
-        LEFT JOIN users u ON vv.user_id = u.id
-        WHERE vv.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-        AND vv.user_id IS NOT NULL
-        AND v.is_active = 1
-        ORDER BY vv.user_id, vv.created_at
-        """
-
-        results = execute_query(query, (days_back,))
-
-        if not results:
+        chunks = list(self.iter_user_interactions(days_back, chunk_size))
+        if not chunks:
             logger.warning("No user interaction data found")
             return pd.DataFrame()
 
-        df = pd.DataFrame(results)
+        # Category aggregates span users, so they run once over the combined chunks
+        df = self._add_content_features(concat_interaction_chunks(chunks))
+
+        logger.info(f"Collected {len(df)} user interactions from {df['user_id'].nunique()} users")
+        return df
 
-        # Convert timestamps
-        df['watch_timestamp'] = pd.to_datetime(df['watch_timestamp'])
-        df['published_at'] = pd.to_datetime(df['published_at'])
-        df['user_created_at'] = pd.to_datetime(df['user_created_at'])
+    def iter_user_interactions(self, days_back: int = 30, chunk_size: int = 100000) -> Iterator[pd.DataFrame]:
+        """Stream typed interaction chunks with temporal and engagement features.
 
-        # Calculate additional features
-        df = self._add_temporal_features(df)
-        df = self._add_engagement_features(df)
-        df = self._add_content_features(df)
+        Rows arrive ordered by user from a server-side cursor; the last user of
+        each fetched block is held back until the next one, so every yielded
+        chunk contains complete users and per-user features are exact.
+        """
 
-        logger.info(f"Collected {len(df)} user interactions from {df['user_id'].nunique()} users")
+        pending = None
+        for chunk in self._interaction_blocks(days_back, chunk_size):
+            if pending is not None:
+                chunk = concat_interaction_chunks([pending, chunk])
+
+            boundary = int(np.searchsorted(chunk['user_id'].to_numpy(), chunk['user_id'].iat[-1], side='left'))
+            pending = chunk.iloc[boundary:].reset_index(drop=True)
+            if boundary:
+                yield self._add_user_chunk_features(chunk.iloc[:boundary].reset_index(drop=True))
+
+        if pending is not None and len(pending):
+            yield self._add_user_chunk_features(pending)
+
+    def _interaction_blocks(self, days_back: int, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Typed interaction blocks ordered by user, from the analytics snapshot when fresh, else MySQL"""
+        snapshot = get_snapshot()
+        if snapshot is None:
+            for columns, rows in stream_query(INTERACTIONS_QUERY, (days_back,), chunk_size):
+                yield self._typed_interactions(columns, rows)
+            return
+
+        df = self._snapshot_interactions(snapshot, days_back)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size].reset_index(drop=True)
+
+    def _snapshot_interactions(self, snapshot: AnalyticsSnapshot, days_back: int) -> pd.DataFrame:
+        """INTERACTIONS_QUERY evaluated over the snapshot tables"""
+        views = snapshot.views(days_back)
+        views = views[views['user_id'].notna()]
+        videos = snapshot.table('videos', ['id', 'title', 'category_id', 'view_count', 'like_count',
+                                           'duration', 'published_at', 'is_active'])
+        videos = videos[videos['is_active'] == 1].drop(columns='is_active')
+        categories = snapshot.table('categories', ['id', 'name', 'slug'])
+        users = snapshot.table('users', ['id', 'created_at', 'role'])
+
+        df = (
+            views.merge(videos.rename(columns={'id': 'video_id'}), on='video_id')
+            .merge(categories.rename(columns={'id': 'category_id', 'name': 'category_name', 'slug': 'category_slug'}),
+                   on='category_id', how='left')
+            .merge(users.rename(columns={'id': 'user_id', 'created_at': 'user_created_at'}),
+                   on='user_id', how='left')
+            .sort_values(['user_id', 'created_at'], kind='stable')
+        )
+        now = pd.Timestamp.now()
+        df = df.rename(columns={'created_at': 'watch_timestamp', 'title': 'video_title', 'duration': 'video_duration'})
+        df['watch_date'] = df['watch_timestamp'].dt.normalize()
+        df['user_age_days'] = (now - pd.to_datetime(df['user_created_at'])).dt.days
+        return self._apply_interaction_dtypes(df[INTERACTION_COLUMNS].reset_index(drop=True))
+
+    @staticmethod
+    def _typed_interactions(columns: List[str], rows: list) -> pd.DataFrame:
+        """Row tuples to a DataFrame with INTERACTION_DTYPES"""
+        return DataPipeline._apply_interaction_dtypes(pd.DataFrame.from_records(rows, columns=columns))
+
+    @staticmethod
+    def _apply_interaction_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+        for col, dtype in INTERACTION_DTYPES.items():
+            values = pd.to_numeric(df[col], errors='coerce')
+            df[col] = values.astype(dtype) if dtype in ('Int32', np.float32) else values.fillna(0).astype(dtype)
+        for col in INTERACTION_DATETIMES:
+            df[col] = pd.to_datetime(df[col])
+        for col in INTERACTION_CATEGORICALS:
+            df[col] = df[col].astype('category')
         return df
 
+    def _add_user_chunk_features(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Features that only need rows of the same user (and session)"""
+        chunk = self._add_temporal_features(chunk)
+        return self._add_engagement_features(chunk)
+
     def _add_temporal_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add temporal features to the dataset"""
-        df = df.copy()
+        """Add temporal features to the dataset (in place)"""
+        watched_at = df['watch_timestamp']
 
         # Time of day features
-        df['hour_of_day'] = df['watch_timestamp'].dt.hour
-        df['day_of_week'] = df['watch_timestamp'].dt.dayofweek
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+        df['hour_of_day'] = watched_at.dt.hour.astype(np.int8)
+        df['day_of_week'] = watched_at.dt.dayofweek.astype(np.int8)
+        df['is_weekend'] = (df['day_of_week'] >= 5).astype(np.int8)
 
         # Time since video published
-        df['days_since_published'] = (df['watch_timestamp'] - df['published_at']).dt.days
-        df['days_since_published'] = df['days_since_published'].clip(lower=0)
+        df['days_since_published'] = (watched_at - df['published_at']).dt.days.clip(lower=0).astype(np.float32)
 
         # User tenure
-        df['user_tenure_days'] = (df['watch_timestamp'] - df['user_created_at']).dt.days
+        df['user_tenure_days'] = (watched_at - df['user_created_at']).dt.days.astype(np.float32)
 
-        # Session features
-        df['session_position'] = df.groupby('session_id').cumcount() + 1
+        # Session features (sessions never span users, so chunks hold whole sessions)
+        sessions = df.groupby('session_id', observed=True, sort=False)
+        df['session_position'] = (sessions.cumcount() + 1).astype(np.int32)
+        df['session_video_count'] = sessions['session_id'].transform('size').astype(np.int32)
 
         return df
 
     def _add_engagement_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add engagement-based features"""
-        df = df.copy()
-
+        """Add engagement-based features (in place)"""
         # Normalized engagement scores
-        df['engagement_score'] = (
-            (df['watch_percentage'] / 100) * 0.4 +  # Watch completion
-            (df['completed'].astype(int)) * 0.3 +    # Completion bonus
-            (df['like_count'] / df['view_count'].replace(0, 1)).clip(0, 1) * 0.3  # Video popularity
-        )
-
-        # User-level engagement metrics
-        user_stats = df.groupby('user_id').agg({
-            'watch_percentage': ['mean', 'std'],
-            'completed': 'mean',
-            'engagement_score': 'mean',
-            'video_id': 'count'
-        }).round(4)
+        df['engagement_score'] = self._engagement_score(df)
 
-        user_stats.columns = ['avg_watch_pct', 'std_watch_pct', 'completion_rate', 'avg_engagement', 'total_videos']
-        user_stats = user_stats.reset_index()
-
-        # Merge back to main dataframe
-        df = df.merge(user_stats, on='user_id', how='left')
+        # User-level engagement metrics, broadcast to each row without a merge
+        users = df.groupby('user_id', sort=False)
+        df['avg_watch_pct'] = users['watch_percentage'].transform('mean').round(4).astype(np.float32)
+        df['std_watch_pct'] = users['watch_percentage'].transform('std').round(4).astype(np.float32)
+        df['completion_rate'] = users['completed'].transform('mean').round(4).astype(np.float32)
+        df['avg_engagement'] = users['engagement_score'].transform('mean').round(4).astype(np.float32)
+        df['total_videos'] = users['video_id'].transform('size').astype(np.int32)
 
         # Relative engagement (how this video compares to user's average)
         df['relative_engagement'] = df['engagement_score'] - df['avg_engagement']
 
         return df
 
-    def _add_content_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add content-based features"""
-        df = df.copy()
-
-        # Category popularity
-        category_stats = df.groupby('category_id').agg({
-            'video_id': 'count',
-            'view_count': 'mean',
-            'engagement_score': 'mean'
-        }).round(4)
-
-        category_stats.columns = ['category_video_count', 'category_avg_views', 'category_avg_engagement']
-        category_stats = category_stats.reset_index()
+    @staticmethod
+    def _engagement_score(df: pd.DataFrame) -> pd.Series:
+        """Per-view engagement in [0, 1]"""
+        return (
+            (df['watch_percentage'] / 100) * 0.4 +  # Watch completion
+            df['completed'] * 0.3 +                  # Completion bonus
+            (df['like_count'] / df['view_count'].replace(0, 1)).clip(0, 1) * 0.3  # Video popularity
+        ).astype(np.float32)
 
-        df = df.merge(category_stats, on='category_id', how='left')
+    def _add_content_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add content-based features (in place)"""
+        # Category popularity (rows without a category stay NaN)
+        categories = df.groupby('category_id', sort=False)
+        df['category_video_count'] = categories['video_id'].transform('size').astype(np.float32)
+        df['category_avg_views'] = categories['view_count'].transform('mean').round(4).astype(np.float32)
+        df['category_avg_engagement'] = categories['engagement_score'].transform('mean').round(4).astype(np.float32)
 
         # Video popularity percentile within category
-        df['video_popularity_percentile'] = df.groupby('category_id')['view_count'].rank(pct=True)
+        df['video_popularity_percentile'] = categories['view_count'].rank(pct=True).astype(np.float32)
 
         # Content freshness score
-        df['content_freshness'] = 1 / (1 + df['days_since_published'] / 30)  # Decay over 30 days
+        df['content_freshness'] = (1 / (1 + df['days_since_published'] / 30)).astype(np.float32)  # Decay over 30 days
 
         return df
 
     def build_user_profiles(self, interactions_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
-        """Build comprehensive user profiles for personalization"""
+        """Build comprehensive user profiles for personalization.
+
+        Plain statistics come from one named aggregation over the user groups;
+        modes and top-k use vectorized counting instead of per-group lambdas.
+        """
         if interactions_df is None:
             interactions_df = self.collect_user_interactions()
 
@@ -173,51 +332,62 @@ class DataPipeline:
             return pd.DataFrame()
 
         logger.info("Building user profiles")
+        df = interactions_df
 
-        # Aggregate user behavior patterns
-        user_profiles = interactions_df.groupby('user_id').agg({
+        # Aggregate user behavior patterns (sorted by user_id)
+        user_profiles = df.groupby('user_id').agg(
             # Basic stats
-            'video_id': 'count',
-            'watch_duration': 'sum',
-            'engagement_score': 'mean',
-
-            # Temporal preferences
-            'hour_of_day': lambda x: x.mode().iloc[0] if len(x) > 0 else 12,  # Most common watch hour
-            'day_of_week': lambda x: x.mode().iloc[0] if len(x) > 0 else 0,   # Most common watch day
-            'is_weekend': 'mean',  # Proportion of weekend watching
-
-            # Content preferences
-            'category_id': lambda x: x.mode().iloc[0] if len(x) > 0 else None,  # Favorite category
-            'category_name': lambda x: x.mode().iloc[0] if len(x) > 0 else None,
+            video_id=('video_id', 'size'),
+            watch_duration=('watch_duration', 'sum'),
+            engagement_score=('engagement_score', 'mean'),
+            is_weekend=('is_weekend', 'mean'),  # Proportion of weekend watching
 
             # Engagement patterns
-            'avg_watch_pct': 'first',
-            'completion_rate': 'first',
-            'total_videos': 'first',
-
-        }).round(4)
-
-        # Category preferences (top 5 categories by engagement)
-        category_prefs = self._calculate_category_preferences(interactions_df)
-        user_profiles = user_profiles.merge(category_prefs, on='user_id', how='left')
-
-        # Time-based preferences
-        time_prefs = self._calculate_time_preferences(interactions_df)
-        user_profiles = user_profiles.merge(time_prefs, on='user_id', how='left')
-
-        # Content type preferences
-        content_prefs = self._calculate_content_preferences(interactions_df)
-        user_profiles = user_profiles.merge(content_prefs, on='user_id', how='left')
+            avg_watch_pct=('avg_watch_pct', 'first'),
+            completion_rate=('completion_rate', 'first'),
+            total_videos=('total_videos', 'first'),
+
+            # Content type preferences
+            preferred_duration=('video_duration', 'mean'),  # Preferred video length
+            freshness_preference=('days_since_published', 'mean'),  # Preference for fresh content
+            avg_content_freshness=('content_freshness', 'mean'),
+        ).round(4)
+
+        # Temporal preferences: most common watch hour and day
+        user_codes = pd.factorize(df['user_id'], sort=True)[0]
+        hour_counts = self._code_histogram(user_codes, df['hour_of_day'].to_numpy(), len(user_profiles), 24)
+        day_counts = self._code_histogram(user_codes, df['day_of_week'].to_numpy(), len(user_profiles), 7)
+        user_profiles['hour_of_day'] = user_profiles['preferred_hour'] = hour_counts.argmax(axis=1)
+        user_profiles['day_of_week'] = user_profiles['preferred_day'] = day_counts.argmax(axis=1)
+        user_profiles['weekend_preference'] = user_profiles['is_weekend']
+
+        # Content preferences: favorite category, then top 5 categories by engagement
+        user_profiles['category_id'] = self._group_mode(df, 'user_id', 'category_id')
+        user_profiles['category_name'] = self._group_mode(df, 'user_id', 'category_name')
+        user_profiles = user_profiles.join(self._calculate_category_preferences(df))
 
         logger.info(f"Built profiles for {len(user_profiles)} users")
         return user_profiles.reset_index()
 
+    @staticmethod
+    def _code_histogram(group_codes: np.ndarray, values: np.ndarray, n_groups: int, n_values: int) -> np.ndarray:
+        """(n_groups, n_values) counts of small non-negative integer values per group"""
+        keys = group_codes.astype(np.int64) * n_values + values.astype(np.int64)
+        return np.bincount(keys, minlength=n_groups * n_values).reshape(n_groups, n_values)
+
+    @staticmethod
+    def _group_mode(df: pd.DataFrame, key: str, value: str) -> pd.Series:
+        """Most frequent ``value`` per ``key`` (smallest value on ties, like Series.mode)"""
+        counts = df.groupby([key, value], observed=True).size().reset_index(name='n')
+        counts = counts.sort_values([key, 'n', value], ascending=[True, False, True], kind='stable')
+        return counts.drop_duplicates(key).set_index(key)[value]
+
     def _calculate_category_preferences(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate user's category preferences"""
-        category_prefs = df.groupby(['user_id', 'category_name']).agg({
-            'engagement_score': 'mean',
-            'video_id': 'count'
-        }).reset_index()
+        """Calculate user's category preferences (preferred_category_1..5, indexed by user)"""
+        category_prefs = df.groupby(['user_id', 'category_name'], observed=True).agg(
+            engagement_score=('engagement_score', 'mean'),
+            video_id=('video_id', 'size')
+        ).reset_index()
 
         # Rank categories by weighted score
         category_prefs['weighted_score'] = (
@@ -226,196 +396,663 @@ class DataPipeline:
         )
 
         # Get top 5 categories per user
-        top_categories = category_prefs.sort_values(['user_id', 'weighted_score'], ascending=[True, False])
+        top_categories = category_prefs.sort_values(['user_id', 'weighted_score'], ascending=[True, False], kind='stable')
         top_categories = top_categories.groupby('user_id').head(5)
+        top_categories['rank'] = top_categories.groupby('user_id').cumcount() + 1
 
         # Pivot to wide format
-        category_wide = top_categories.pivot(
-            index='user_id',
-            columns=top_categories.groupby('user_id').cumcount(),
-            values='category_name'
-        )
-        category_wide.columns = [f'preferred_category_{i+1}' for i in range(len(category_wide.columns))]
-
-        return category_wide.reset_index()
-
-    def _calculate_time_preferences(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate user's time-based preferences"""
-        time_prefs = df.groupby('user_id').agg({
-            'hour_of_day': lambda x: x.value_counts().index[0] if len(x) > 0 else 12,  # Most common hour
-            'day_of_week': lambda x: x.value_counts().index[0] if len(x) > 0 else 0,   # Most common day
-            'is_weekend': 'mean'  # Weekend preference ratio
-        }).round(4)
-
-        time_prefs.columns = ['preferred_hour', 'preferred_day', 'weekend_preference']
-        return time_prefs.reset_index()
-
-    def _calculate_content_preferences(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate user's content type preferences"""
-        content_prefs = df.groupby('user_id').agg({
-            'video_duration': 'mean',  # Preferred video length
-            'days_since_published': 'mean',  # Preference for fresh content
-            'content_freshness': 'mean'  # Content freshness preference
-        }).round(4)
-
-        content_prefs.columns = ['preferred_duration', 'freshness_preference', 'avg_content_freshness']
-        return content_prefs.reset_index()
-
-    def update_user_preferences(self, user_profiles: pd.DataFrame):
-        """Update user preferences in database"""
+        category_wide = top_categories.pivot(index='user_id', columns='rank', values='category_name')
+        category_wide.columns = [f'preferred_category_{rank}' for rank in category_wide.columns]
+        return category_wide
+
+    def update_user_preferences(
+        self,
+        user_profiles: pd.DataFrame,
+        batch_size: Optional[int] = None,
+        commit_every: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Upsert user preferences in multi-row batches.
+
+        The JSON columns are assembled column-wise from the profile frame, then
+        written ``batch_size`` rows per INSERT ... ON DUPLICATE KEY UPDATE with
+        a commit every ``commit_every`` batches.
+        """
+        batch_size = batch_size or settings.preference_upsert_batch_size
+        commit_every = commit_every or settings.preference_upsert_commit_batches
         logger.info(f"Updating preferences for {len(user_profiles)} users")
+        if user_profiles.empty:
+            return {'rows': 0, 'batches': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
 
+        start = time.perf_counter()
+        rows = self._preference_rows(user_profiles)
+        row_sql = "(%s, %s, %s, %s, %s, NOW())"
+
+        batches = 0
         with get_db_connection() as conn:
             cursor = conn.cursor()
-
-            for _, user in user_profiles.iterrows():
-                # Prepare preferences JSON
-                preferences = {
-                    'preferred_categories': [
-                        user[f'preferred_category_{i}']
-                        for i in range(1, 6)
-                        if pd.notna(user.get(f'preferred_category_{i}'))
-                    ],
-                    'preferred_hour': int(user.get('preferred_hour', 12)),
-                    'preferred_day': int(user.get('preferred_day', 0)),
-                    'weekend_preference': float(user.get('weekend_preference', 0.5)),
-                    'preferred_duration': int(user.get('preferred_duration', 600)),
-                    'freshness_preference': float(user.get('freshness_preference', 30))
-                }
-
-                # Update or insert user preferences
-                cursor.execute("""
-                    INSERT INTO user_preferences
-                    (user_id, preferred_categories, watch_patterns, time_preferences, content_preferences, updated_at)
-                    VALUES (%s, %s, %s, %s, %s, NOW())
-                    ON DUPLICATE KEY UPDATE
-                    preferred_categories = VALUES(preferred_categories),
-                    watch_patterns = VALUES(watch_patterns),
-                    time_preferences = VALUES(time_preferences),
-                    content_preferences = VALUES(content_preferences),
-                    updated_at = NOW()
-                """, (
-                    int(user['user_id']),
-                    json.dumps(preferences['preferred_categories']),
-                    json.dumps({}),  # watch_patterns placeholder
-                    json.dumps({
-                        'preferred_hour': preferences['preferred_hour'],
-                        'preferred_day': preferences['preferred_day'],
-                        'weekend_preference': preferences['weekend_preference']
-                    }),
-                    json.dumps({
-                        'preferred_duration': preferences['preferred_duration'],
-                        'freshness_preference': preferences['freshness_preference']
-                    })
-                ))
-
-            conn.commit()
-            logger.info("User preferences updated successfully")
-
-    def export_training_data(self, output_path: str, days_back: int = 90):
-        """Export processed data for model training"""
-        logger.info(f"Exporting training data for last {days_back} days")
-
-        interactions = self.collect_user_interactions(days_back)
-        user_profiles = self.build_user_profiles(interactions)
-
-        # Save to files
-        interactions.to_csv(f"{output_path}/interactions.csv", index=False)
-        user_profiles.to_csv(f"{output_path}/user_profiles.csv", index=False)
-
-        logger.info(f"Training data exported to {output_path}")
+            try:
+                for offset in range(0, len(rows), batch_size):
+                    batch = rows[offset:offset + batch_size]
+                    cursor.execute(
+                        f"""
+                        INSERT INTO user_preferences
+                        (user_id, preferred_categories, watch_patterns, time_preferences, content_preferences, updated_at)
+                        VALUES {", ".join([row_sql] * len(batch))}
+                        ON DUPLICATE KEY UPDATE
+                        preferred_categories = VALUES(preferred_categories),
+                        watch_patterns = VALUES(watch_patterns),
+                        time_preferences = VALUES(time_preferences),
+                        content_preferences = VALUES(content_preferences),
+                        updated_at = NOW()
+                        """,
+                        [value for row in batch for value in row]
+                    )
+                    batches += 1
+                    if batches % commit_every == 0:
+                        conn.commit()
+                conn.commit()
+            finally:
+                cursor.close()
+
+        elapsed = time.perf_counter() - start
+        rows_per_second = len(rows) / elapsed if elapsed > 0 else float(len(rows))
+        logger.info(
+            f"User preferences updated: {len(rows)} rows in {batches} batches, "
+            f"{elapsed:.2f}s ({rows_per_second:.0f} rows/s)"
+        )
         return {
-            'interactions_file': f"{output_path}/interactions.csv",
-            'user_profiles_file': f"{output_path}/user_profiles.csv",
-            'total_interactions': len(interactions),
-            'total_users': len(user_profiles)
+            'rows': len(rows),
+            'batches': batches,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(rows_per_second, 1)
         }
 
-    def get_real_time_features(self, user_id: int, video_id: int) -> Dict[str, Any]:
-        """Generate real-time features for recommendation scoring"""
-        # Get recent user behavior (last 7 days)
-        recent_interactions = self.collect_user_interactions(7)
-        recent_user_data = recent_interactions[recent_interactions['user_id'] == user_id]
-
-        if recent_user_data.empty:
-            return self._get_default_features(video_id)
-
-        # Calculate real-time features
-        features = {
-            'recent_avg_engagement': recent_user_data['engagement_score'].mean(),
-            'recent_watch_count': len(recent_user_data),
-            'recent_completion_rate': recent_user_data['completed'].mean(),
-            'last_watch_hour': recent_user_data['hour_of_day'].iloc[-1] if len(recent_user_data) > 0 else 12,
-            'current_streak': self._calculate_watch_streak(recent_user_data)
+    @staticmethod
+    def _preference_rows(user_profiles: pd.DataFrame) -> List[tuple]:
+        """(user_id, categories, watch_patterns, time_prefs, content_prefs) JSON rows, built per column"""
+        profiles = user_profiles.reset_index(drop=True)
+
+        def column(name: str, default, dtype) -> list:
+            values = profiles[name] if name in profiles else pd.Series(default, index=profiles.index)
+            return pd.to_numeric(values, errors='coerce').fillna(default).to_numpy(dtype=dtype).tolist()
+
+        # Preferred categories: JSON-encode each distinct name once, then append rank by rank
+        joined = np.full(len(profiles), "", dtype=object)
+        for rank in range(1, 6):
+            names = profiles.get(f'preferred_category_{rank}')
+            if names is None:
+                continue
+            present = names.notna().to_numpy()
+            distinct = names[present].unique()
+            encoded = names[present].astype(object).map(dict(zip(distinct, map(json.dumps, distinct)))).to_numpy()
+            previous = joined[present]
+            joined[present] = np.where(previous == "", encoded, previous + ", " + encoded)
+
+        user_ids = profiles['user_id'].to_numpy(dtype=np.int64).tolist()
+        hours, days = column('preferred_hour', 12, np.int64), column('preferred_day', 0, np.int64)
+        weekend = column('weekend_preference', 0.5, np.float64)
+        durations, freshness = column('preferred_duration', 600, np.int64), column('freshness_preference', 30, np.float64)
+
+        return [
+            (
+                user_id,
+                f"[{categories}]",
+                "{}",  # watch_patterns placeholder
+                f'{{"preferred_hour": {hour}, "preferred_day": {day}, "weekend_preference": {weekend_share}}}',
+                f'{{"preferred_duration": {duration}, "freshness_preference": {fresh}}}'
+            )
+            for user_id, categories, hour, day, weekend_share, duration, fresh
+            in zip(user_ids, joined.tolist(), hours, days, weekend, durations, freshness)
+        ]
+
+    def refresh_analytics_snapshot(self) -> Dict[str, Any]:
+        """Append new video_views to the local analytics snapshot and rewrite its dimension tables"""
+        snapshot = AnalyticsSnapshot(Path(settings.model_cache_dir) / "snapshot", settings.snapshot_retention_days)
+        return snapshot.refresh()
+
+    def refresh_user_profiles(
+        self,
+        window_days: int = 30,
+        rebuild: bool = False,
+        chunk_size: int = 100000,
+        n_shards: int = 1
+    ) -> Dict[str, Any]:
+        """Incrementally maintain user profiles from daily buckets and upsert the changed ones.
+
+        Runs read_profile_views and then apply_profile_views for every shard in
+        this process; the processing service runs the shards across its pool.
+        """
+        read = self.read_profile_views(window_days, rebuild, n_shards, chunk_size)
+        results = [self.apply_profile_views(window_days, shard, n_shards) for shard in range(n_shards)]
+        return {
+            'new_views': read['new_views'],
+            'users_touched': sum(result['users_touched'] for result in results),
+            'rows': sum(result['rows'] for result in results),
+            'last_view_id': max(result['last_view_id'] for result in results),
+            'user_ids': sorted(user_id for result in results for user_id in result['user_ids']),
         }
 
-        # Add video-specific features
-        video_features = self._get_video_features(video_id, recent_user_data)
-        features.update(video_features)
+    def read_profile_views(
+        self,
+        window_days: int = 30,
+        rebuild: bool = False,
+        n_shards: int = 1,
+        chunk_size: int = 100000
+    ) -> Dict[str, Any]:
+        """Read the views past the profile buckets' ``last_view_id`` once and split them across user shards.
+
+        Users with user_id % n_shards == shard belong to a shard, which keeps
+        its own bucket file. The read starts past the lowest shard watermark;
+        each shard only keeps the views past its own one. The web app keeps
+        updating a view for the rest of the day it was created, so watermarks
+        only advance over views from before today, and today's views are read
+        again on every refresh. The views are aggregated into each shard's
+        ProfileDelta file for apply_profile_views.
+        ``rebuild`` (or a window change) starts over from the whole window.
+        """
+        cache_dir = Path(settings.model_cache_dir)
+        deltas = [
+            ProfileDelta(
+                delta_path(cache_dir, shard, n_shards),
+                0 if rebuild else DailyProfileBuckets(bucket_path(cache_dir, shard, n_shards), window_days).saved_view_id()
+            )
+            for shard in range(n_shards)
+        ]
+        since = np.array([delta.since for delta in deltas], dtype=np.int64)
+
+        new_views = 0
+        for columns, rows in stream_query(PROFILE_VIEWS_QUERY, (int(since.min()), window_days - 1), chunk_size):
+            views = self._profile_views(columns, rows)
+            shards = views['user_id'].to_numpy(dtype=np.int64) % n_shards
+            unread = views['id'].to_numpy(dtype=np.int64) > since[shards]
+            views, shards = views[unread], shards[unread]
+            for shard, shard_views in views.groupby(shards, sort=False):
+                deltas[shard].add(shard_views)
+            new_views += len(views)
+
+        for delta in deltas:
+            delta.save()
+        logger.info(f"Read {new_views} new views past view id {int(since.min())} for {n_shards} profile shards")
+        return {'new_views': new_views, 'since': int(since.min()), 'shards': n_shards}
+
+    def apply_profile_views(self, window_days: int = 30, shard: int = 0, n_shards: int = 1) -> Dict[str, Any]:
+        """Fold a shard's ProfileDelta into its daily buckets and upsert the changed profiles.
+
+        The current day's buckets are dropped and summed in again from the
+        fresh read, and days that fall out of the window are dropped. Only
+        users with new or re-read views or expired days get their profile
+        rebuilt and written. A delta read for a shard rebuild (``since`` 0)
+        starts the buckets over.
+        Returns write stats plus the ``user_ids`` whose preferences changed.
+        """
+        cache_dir = Path(settings.model_cache_dir)
+        delta = ProfileDelta(delta_path(cache_dir, shard, n_shards))
+        buckets = DailyProfileBuckets(bucket_path(cache_dir, shard, n_shards), window_days)
+        if not delta.load():
+            logger.warning(f"No profile views were read for shard {shard} of {n_shards}")
+            buckets.load()
+            return {'new_views': 0, 'users_touched': 0, 'rows': 0, **buckets.get_stats(), 'user_ids': []}
+        if delta.since == 0 or not buckets.load():
+            buckets.reset()
+        if buckets.last_view_id != delta.since:
+            # The buckets changed after the read; the next refresh reads past their own watermark
+            logger.warning(f"Profile shard {shard} of {n_shards} is at view id {buckets.last_view_id}, "
+                           f"not the {delta.since} its views were read past; skipping")
+            delta.discard()
+            return {'new_views': 0, 'users_touched': 0, 'rows': 0, **buckets.get_stats(), 'user_ids': []}
+        current_day = int(epoch_day(pd.Series([pd.Timestamp.now()]))[0])
+
+        reopened = buckets.reopen()
+        touched = delta.apply(buckets, current_day) | reopened
+        user_profiles = buckets.profiles(sorted(touched))
+        write_stats = self.update_user_preferences(user_profiles) if not user_profiles.empty else {'rows': 0}
+
+        # Saved after the write, so a failed upsert is retried from the same high-water mark
+        buckets.save()
+        delta.discard()
+        user_ids = user_profiles['user_id'].astype(int).tolist() if not user_profiles.empty else []
+        logger.info(f"Profile buckets: {delta.views} new views, {len(touched)} users touched, {len(user_ids)} profiles written")
+        return {'new_views': delta.views, 'users_touched': len(touched), **write_stats,
+                **buckets.get_stats(), 'user_ids': user_ids}
+
+    def _profile_views(self, columns: List[str], rows: list) -> pd.DataFrame:
+        """Typed view rows with the per-view features the profile buckets sum"""
+        views = pd.DataFrame.from_records(rows, columns=columns)
+        for col in ('watch_duration', 'watch_percentage', 'completed', 'category_id',
+                    'view_count', 'like_count', 'video_duration'):
+            views[col] = pd.to_numeric(views[col], errors='coerce').astype(np.float32)
+        views[['watch_duration', 'watch_percentage', 'completed']] = (
+            views[['watch_duration', 'watch_percentage', 'completed']].fillna(0)
+        )
+        views['watched_at'] = pd.to_datetime(views['watched_at'])
+        views['published_at'] = pd.to_datetime(views['published_at'])
+
+        views['engagement_score'] = self._engagement_score(views)
+        views['days_since_published'] = (
+            (views['watched_at'] - views['published_at']).dt.days.clip(lower=0).astype(np.float32)
+        )
+        views['content_freshness'] = (1 / (1 + views['days_since_published'] / 30)).astype(np.float32)
+        return views
+
+    def update_taste_vectors(self, lookback_days: int = 90, batch_size: int = 50000) -> Dict[str, Any]:
+        """Fold video_views rows added since the last run into the user taste vectors.
+
+        Views are read past the store's ``last_view_id`` high-water mark, so a run
+        only touches new rows. Only views from before today are folded: the web
+        app keeps raising watch_percentage and completed on a row for the rest
+        of the day it was created, and a view is weighted by its final values.
+        A fresh store (or one built for another embedding model) is rebuilt from
+        the last ``lookback_days`` of views.
+        """
+        video_ids, embeddings = load_video_embeddings(Path(settings.model_cache_dir))
+        if len(video_ids) == 0:
+            logger.warning("No semantic index available, skipping taste vector update")
+            return {'views_applied': 0, 'users_updated': 0}
+
+        store = TasteVectorStore(Path(settings.model_cache_dir) / "taste_vectors.npz")
+        store.load()
+        if store.dimension and store.dimension != embeddings.shape[1]:
+            logger.warning("Search embeddings changed dimension, rebuilding taste vectors")
+            store.reset()
+
+        row_by_video = pd.Series(np.arange(len(video_ids)), index=video_ids)
+        query = """
+        SELECT id, user_id, video_id, watch_percentage, completed,
+               UNIX_TIMESTAMP(created_at) AS watched_at
+        FROM video_views
+        WHERE id > %s
+        AND user_id IS NOT NULL
+        AND created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+        AND created_at < CURDATE()
+        ORDER BY id
+        LIMIT %s
+        """
 
-        return features
+        views_applied = 0
+        users_updated = set()
+        while True:
+            rows = execute_query(query, (store.last_view_id, lookback_days, batch_size))
+            if not rows:
+                break
 
-    def _get_default_features(self, video_id: int) -> Dict[str, Any]:
-        """Return default features when no user data available"""
-        return {
-            'recent_avg_engagement': 0.5,
-            'recent_watch_count': 0,
-            'recent_completion_rate': 0.0,
-            'last_watch_hour': 12,
-            'current_streak': 0,
-            'category_match': 0,
-            'duration_match': 0
-        }
+            views = pd.DataFrame(rows)
+            store.last_view_id = int(views['id'].max())
+            embedding_rows = views['video_id'].map(row_by_video)
+            views = views[embedding_rows.notna()]
+            embedding_rows = embedding_rows.dropna().to_numpy(dtype=np.int64)
+
+            # Completed views count fully, partial views by how much was watched
+            view_weights = np.where(
+                views['completed'].fillna(0).astype(bool),
+                1.0,
+                (pd.to_numeric(views['watch_percentage'], errors='coerce').fillna(0) / 100).clip(0.1, 1.0)
+            )
+            store.add_views(
+                views['user_id'].to_numpy(dtype=np.int64),
+                embeddings[embedding_rows],
+                view_weights,
+                pd.to_numeric(views['watched_at']).to_numpy(dtype=np.float64)
+            )
+            views_applied += len(views)
+            users_updated.update(views['user_id'].astype(int).tolist())
+
+            if len(rows) < batch_size:
+                break
 
-    def _get_video_features(self, video_id: int, user_data: pd.DataFrame) -> Dict[str, Any]:
-        """Get video-specific features for user"""
-        # Get video metadata
-        video_query = "SELECT category_id, duration FROM videos WHERE id = %s"
-        video_data = execute_query(video_query, (video_id,))
+        store.save()
+        logger.info(f"Applied {views_applied} views to taste vectors of {len(users_updated)} users")
+        return {'views_applied': views_applied, 'users_updated': len(users_updated), **store.get_stats()}
 
-        if not video_data:
-            return {'category_match': 0, 'duration_match': 0}
+    def update_popularity(self) -> Dict[str, Any]:
+        """Merge new video_views into the hourly buckets and rewrite the leaderboards.
 
-        video = video_data[0]
+        The web app keeps raising a view's watch_percentage for the rest of the
+        day it was created, so only views from before today are merged past
+        the buckets' ``last_view_id``. Today's views are re-aggregated on
+        every run and replace the previous overlay. Both reads are
+        pre-aggregated per (video, hour) by the database and walk the
+        created_at index.
+        """
+        cache_dir = Path(settings.model_cache_dir)
+        buckets = HourlyViewBuckets(cache_dir / "popularity_buckets.npz")
+        buckets.load()
+        current_hour = int(datetime.now().timestamp() // 3600)
 
-        # Category match (how often user watches this category)
-        category_match = 0
-        if video['category_id']:
-            category_count = (user_data['category_id'] == video['category_id']).sum()
-            category_match = category_count / len(user_data) if len(user_data) > 0 else 0
+        query = """
+        SELECT
+            FLOOR(UNIX_TIMESTAMP(created_at) / 3600) AS hour,
+            video_id,
+            COUNT(*) AS views,
+            SUM(LEAST(COALESCE(watch_percentage, 0), 100)) / 100 AS completed_views,
+            MAX(id) AS max_view_id
+        FROM video_views
+        WHERE {where}
+        GROUP BY hour, video_id
+        """
+        columns = ('hour', 'video_id', 'views', 'completed_views', 'max_view_id')
+        settled = numeric_frame(execute_query(
+            query.format(where="id > %s AND created_at >= DATE_SUB(NOW(), INTERVAL %s HOUR) AND created_at < CURDATE()"),
+            (buckets.last_view_id, RETENTION_HOURS)
+        ), columns)
+        open_day = numeric_frame(execute_query(query.format(where="created_at >= CURDATE()")), columns)
+
+        new_views = int(settled['views'].sum())
+        if len(settled):
+            buckets.last_view_id = int(settled['max_view_id'].max())
+        buckets.merge(settled, current_hour)
+        buckets.replace_open(open_day)
+        buckets.save()
+
+        categories = execute_query("SELECT id, category_id FROM videos WHERE is_active = 1")
+        video_categories = pd.Series(
+            [row['category_id'] for row in categories or []],
+            index=[row['id'] for row in categories or []],
+            dtype='float64'
+        )
 
-        # Duration match (preference for similar video lengths)
-        duration_match = 0
-        if video['duration'] and len(user_data) > 0:
-            avg_user_duration = user_data['video_duration'].mean()
-            duration_diff = abs(video['duration'] - avg_user_duration)
-            duration_match = max(0, 1 - (duration_diff / max(avg_user_duration, video['duration'])))
+        leaderboard = PopularityLeaderboard(cache_dir / "popularity.npz")
+        leaderboard.save(PopularityLeaderboard.build(buckets, video_categories, current_hour))
 
+        logger.info(
+            f"Popularity updated: {new_views} settled views, {int(open_day['views'].sum())} views today, "
+            f"{len(buckets.buckets)} hourly buckets"
+        )
         return {
-            'category_match': float(category_match),
-            'duration_match': float(duration_match)
+            'new_views': new_views,
+            'open_views': int(open_day['views'].sum()),
+            'buckets': len(buckets.buckets),
+            'last_view_id': buckets.last_view_id
         }
 
-    def _calculate_watch_streak(self, user_data: pd.DataFrame) -> int:
-        """Calculate current watching streak in days"""
-        if user_data.empty:
-            return 0
+    def update_trending(self) -> Dict[str, Any]:
+        """Fold new views and engagement events into the trending ring buffer.
 
-        # Sort by date
-        daily_watches = user_data.groupby('watch_date')['video_id'].count()
+        Both tables are read past their high-water ids and pre-aggregated per
+        (15-minute slot, video) by the database.
+        """
+        detector = TrendingDetector(Path(settings.model_cache_dir) / "trending.npz")
+        detector.load()
+        window_seconds = N_SLOTS * SLOT_SECONDS
 
-        # Find consecutive days
-        streak = 0
-        current_date = datetime.now().date()
+        views = execute_query("""
+        SELECT
+            FLOOR(UNIX_TIMESTAMP(created_at) / %s) AS slot,
+            video_id,
+            COUNT(*) AS events,
+            MAX(id) AS max_id
+        FROM video_views
+        WHERE id > %s
+        AND created_at >= DATE_SUB(NOW(), INTERVAL %s SECOND)
+        GROUP BY slot, video_id
+        """, (SLOT_SECONDS, detector.last_view_id, window_seconds)) or []
+
+        placeholders = ", ".join(["%s"] * len(ENGAGEMENT_EVENT_TYPES))
+        events = execute_query(f"""
+        SELECT
+            FLOOR(UNIX_TIMESTAMP(created_at) / %s) AS slot,
+            CAST(JSON_UNQUOTE(JSON_EXTRACT(event_data, '$.video_id')) AS UNSIGNED) AS video_id,
+            COUNT(*) AS events,
+            MAX(id) AS max_id
+        FROM content_engagement
+        WHERE id > %s
+        AND created_at >= DATE_SUB(NOW(), INTERVAL %s SECOND)
+        AND event_type IN ({placeholders})
+        AND JSON_VALID(event_data)
+        GROUP BY slot, video_id
+        HAVING video_id IS NOT NULL
+        """, (SLOT_SECONDS, detector.last_event_id, window_seconds, *ENGAGEMENT_EVENT_TYPES)) or []
+
+        for rows, weight, mark in ((views, 1.0, 'last_view_id'), (events, ENGAGEMENT_EVENT_WEIGHT, 'last_event_id')):
+            if not rows:
+                continue
+            frame = pd.DataFrame(rows).apply(pd.to_numeric)
+            detector.add(frame['video_id'].to_numpy(), frame['slot'].to_numpy(), frame['events'].to_numpy() * weight)
+            setattr(detector, mark, int(frame['max_id'].max()))
+
+        detector.advance(slot_of(datetime.now().timestamp()))
+        detector.compact()
+        detector.save()
+
+        trending = len(detector.compute_ranking()[0])
+        logger.info(f"Trending updated: {len(views)} view buckets, {len(events)} event buckets, {trending} trending videos")
+        return {'view_buckets': len(views), 'event_buckets': len(events), 'trending': trending}
+
+    def train_als_model(self, days_back: int = 90) -> Dict[str, Any]:
+        """Train the implicit ALS recommender and persist its factors to the model cache.
+
+        Interactions use the same weighting as the item-item matrix (engagement
+        tier times a 30-day exponential decay), aggregated per (user, video) from
+        the analytics snapshot when fresh, else by the database.
+        """
+        query = """
+        SELECT
+            vv.user_id,
+            vv.video_id,
+            MAX(
+                CASE
+                    WHEN vv.completed = 1 THEN 5.0
+                    WHEN vv.watch_percentage >= 75 THEN 4.0
+                    WHEN vv.watch_percentage >= 50 THEN 3.0
+                    WHEN vv.watch_percentage >= 25 THEN 2.0
+                    ELSE 1.0
+                END * EXP(-TIMESTAMPDIFF(DAY, vv.created_at, NOW()) / 30)
+            ) AS weight
+        FROM video_views vv
+        JOIN videos v ON vv.video_id = v.id
+        WHERE vv.user_id IS NOT NULL
+        AND v.is_active = 1
+        AND vv.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+        GROUP BY vv.user_id, vv.video_id
+        """
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            views = snapshot.active_user_views(days_back, ['completed', 'watch_percentage', 'created_at'])
+            interactions = pd.DataFrame()
+            if not views.empty:
+                views['weight'] = engagement_tier(views['completed'], views['watch_percentage']) * np.exp(
+                    -(pd.Timestamp.now() - views['created_at']).dt.days / 30
+                )
+                interactions = views.groupby(['user_id', 'video_id'], as_index=False)['weight'].max()
+        else:
+            interactions = pd.DataFrame(execute_query(query, (days_back,)) or [])
+        if interactions.empty:
+            logger.warning("No interactions found, skipping ALS training")
+            return {'interactions': 0}
+
+        model = ImplicitALS(
+            Path(settings.model_cache_dir) / "als_factors.npz",
+            factors=settings.als_factors,
+            regularization=settings.als_regularization,
+            alpha=settings.als_alpha,
+            iterations=settings.als_iterations,
+            ann_min_items=settings.als_ann_min_items
+        )
+        result = model.fit(
+            interactions['user_id'].to_numpy(dtype=np.int64),
+            interactions['video_id'].to_numpy(dtype=np.int64),
+            pd.to_numeric(interactions['weight']).to_numpy(dtype=np.float32)
+        )
+        model.save()
+        return result
+
+    def export_training_data(
+        self,
+        output_path: str,
+        days_back: int = 90,
+        chunk_size: int = 100000,
+        profile_shards: int = 1
+    ) -> Dict[str, Any]:
+        """Export interactions as date-partitioned Parquet, plus the current user profiles.
+
+        Only complete days without a partition yet are exported, so later runs
+        query from the day after the newest one. Per-user window aggregates
+        are left out: appended days are read over different ranges, so
+        training recomputes them from the loaded rows. Profiles are read from
+        the ``profile_shards`` bucket files apply_profile_views maintains.
+        """
+        output = Path(output_path)
+        interactions_dir = output / "interactions"
+        interactions_dir.mkdir(parents=True, exist_ok=True)
+
+        today = pd.Timestamp.now().normalize()
+        first_day = today - pd.Timedelta(days=days_back)
+        existing = exported_dates(interactions_dir)
+        if existing:
+            first_day = max(first_day, pd.Timestamp(existing[-1]) + pd.Timedelta(days=1))
+        logger.info(f"Exporting training data from {first_day.date()} to {(today - pd.Timedelta(days=1)).date()}")
+
+        writer = PartitionedParquetWriter(interactions_dir)
+        if first_day < today:
+            try:
+                # NOW() - N days reaches back into first_day; rows before it and today's are filtered here
+                for chunk in self.iter_user_interactions((today - first_day).days + 1, chunk_size):
+                    watched = chunk['watch_timestamp']
+                    chunk = chunk[(watched >= first_day) & (watched < today)]
+                    writer.write(chunk.drop(columns=list(EXPORT_WINDOW_COLUMNS)))
+            except Exception:
+                writer.abort()
+                raise
+        written = writer.commit()
+
+        shard_profiles = []
+        for shard in range(profile_shards):
+            buckets = DailyProfileBuckets(bucket_path(settings.model_cache_dir, shard, profile_shards), window_days=None)
+            if buckets.load():
+                shard_profiles.append(buckets.profiles(buckets.days['user_id'].unique()))
+        user_profiles = pd.concat(shard_profiles, ignore_index=True) if shard_profiles else pd.DataFrame()
+        profiles_file = output / "user_profiles.parquet"
+        write_parquet(user_profiles, profiles_file)
+
+        logger.info(f"Training data exported to {output_path}: {len(written)} new days, {writer.rows} interactions")
+        return {
+            'interactions_dir': str(interactions_dir),
+            'user_profiles_file': str(profiles_file),
+            'days_written': len(written),
+            'days_exported': len(exported_dates(interactions_dir)),
+            'total_interactions': writer.rows,
+            'total_users': len(user_profiles),
+            'interactions_bytes': table_size_bytes(interactions_dir)
+        }
 
-        while current_date in daily_watches.index or (current_date - timedelta(days=1)) in daily_watches.index:
-            if current_date in daily_watches.index:
-                streak += 1
-            elif streak > 0:  # Break streak if gap found
+    def get_real_time_features(self, user_id: int, video_id: int) -> Dict[str, Any]:
+        """Generate real-time features for recommendation scoring"""
+        features = self.get_real_time_features_batch(np.array([user_id]), np.array([video_id]))
+        return {name: values[0].item() for name, values in features.items()}
+
+    def get_real_time_features_batch(self, user_ids: np.ndarray, video_ids: np.ndarray) -> Dict[str, np.ndarray]:
+        """Real-time features for many (user, video) pairs, answered from the online feature store"""
+        self.user_features.refresh()
+        return self.user_features.features(user_ids, video_ids)
+
+    def update_user_features(self, batch_size: int = 50000) -> Dict[str, Any]:
+        """Fold new video_views into the online features.
+
+        The view history is read past the store's ``last_view_id``. Daily
+        totals need a view's final watch percentage and completion, and the
+        web app keeps updating a view for the rest of the day it was created.
+        So days before today are summed in once, past ``settled_view_id``,
+        and today's totals are re-aggregated on every run and replace the
+        previous ones. Both totals reads are pre-aggregated by the database.
+        Video categories and durations are re-read so candidate matching
+        follows catalog edits.
+        """
+        store = UserFeatureStore(Path(settings.model_cache_dir) / "user_features.npz")
+        store.load()
+
+        videos = execute_query("SELECT id, category_id, duration FROM videos WHERE is_active = 1") or []
+        if videos:
+            videos = pd.DataFrame(videos)
+            store.set_videos(
+                videos['id'].to_numpy(dtype=np.int64),
+                pd.to_numeric(videos['category_id']).to_numpy(dtype=np.float32),
+                pd.to_numeric(videos['duration']).to_numpy(dtype=np.float32)
+            )
+
+        query = """
+        SELECT id, user_id, video_id, created_at
+        FROM video_views
+        WHERE id > %s
+        AND user_id IS NOT NULL
+        AND created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        ORDER BY id
+        LIMIT %s
+        """
+
+        views_applied = 0
+        users_updated = set()
+        while True:
+            rows = execute_query(query, (store.last_view_id, WINDOW_DAYS, batch_size))
+            if not rows:
+                break
+
+            views = pd.DataFrame(rows)
+            store.last_view_id = int(views['id'].max())
+            store.add_views(
+                views['user_id'].to_numpy(dtype=np.int64),
+                views['video_id'].to_numpy(dtype=np.int64),
+                local_seconds(views['created_at'])
+            )
+            views_applied += len(views)
+            users_updated.update(views['user_id'].astype(int).tolist())
+
+            if len(rows) < batch_size:
                 break
-            current_date -= timedelta(days=1)
 
-        return streak
+        # Per (user, day) totals; the engagement sum uses _engagement_score's weights
+        totals_query = """
+        SELECT
+            vv.user_id,
+            DATEDIFF({day}, '1970-01-01') AS day,
+            COUNT(*) AS views,
+            SUM(COALESCE(vv.completed, 0)) AS completed,
+            SUM(
+                COALESCE(vv.watch_percentage, 0) / 100 * 0.4 +
+                COALESCE(vv.completed, 0) * 0.3 +
+                LEAST(COALESCE(v.like_count, 0) / GREATEST(COALESCE(v.view_count, 0), 1), 1) * 0.3
+            ) AS engagement_sum,
+            MAX(vv.id) AS max_view_id
+        FROM video_views vv
+        JOIN videos v ON vv.video_id = v.id
+        WHERE vv.user_id IS NOT NULL
+        AND {where}
+        GROUP BY vv.user_id, day
+        """
+        columns = ('user_id', 'day', 'views', 'completed', 'engagement_sum', 'max_view_id')
+        settled = numeric_frame(execute_query(
+            totals_query.format(
+                day="vv.created_at",
+                where="vv.id > %s AND vv.created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY) AND vv.created_at < CURDATE()"
+            ),
+            (store.settled_view_id, WINDOW_DAYS)
+        ), columns)
+        if len(settled):
+            store.add_day_totals(
+                settled['user_id'].to_numpy(dtype=np.int64),
+                settled['day'].to_numpy(dtype=np.int32),
+                settled[['views', 'completed', 'engagement_sum']].to_numpy(dtype=np.float64)
+            )
+            store.settled_view_id = int(settled['max_view_id'].max())
+
+        open_day = numeric_frame(execute_query(
+            totals_query.format(day="CURDATE()", where="vv.created_at >= CURDATE()")
+        ), columns)
+        store.replace_open_day(
+            int(open_day['day'].iloc[0]) if len(open_day) else local_now() // 86400,
+            open_day['user_id'].to_numpy(dtype=np.int64),
+            open_day[['views', 'completed', 'engagement_sum']].to_numpy(dtype=np.float64)
+        )
+        users_updated.update(settled['user_id'].astype(int).tolist())
+        users_updated.update(open_day['user_id'].astype(int).tolist())
+
+        store.save()
+        logger.info(f"Applied {views_applied} views to online features of {len(users_updated)} users")
+        return {
+            'views_applied': views_applied,
+            'settled_views': int(settled['views'].sum()),
+            'open_views': int(open_day['views'].sum()),
+            'users_updated': len(users_updated),
+            **store.get_stats()
+        }
 
 
 # Global data pipeline instance
@@ -0,0 +1,110 @@
+"""
+Async micro-batching for LCMTV AI Services
+Coalesces concurrent single-item requests into one batched call on a worker thread
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.logging import get_logger
+
+logger = get_logger("micro_batcher")
+
+
+class MicroBatcher:
+    """Collect items for a few milliseconds (or up to a size cap) and process them together.
+
+    When no batch is in flight, queued items are dispatched on the next loop tick,
+    so an idle service adds no latency; under load, items arriving while the
+    worker is busy accumulate into the next batch.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batch")
+
+        self._pending: List[tuple] = []
+        self._timer: Optional[asyncio.Handle] = None
+        self._dispatch_scheduled = False
+        self._in_flight = 0
+
+        self.batches_processed = 0
+        self.items_processed = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._in_flight == 0:
+            self._schedule(loop, delay=0)
+        else:
+            self._schedule(loop, delay=self.max_wait)
+
+        return await future
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._dispatch_scheduled:
+            return
+        self._dispatch_scheduled = True
+        if delay <= 0:
+            self._timer = loop.call_soon(self._dispatch)
+        else:
+            self._timer = loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._dispatch_scheduled = False
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            self._in_flight += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _ in batch]
+
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            logger.error(f"Micro-batch of {len(items)} items failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self.batches_processed += 1
+            self.items_processed += len(items)
+
+            # Items that queued up behind this batch go out immediately
+            if self._pending and self._in_flight == 0:
+                self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batching efficiency counters"""
+        return {
+            "batches_processed": self.batches_processed,
+            "items_processed": self.items_processed,
+            "avg_batch_size": round(self.items_processed / self.batches_processed, 2) if self.batches_processed else 0,
+            "pending": len(self._pending),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
@@ -0,0 +1,180 @@
+"""
+Columnar training exports for LCMTV AI Services
+Date-partitioned Parquet (hive layout, zstd, dictionary-encoded strings)
+written chunk by chunk, plus a memory-mapped loader for model training
+"""
+import os
+import shutil
+import uuid
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ..core.logging import get_logger
+
+logger = get_logger("training_export")
+
+PARTITION_COLUMN = 'watch_date'
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.date32())]), flavor='hive')
+COMPRESSION = 'zstd'
+
+
+def exported_dates(table_dir: Path) -> List[date]:
+    """Dates that already have a committed partition, oldest first"""
+    table_dir = Path(table_dir)
+    if not table_dir.exists():
+        return []
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(
+        date.fromisoformat(path.name[len(prefix):])
+        for path in table_dir.iterdir()
+        if path.is_dir() and path.name.startswith(prefix)
+    )
+
+
+class PartitionedParquetWriter:
+    """Write DataFrame chunks into date-partitioned Parquet files.
+
+    Rows are buffered per date and flushed as one file once a date holds
+    ``rows_per_file`` rows, or the largest date is flushed when the buffer
+    as a whole exceeds ``max_buffered_rows``. Files go to a staging
+    directory first; ``commit`` moves each finished date partition into the
+    table directory (next to files of earlier runs), so a failed run never
+    leaves a half-written day that later runs would skip. Categorical
+    columns are stored as dictionary<int32, string> so every file shares one
+    schema.
+    """
+
+    def __init__(
+        self,
+        table_dir: Path,
+        partition_source: str = 'watch_timestamp',
+        rows_per_file: int = 500000,
+        max_buffered_rows: int = 2000000
+    ):
+        self.table_dir = Path(table_dir)
+        self.partition_source = partition_source
+        self.rows_per_file = rows_per_file
+        self.max_buffered_rows = max_buffered_rows
+        self.run_id = uuid.uuid4().hex[:8]
+        self.staging_dir = self.table_dir / f"_staging-{self.run_id}"
+        self.schema: Optional[pa.Schema] = None
+        self.rows = 0
+        self.files = 0
+        self._dates: set = set()
+        self._buffers: Dict[date, List[pa.Table]] = defaultdict(list)
+        self._buffered: Dict[date, int] = defaultdict(int)
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        days = df[self.partition_source].dt.normalize()
+        for day, part in df.groupby(days, sort=True):
+            day = day.date()
+            self._buffers[day].append(self._to_table(part.drop(columns=[PARTITION_COLUMN], errors='ignore')))
+            self._buffered[day] += len(part)
+            self._dates.add(day)
+            self.rows += len(part)
+            if self._buffered[day] >= self.rows_per_file:
+                self._flush(day)
+
+        while sum(self._buffered.values()) > self.max_buffered_rows:
+            self._flush(max(self._buffered, key=self._buffered.get))
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        # A chunk slice keeps the chunk's whole dictionary; store only the values it uses
+        categoricals = [col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)]
+        df = df.assign(**{col: df[col].cat.remove_unused_categories() for col in categoricals})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            self.schema = pa.schema([
+                pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            ])
+        return table.cast(self.schema)
+
+    def _flush(self, day: date):
+        tables = self._buffers.pop(day, [])
+        self._buffered.pop(day, None)
+        if not tables:
+            return
+        partition_dir = self.staging_dir / f"{PARTITION_COLUMN}={day.isoformat()}"
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        pq.write_table(
+            pa.concat_tables(tables).unify_dictionaries(),
+            partition_dir / f"part-{self.run_id}-{self.files:05d}.parquet",
+            compression=COMPRESSION,
+            use_dictionary=True
+        )
+        self.files += 1
+
+    def commit(self) -> List[date]:
+        """Flush, then move the staged files into their partitions; returns the dates written"""
+        for day in list(self._buffers):
+            self._flush(day)
+        for day in sorted(self._dates):
+            name = f"{PARTITION_COLUMN}={day.isoformat()}"
+            target = self.table_dir / name
+            target.mkdir(exist_ok=True)
+            for part in sorted((self.staging_dir / name).iterdir()):
+                os.replace(part, target / part.name)
+        self.abort()
+        return sorted(self._dates)
+
+    def abort(self):
+        self._buffers.clear()
+        self._buffered.clear()
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def load_training_interactions(
+    table_dir: Path,
+    columns: Optional[Sequence[str]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> pd.DataFrame:
+    """Exported interactions as a DataFrame, memory-mapping the Parquet files.
+
+    Only partitions within [start_date, end_date] are read; dictionary
+    columns come back as categoricals and ``watch_date`` as datetime64.
+    """
+    table_dir = Path(table_dir)
+    if not exported_dates(table_dir):
+        return pd.DataFrame()
+
+    filters = []
+    if start_date is not None:
+        filters.append((PARTITION_COLUMN, '>=', start_date))
+    if end_date is not None:
+        filters.append((PARTITION_COLUMN, '<=', end_date))
+
+    table = pq.read_table(
+        table_dir,
+        columns=list(columns) if columns is not None else None,
+        filters=filters or None,
+        partitioning=PARTITIONING,
+        memory_map=True,
+        ignore_prefixes=['_', '.']
+    )
+    return table.to_pandas(date_as_object=False)
+
+
+def table_size_bytes(table_dir: Path) -> int:
+    """Bytes in the committed partitions"""
+    return sum(path.stat().st_size for path in Path(table_dir).glob(f"{PARTITION_COLUMN}=*/*.parquet"))
+
+
+def write_parquet(df: pd.DataFrame, path: Path) -> Dict[str, int]:
+    """Single-file Parquet with the export's compression, written atomically"""
+    path = Path(path)
+    tmp_path = path.with_name(path.stem + ".tmp.parquet")
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, compression=COMPRESSION, use_dictionary=True)
+    os.replace(tmp_path, path)
+    return {'rows': len(df), 'bytes': path.stat().st_size}
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Peak memory of the interaction feature-engineering steps
+Builds a synthetic interaction set and runs the temporal, engagement and
+content feature steps two ways, each in a fresh process so peak RSS is not
+shared: the previous path (wide dtypes from dict rows, df.copy() per step,
+merged aggregates) and the current one (narrow dtypes, columns added in place
+with groupby().transform).
+
+Usage:
+    python benchmarks/bench_feature_memory.py --rows 10000000
+    python benchmarks/bench_feature_memory.py --rows 1000000 --json memory.json
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.data_pipeline import DataPipeline
+
+
+def make_interactions(n_rows: int, narrow: bool, seed: int = 0) -> pd.DataFrame:
+    """Synthetic interactions ordered by user, roughly 40 views per user"""
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_rows // 40)
+    user_ids = np.sort(rng.integers(1, n_users + 1, n_rows))
+    watched_at = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 90 * 86400, n_rows), unit="s")
+    category_ids = rng.integers(1, 13, n_rows)
+
+    session_keys = user_ids * 100 + rng.integers(0, 5, n_rows)
+    category_names = np.array([f"Category {i}" for i in range(13)], dtype=object)
+
+    df = pd.DataFrame({
+        'user_id': user_ids,
+        'video_id': rng.integers(1, 20000, n_rows),
+        'watch_duration': rng.integers(0, 3600, n_rows),
+        'total_duration': rng.integers(60, 3600, n_rows),
+        'watch_percentage': rng.random(n_rows) * 100,
+        'completed': rng.integers(0, 2, n_rows),
+        'watch_timestamp': watched_at,
+        'category_id': category_ids,
+        'view_count': rng.integers(0, 100000, n_rows),
+        'like_count': rng.integers(0, 5000, n_rows),
+        'video_duration': rng.integers(60, 3600, n_rows),
+        'published_at': watched_at - pd.to_timedelta(rng.integers(0, 365 * 86400, n_rows), unit="s"),
+        'user_created_at': pd.Timestamp("2023-01-01"),
+    })
+
+    if not narrow:
+        # What DataFrame(list_of_dicts) produced: int64/float64 and Python strings
+        df['category_name'] = category_names[category_ids]
+        df['session_id'] = session_keys.astype(str).astype(object)
+        return df
+
+    # What the typed stream produces; strings arrive as categoricals
+    sessions, session_codes = np.unique(session_keys, return_inverse=True)
+    df['category_name'] = pd.Categorical.from_codes(category_ids, categories=category_names)
+    df['session_id'] = pd.Categorical.from_codes(session_codes.astype(np.int32), categories=sessions.astype(str))
+    return df.astype({
+        'user_id': np.int32, 'video_id': np.int32, 'watch_duration': np.int32, 'total_duration': np.int32,
+        'watch_percentage': np.float32, 'completed': np.int8, 'category_id': 'Int32',
+        'view_count': np.float32, 'like_count': np.float32, 'video_duration': np.float32,
+    })
+
+
+def before(df: pd.DataFrame) -> pd.DataFrame:
+    """Feature steps as they were: a copy per step and aggregates merged back"""
+    df = df.copy()
+    df['hour_of_day'] = df['watch_timestamp'].dt.hour
+    df['day_of_week'] = df['watch_timestamp'].dt.dayofweek
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['days_since_published'] = (df['watch_timestamp'] - df['published_at']).dt.days
+    df['days_since_published'] = df['days_since_published'].clip(lower=0)
+    df['user_tenure_days'] = (df['watch_timestamp'] - df['user_created_at']).dt.days
+    df['session_position'] = df.groupby('session_id').cumcount() + 1
+    df['session_video_count'] = df.groupby('session_id')['session_id'].transform('size')
+
+    df = df.copy()
+    df['engagement_score'] = (
+        (df['watch_percentage'] / 100) * 0.4 +
+        (df['completed'].astype(int)) * 0.3 +
+        (df['like_count'] / df['view_count'].replace(0, 1)).clip(0, 1) * 0.3
+    )
+    user_stats = df.groupby('user_id').agg({
+        'watch_percentage': ['mean', 'std'],
+        'completed': 'mean',
+        'engagement_score': 'mean',
+        'video_id': 'count'
+    }).round(4)
+    user_stats.columns = ['avg_watch_pct', 'std_watch_pct', 'completion_rate', 'avg_engagement', 'total_videos']
+    df = df.merge(user_stats.reset_index(), on='user_id', how='left')
+    df['relative_engagement'] = df['engagement_score'] - df['avg_engagement']
+
+    df = df.copy()
+    category_stats = df.groupby('category_id').agg({
+        'video_id': 'count',
+        'view_count': 'mean',
+        'engagement_score': 'mean'
+    }).round(4)
+    category_stats.columns = ['category_video_count', 'category_avg_views', 'category_avg_engagement']
+    df = df.merge(category_stats.reset_index(), on='category_id', how='left')
+    df['video_popularity_percentile'] = df.groupby('category_id')['view_count'].rank(pct=True)
+    df['content_freshness'] = 1 / (1 + df['days_since_published'] / 30)
+    return df
+
+
+def after(df: pd.DataFrame) -> pd.DataFrame:
+    """Current feature steps: columns added in place"""
+    pipeline = DataPipeline()
+    pipeline._add_temporal_features(df)
+    pipeline._add_engagement_features(df)
+    return pipeline._add_content_features(df)
+
+
+def _status_mb(field: str) -> float:
+    """VmRSS / VmHWM of this process from /proc, in MB"""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark so input synthesis doesn't count (Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def measure(variant: str, n_rows: int, queue):
+    """Run one variant in this (fresh) process and report its peak RSS"""
+    df = make_interactions(n_rows, narrow=(variant == "after"))
+    gc.collect()
+    _reset_peak_rss()
+    baseline_mb = _status_mb("VmRSS")
+    input_mb = df.memory_usage(deep=True).sum() / 2**20
+
+    start = time.perf_counter()
+    result = (before if variant == "before" else after)(df)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = _status_mb("VmHWM")
+    queue.put({
+        "input_mb": round(input_mb, 1),
+        "output_mb": round(result.memory_usage(deep=True).sum() / 2**20, 1),
+        "rss_before_features_mb": round(baseline_mb, 1),
+        "peak_rss_mb": round(peak_mb, 1),
+        "peak_growth_mb": round(peak_mb - baseline_mb, 1),
+        "seconds": round(elapsed, 2),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--json", type=Path, help="Write the report to this file")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    report = {"rows": args.rows}
+    print(f"{args.rows:,} synthetic interactions\n")
+    print(f"{'variant':>8} {'input MB':>9} {'output MB':>10} {'RSS at start MB':>16} {'peak RSS MB':>12} "
+          f"{'growth MB':>10} {'seconds':>8}")
+    for variant in ("before", "after"):
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(variant, args.rows, queue))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            # The previous path needs several times the input; it is the one that runs out of memory
+            print(f"{variant:>8} failed with exit code {process.exitcode} (killed for memory?)")
+            report[variant] = {"exitcode": process.exitcode}
+            continue
+        result = report[variant] = queue.get()
+        print(f"{variant:>8} {result['input_mb']:>9.1f} {result['output_mb']:>10.1f} "
+              f"{result['rss_before_features_mb']:>16.1f} {result['peak_rss_mb']:>12.1f} "
+              f"{result['peak_growth_mb']:>10.1f} {result['seconds']:>8.2f}")
+
+    if all('peak_rss_mb' in report[variant] for variant in ("before", "after")):
+        before_mb, after_mb = report['before']['peak_rss_mb'], report['after']['peak_rss_mb']
+        print(f"\nPeak RSS: {before_mb / after_mb:.1f}x lower; growth during the feature steps: "
+              f"{report['before']['peak_growth_mb']:.0f} MB -> {report['after']['peak_growth_mb']:.0f} MB")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-request serialization overhead of a search results page
+Compares the previous path (SearchResult models per row, response_model
+validation, stdlib JSON) with the lean path (projected dicts rendered by
+FastJSONResponse) for 20 and 50 result pages.
+
+Usage:
+    python benchmarks/bench_serialization.py --iterations 2000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import serialization
+from app.core.serialization import FastJSONResponse
+from app.services.search_service import SearchResponse, SearchResult, to_search_result
+
+
+def make_results(count: int) -> list:
+    """Engine-style result dicts, including the extra ranking keys"""
+    rng = np.random.default_rng(0)
+    return [
+        {
+            'video_id': 1000 + i,
+            'title': f"Sunday Service Part {i}: Walking in Faith",
+            'description': "Join us for worship, prayer and a message on faith and perseverance. " * 2,
+            'channel_title': "LCMTV Ministries",
+            'category_name': "Sermons",
+            'similarity_score': float(rng.random()),
+            'relevance_reason': "Title matches your search; Content semantically similar to your query",
+            'thumbnail_url': f"https://img.example.com/{1000 + i}.jpg",
+            'duration': int(rng.integers(60, 5400)),
+            'view_count': int(rng.integers(0, 100000)),
+            'published_at': "2024-05-12 10:00:00",
+            'days_since_publish': int(rng.integers(0, 900)),
+            'fusion_score': float(rng.random()),
+            'lexical_match': bool(i % 2),
+            'personalized': False
+        }
+        for i in range(count)
+    ]
+
+
+def page_metadata(count: int) -> dict:
+    return {
+        "total_results": count,
+        "search_time_ms": 12.5,
+        "query_processed": "sunday service",
+        "search_type": "hybrid",
+        "generated_at": datetime.now().isoformat(),
+        "total_candidates": 500,
+        "next_cursor": None
+    }
+
+
+def before(results: list) -> bytes:
+    """Model per result, then FastAPI's response_model validation and stdlib rendering"""
+    response = SearchResponse(
+        results=[SearchResult(**{k: v for k, v in r.items() if k in SearchResult.model_fields}) for r in results],
+        **page_metadata(len(results))
+    )
+    validated = SearchResponse.model_validate(response.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def after(results: list) -> bytes:
+    """Projected dicts rendered directly"""
+    payload = dict(results=[to_search_result(r) for r in results], **page_metadata(len(results)))
+    return FastJSONResponse(payload).body
+
+
+def time_per_request(fn, results: list, iterations: int) -> float:
+    for _ in range(min(100, iterations)):
+        fn(results)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(results)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 50])
+    parser.add_argument("--json", type=Path, help="Write the report to this file")
+    args = parser.parse_args()
+
+    encoder = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"Encoder: {encoder}, {args.iterations} iterations per case\n")
+    print(f"{'page':>6} {'before (us)':>12} {'after (us)':>12} {'speedup':>8}")
+
+    report = {"encoder": encoder, "pages": {}}
+    for size in args.pages:
+        results = make_results(size)
+        old_body, new_body = json.loads(before(results)), json.loads(after(results))
+        old_body.pop("generated_at"), new_body.pop("generated_at")
+        assert old_body == new_body, "lean path must produce the same payload"
+
+        old = time_per_request(before, results, args.iterations)
+        new = time_per_request(after, results, args.iterations)
+        report["pages"][size] = {"before_us": round(old, 1), "after_us": round(new, 1), "speedup": round(old / new, 2)}
+        print(f"{size:>6} {old:>12.1f} {new:>12.1f} {old / new:>7.1f}x")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
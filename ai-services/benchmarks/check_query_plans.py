@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the pipeline's interaction scans
+Runs EXPLAIN for the streamed interaction query against the configured MySQL
+and fails when video_views is not range-scanned through the composite index or
+the plan needs a temporary table or a filesort the query does not allow.
+
+Usage:
+    python benchmarks/check_query_plans.py
+    python benchmarks/check_query_plans.py --days-back 90 --json plans.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import execute_query
+from app.utils.data_pipeline import INTERACTIONS_QUERY
+
+# Query name -> (SQL, indexes video_views may be read through, allowed extras)
+CHECKED_QUERIES = {
+    # The per-user sort only covers the days_back range read from the index
+    "collect_user_interactions": (INTERACTIONS_QUERY, {"idx_video_views_created_user"}, {"Using filesort"}),
+}
+
+FORBIDDEN_EXTRAS = ("Using filesort", "Using temporary")
+
+
+def explain(query: str, params: tuple) -> list:
+    """Traditional EXPLAIN rows (one per table access)"""
+    return execute_query(f"EXPLAIN {query}", params) or []
+
+
+def check_plan(rows: list, allowed_keys: set, allowed_extras: set = frozenset()) -> list:
+    """Problems found in one plan (empty when it is fine)"""
+    problems = []
+    for row in rows:
+        extra = row.get("Extra") or ""
+        for forbidden in FORBIDDEN_EXTRAS:
+            if forbidden in extra and forbidden not in allowed_extras:
+                problems.append(f"{row.get('table')}: {forbidden}")
+        if row.get("table") == "vv":
+            if row.get("key") not in allowed_keys:
+                problems.append(f"vv read through {row.get('key') or 'a full scan'}, expected one of {sorted(allowed_keys)}")
+            elif row.get("type") != "range":
+                problems.append(f"vv access type {row.get('type')}, expected a range scan")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days-back", type=int, default=30)
+    parser.add_argument("--json", type=Path, help="Write the plans and problems to this file")
+    args = parser.parse_args()
+
+    report = {}
+    failed = False
+    for name, (query, allowed_keys, allowed_extras) in CHECKED_QUERIES.items():
+        rows = explain(query, (args.days_back,))
+        problems = check_plan(rows, allowed_keys, allowed_extras)
+        failed = failed or bool(problems)
+        report[name] = {"plan": rows, "problems": problems}
+
+        print(f"{name}: {'FAIL' if problems else 'ok'}")
+        for row in rows:
+            print(f"  {row.get('table'):<4} type={row.get('type')} key={row.get('key')} rows={row.get('rows')} {row.get('Extra') or ''}")
+        for problem in problems:
+            print(f"  ! {problem}")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, default=str))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Accuracy/latency comparison of the semantic search encoder backends
+Encodes the video catalog with the stock SentenceTransformer model and the
+ONNX Runtime export, then compares embeddings, search results and query latency.
+
+Usage:
+    python benchmarks/compare_encoders.py --queries 200 --top-k 10
+    python benchmarks/compare_encoders.py --no-quantize --json results.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.models.encoders import create_encoder
+from app.models.semantic_search import SemanticSearchEngine, _normalize_rows
+
+
+def load_catalog() -> list:
+    """Searchable content for every indexed video (cached index or MySQL)"""
+    engine = SemanticSearchEngine()
+    if not engine.load_cached_index():
+        engine.build_content_index()
+    return engine.video_data['searchable_content'].astype(str).tolist()
+
+
+def sample_queries(catalog: list, n_queries: int, seed: int = 42) -> list:
+    """Short title-like queries drawn from the catalog itself"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(catalog), size=min(n_queries, len(catalog)), replace=False)
+    queries = []
+    for idx in picks:
+        words = catalog[idx].split()
+        queries.append(" ".join(words[:rng.integers(2, 6)]))
+    return queries
+
+
+def time_single_queries(encoder, queries: list) -> np.ndarray:
+    """Per-request latency in milliseconds, one query per encode call"""
+    encoder.encode(queries[:5])  # warm-up
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def top_k_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Mean fraction of the reference top-k also returned by the candidate"""
+    ref_top = np.argsort(-reference, axis=1)[:, :k]
+    cand_top = np.argsort(-candidate, axis=1)[:, :k]
+    overlaps = [len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]
+    return float(np.mean(overlaps))
+
+
+def run(args) -> dict:
+    catalog = load_catalog()
+    queries = sample_queries(catalog, args.queries)
+    cache_dir = Path(settings.model_cache_dir)
+
+    backends = {
+        "sentence_transformers": create_encoder("sentence_transformers", settings.sentence_transformer_model, cache_dir),
+        "onnx": create_encoder("onnx", settings.sentence_transformer_model, cache_dir, quantize=not args.no_quantize),
+    }
+
+    report = {"catalog_size": len(catalog), "queries": len(queries), "backends": {}}
+    doc_embeddings = {}
+    query_embeddings = {}
+
+    for name, encoder in backends.items():
+        start = time.perf_counter()
+        doc_embeddings[name] = _normalize_rows(encoder.encode(catalog, batch_size=32))
+        catalog_seconds = time.perf_counter() - start
+
+        query_embeddings[name] = _normalize_rows(encoder.encode(queries))
+        latencies = time_single_queries(encoder, queries)
+
+        report["backends"][name] = {
+            "catalog_encode_seconds": round(catalog_seconds, 3),
+            "catalog_docs_per_second": round(len(catalog) / catalog_seconds, 1),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "query_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        }
+
+    reference_docs = doc_embeddings["sentence_transformers"]
+    reference_queries = query_embeddings["sentence_transformers"]
+
+    report["accuracy"] = {
+        "doc_cosine_mean": float(np.mean(np.sum(reference_docs * doc_embeddings["onnx"], axis=1))),
+        "query_cosine_mean": float(np.mean(np.sum(reference_queries * query_embeddings["onnx"], axis=1))),
+        # ONNX queries against the stock index: the mixed mode used when only the query path is swapped
+        f"top{args.top_k}_overlap_query_only": top_k_overlap(
+            reference_queries @ reference_docs.T, query_embeddings["onnx"] @ reference_docs.T, args.top_k
+        ),
+        f"top{args.top_k}_overlap_full": top_k_overlap(
+            reference_queries @ reference_docs.T, query_embeddings["onnx"] @ doc_embeddings["onnx"].T, args.top_k
+        ),
+    }
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare semantic search encoder backends")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled queries")
+    parser.add_argument("--top-k", type=int, default=10, help="Result depth for overlap metrics")
+    parser.add_argument("--no-quantize", action="store_true", help="Compare against the fp32 ONNX export")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -64,15 +64,38 @@ DB_PORT=3306
 # AI Service Configuration
 RECOMMENDATION_PORT=8000
 SEARCH_PORT=8001
+SEARCH_SERVICE_URL=http://localhost:8001
 ANALYTICS_PORT=8002
 
 # ML Model Configuration
 MODEL_CACHE_DIR=./models
 SENTENCE_MODEL=all-MiniLM-L6-v2
+ENCODER_BACKEND=sentence_transformers
+ONNX_QUANTIZE=true
+SEARCH_WARM_MODEL=true
 
 # Performance Settings
 MAX_RECOMMENDATIONS=20
 SEARCH_TIMEOUT=5.0
+SEARCH_CANDIDATE_DEPTH=500
+SEARCH_MAX_LIMIT=100
+SEARCH_CURSOR_TTL=120
+SEARCH_BATCH_MAX_SIZE=32
+SEARCH_BATCH_MAX_WAIT_MS=5.0
+USER_PREFERENCES_TTL=300
+USER_PREFERENCES_CACHE_SIZE=10000
+TASTE_BLEND_WEIGHT=0.2
+ALS_FACTORS=64
+ALS_ITERATIONS=15
+ALS_REGULARIZATION=0.05
+ALS_ALPHA=10.0
+ALS_ANN_MIN_ITEMS=50000
+PREFERENCE_UPSERT_BATCH_SIZE=1000
+PREFERENCE_UPSERT_COMMIT_BATCHES=10
+SNAPSHOT_ENABLED=true
+SNAPSHOT_MAX_AGE_MINUTES=180
+SNAPSHOT_RETENTION_DAYS=120
+PROCESSING_WORKERS=0
 CACHE_TTL=3600
 
 # Security
@@ -205,6 +228,17 @@ ENVIRONMENT=development
         CREATE INDEX IF NOT EXISTS idx_user_prefs_updated ON user_preferences(updated_at);
         """
 
+        # Covering index for the pipeline's interaction scan: created_at leads,
+        # so the days_back window bounds the range that is read
+        video_view_indexes = {
+            'idx_video_views_created_user': (
+                "CREATE INDEX idx_video_views_created_user ON video_views "
+                "(created_at, user_id, video_id, session_id, watch_percentage, completed, watch_duration, total_duration)"
+            ),
+        }
+        # Superseded by idx_video_views_created_user; it walked every user's full history
+        dropped_video_view_indexes = ('idx_video_views_user_created',)
+
         try:
             # Load database config
             from dotenv import load_dotenv
@@ -226,6 +260,19 @@ ENVIRONMENT=development
                 if statement.strip():
                     cursor.execute(statement)
 
+            # MySQL has no IF [NOT] EXISTS for CREATE/DROP INDEX, so look them up first
+            cursor.execute(
+                "SELECT DISTINCT index_name FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'video_views'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            for name, statement in video_view_indexes.items():
+                if name not in existing:
+                    cursor.execute(statement)
+            for name in dropped_video_view_indexes:
+                if name in existing:
+                    cursor.execute(f"DROP INDEX {name} ON video_views")
+
             conn.commit()
             cursor.close()
             conn.close()
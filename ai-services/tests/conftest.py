@@ -0,0 +1,38 @@
+"""
+Shared fixtures for LCMTV AI Services tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.config import settings
+from app.models.encoders import encoder_signature
+from app.models.semantic_search import SemanticSearchEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Search engine backed by a small persisted index"""
+    monkeypatch.setattr(settings, "model_cache_dir", str(tmp_path))
+
+    video_data = pd.DataFrame({
+        "id": [1, 2, 3],
+        "title": ["Sunday Service", "Youth Worship Night", "Bible Study: Romans"],
+        "description": ["", "", ""],
+        "tags": [None, None, None],
+        "channel_title": ["LCMTV", "LCMTV Youth", "LCMTV"],
+        "category_name": ["Services", "Worship", "Teaching"],
+        "category_id": [1, 2, 3],
+        "target_role": ["general", "leader", None],
+        "duration": [3600, 240, 1200],
+        "published_at": pd.to_datetime(["2024-01-07", "2024-03-01", "2024-06-15"]),
+    })
+    embeddings = np.array([[1.0, 0.0], [0.8, 0.6], [0.0, 1.0]], dtype=np.float32)
+
+    signature = encoder_signature(settings.encoder_backend, settings.sentence_transformer_model, settings.onnx_quantize)
+    np.savez_compressed(tmp_path / "content_index.npz", embeddings=embeddings, encoder=np.array(signature))
+    video_data.to_pickle(tmp_path / "content_data.pkl")
+
+    engine = SemanticSearchEngine()
+    monkeypatch.setattr(engine, "_get_video_details", lambda video_ids: {})
+    return engine
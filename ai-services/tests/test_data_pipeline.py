@@ -0,0 +1,593 @@
+"""
+Tests for LCMTV Data Pipeline
+"""
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import data_pipeline as pipeline_module
+from app.utils.data_pipeline import DataPipeline
+
+COLUMNS = [
+    'user_id', 'video_id', 'watch_duration', 'total_duration', 'watch_percentage', 'completed',
+    'watch_timestamp', 'watch_date', 'video_title', 'category_id', 'view_count', 'like_count',
+    'video_duration', 'published_at', 'category_name', 'category_slug', 'user_created_at', 'role',
+    'user_age_days', 'session_id',
+]
+
+
+def interaction_rows():
+    """Cursor-style row tuples ordered by user, as the interaction query returns them"""
+    start = datetime(2024, 3, 1, 8)
+    categories = {1: ("Services", "services"), 2: ("Worship", "worship")}
+    rows = []
+    for user_id, views in ((1, 3), (2, 5), (3, 2)):
+        for i in range(views):
+            watched_at = start + timedelta(days=i, hours=user_id)
+            category_id = 1 if (user_id + i) % 3 else 2
+            rows.append((
+                user_id, 10 + i, 300 + i, 600, Decimal(f"{50 + 10 * i}.00"), i % 2,
+                watched_at, watched_at.date(), f"Video {10 + i}", category_id, 1000 * (i + 1), 10 * (i + 1),
+                600, start - timedelta(days=10), *categories[category_id], start - timedelta(days=100), 'user',
+                100, f"s{user_id}-{i // 2}",
+            ))
+    return rows
+
+
+@pytest.fixture
+def streamed(monkeypatch):
+    """Serve interaction rows through a fake server-side cursor in blocks of 4"""
+    rows = interaction_rows()
+    fetched = []
+
+    def fake_stream_query(query, params=None, chunk_size=50000):
+        for start in range(0, len(rows), 4):
+            fetched.append(start)
+            yield COLUMNS, rows[start:start + 4]
+
+    monkeypatch.setattr(pipeline_module, "stream_query", fake_stream_query)
+    return fetched
+
+
+def test_interaction_chunks_hold_complete_users_with_narrow_dtypes(streamed):
+    """Users split across fetched blocks are carried over, so per-user stats are exact"""
+    pipeline = DataPipeline()
+    chunks = list(pipeline.iter_user_interactions(30, chunk_size=4))
+
+    assert len(streamed) == 3
+    for chunk in chunks:
+        assert chunk.groupby('user_id')['total_videos'].first().to_dict() == chunk['user_id'].value_counts().to_dict()
+    assert sorted(pd.concat([chunk['user_id'] for chunk in chunks]).unique()) == [1, 2, 3]
+
+    df = pipeline.collect_user_interactions(30, chunk_size=4)
+    assert len(df) == 10
+    assert df['user_id'].dtype == np.int32
+    assert df['watch_percentage'].dtype == np.float32
+    assert isinstance(df['category_name'].dtype, pd.CategoricalDtype)
+    assert df.loc[df['user_id'] == 2, 'total_videos'].eq(5).all()
+    assert df['category_video_count'].sum() > 0
+
+    # Session counts are computed client-side instead of by a window function
+    sessions = df[df['user_id'] == 2].groupby('session_id', observed=True)['session_video_count'].first()
+    assert sessions.to_dict() == {"s2-0": 2, "s2-1": 2, "s2-2": 1}
+
+
+def test_user_profiles_match_per_group_modes(streamed):
+    """Vectorized modes and top-k agree with the per-user lambdas they replace"""
+    pipeline = DataPipeline()
+    df = pipeline.collect_user_interactions(30, chunk_size=4)
+    profiles = pipeline.build_user_profiles(df).set_index('user_id')
+
+    users = df.groupby('user_id')
+    assert profiles['preferred_hour'].to_dict() == users['hour_of_day'].agg(lambda x: x.mode().iloc[0]).to_dict()
+    assert profiles['preferred_day'].to_dict() == users['day_of_week'].agg(lambda x: x.mode().iloc[0]).to_dict()
+    assert profiles['category_id'].to_dict() == users['category_id'].agg(lambda x: x.mode().iloc[0]).to_dict()
+    assert profiles['video_id'].to_dict() == {1: 3, 2: 5, 3: 2}
+
+    # User 2 watched both categories; Services 3 times, Worship twice
+    assert profiles.loc[2, 'preferred_category_1'] == "Services"
+    assert profiles.loc[2, 'preferred_category_2'] == "Worship"
+    assert {'preferred_duration', 'freshness_preference', 'weekend_preference'} <= set(profiles.columns)
+
+
+def test_preferences_written_in_batched_upserts(monkeypatch):
+    """Profiles become multi-row upserts with periodic commits and valid JSON payloads"""
+    executed, commits = [], []
+
+    class FakeCursor:
+        def execute(self, query, params):
+            executed.append((query, params))
+
+        def close(self):
+            pass
+
+    class FakeConnection:
+        def cursor(self):
+            return FakeCursor()
+
+        def commit(self):
+            commits.append(len(executed))
+
+    @contextmanager
+    def fake_connection():
+        yield FakeConnection()
+
+    monkeypatch.setattr(pipeline_module, "get_db_connection", fake_connection)
+
+    profiles = pd.DataFrame({
+        'user_id': range(1, 6),
+        'preferred_category_1': ['Services', 'Worship', None, 'Say "Amen"', 'Services'],
+        'preferred_category_2': ['Worship', None, None, None, 'Teaching'],
+        'preferred_hour': [20, 9, np.nan, 7, 12],
+        'preferred_day': [6, 0, 1, 2, 3],
+        'weekend_preference': [0.75, 0.0, 0.5, 1.0, 0.25],
+        'preferred_duration': [1800.4, 600, 300, np.nan, 900],
+        'freshness_preference': [12.5, 30, 3, 4, 5],
+    })
+    stats = DataPipeline().update_user_preferences(profiles, batch_size=2, commit_every=2)
+
+    assert stats['rows'] == 5 and stats['batches'] == 3
+    assert commits == [2, 3]
+    assert executed[0][0].count("(%s, %s, %s, %s, %s, NOW())") == 2
+    assert executed[2][0].count("(%s, %s, %s, %s, %s, NOW())") == 1
+
+    rows = [params[i:i + 5] for _, params in executed for i in range(0, len(params), 5)]
+    by_user = {row[0]: [json.loads(value) for value in row[1:]] for row in rows}
+    assert by_user[1][0] == ['Services', 'Worship']
+    assert by_user[3][0] == []
+    assert by_user[4][0] == ['Say "Amen"']
+    assert by_user[1][2] == {'preferred_hour': 20, 'preferred_day': 6, 'weekend_preference': 0.75}
+    assert by_user[3][2]['preferred_hour'] == 12
+    assert by_user[4][3] == {'preferred_duration': 600, 'freshness_preference': 4.0}
+
+
+PROFILE_VIEW_COLUMNS = [
+    'id', 'user_id', 'watch_duration', 'watch_percentage', 'completed', 'watched_at', 'category_id',
+    'category_name', 'view_count', 'like_count', 'video_duration', 'published_at', 'settled',
+]
+
+
+def profile_view_rows(shift: timedelta):
+    """interaction_rows() in the profile-view layout, moved by whole weeks so hours and weekdays keep"""
+    by_name = [dict(zip(COLUMNS, row)) for row in interaction_rows()]
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    return [
+        (view_id, row['user_id'], row['watch_duration'], row['watch_percentage'], row['completed'],
+         row['watch_timestamp'] + shift, row['category_id'], row['category_name'], row['view_count'],
+         row['like_count'], row['video_duration'], row['published_at'] + shift,
+         int(row['watch_timestamp'] + shift < today))
+        for view_id, row in enumerate(by_name, start=1)
+    ]
+
+
+def test_incremental_profiles_match_full_build_and_touch_only_active_users(streamed, monkeypatch, tmp_path):
+    """Profiles summed from daily buckets equal a full rebuild; later runs only rewrite users with new views"""
+    pipeline = DataPipeline()
+    expected = pipeline.build_user_profiles(pipeline.collect_user_interactions(30)).set_index('user_id')
+
+    shift = timedelta(weeks=(datetime.now() - datetime(2024, 3, 1)).days // 7 - 1)
+    served = {'rows': profile_view_rows(shift)}
+    written = []
+
+    def fake_stream_query(query, params=None, chunk_size=50000):
+        assert query == pipeline_module.PROFILE_VIEWS_QUERY
+        rows = [row for row in served['rows'] if row[0] > params[0]]
+        for start in range(0, len(rows), 4):
+            yield PROFILE_VIEW_COLUMNS, rows[start:start + 4]
+
+    def fake_update_user_preferences(profiles, batch_size=None, commit_every=None):
+        written.append(profiles.set_index('user_id'))
+        return {'rows': len(profiles)}
+
+    monkeypatch.setattr(pipeline_module, "stream_query", fake_stream_query)
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    monkeypatch.setattr(pipeline, "update_user_preferences", fake_update_user_preferences)
+
+    result = pipeline.refresh_user_profiles(30)
+    assert result['new_views'] == 10 and result['user_ids'] == [1, 2, 3]
+    assert result['last_view_id'] == 10
+
+    profiles = written[0]
+    for column in ('video_id', 'preferred_hour', 'preferred_day', 'category_id', 'category_name',
+                   'preferred_category_1', 'preferred_category_2'):
+        assert profiles[column].tolist() == expected[column].tolist(), column
+    for column in ('weekend_preference', 'engagement_score', 'completion_rate', 'avg_watch_pct',
+                   'preferred_duration', 'freshness_preference', 'watch_duration'):
+        np.testing.assert_allclose(profiles[column], expected[column], rtol=1e-4, err_msg=column)
+
+    # One more view for user 3: only that user is rebuilt, from the saved buckets
+    last = served['rows'][-1]
+    served['rows'].append((11, 3, 100, Decimal("100.00"), 1, last[5] + timedelta(hours=1), *last[6:]))
+    result = pipeline.refresh_user_profiles(30)
+    assert result['new_views'] == 1 and result['user_ids'] == [3]
+    assert written[1].loc[3, 'video_id'] == 3
+    assert written[1].loc[3, 'completion_rate'] == pytest.approx(2 / 3, abs=1e-4)
+
+    # Nothing new: no profiles written
+    assert pipeline.refresh_user_profiles(30)['user_ids'] == []
+
+    # A view from today is re-read on every refresh, so later updates to it replace its first read
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    served['rows'].append((12, 3, 100, Decimal("10.00"), 0, today, *last[6:-1], 0))
+    result = pipeline.refresh_user_profiles(30)
+    assert result['user_ids'] == [3] and result['last_view_id'] == 11
+    assert written[-1].loc[3, 'completion_rate'] == pytest.approx(2 / 4, abs=1e-4)
+
+    served['rows'][-1] = (12, 3, 100, Decimal("100.00"), 1, today, *last[6:-1], 0)
+    result = pipeline.refresh_user_profiles(30)
+    assert result['new_views'] == 1 and result['user_ids'] == [3] and result['last_view_id'] == 11
+    assert written[-1].loc[3, 'video_id'] == 4
+    assert written[-1].loc[3, 'completion_rate'] == pytest.approx(3 / 4, abs=1e-4)
+
+
+def test_sharded_profiles_match_unsharded_build(monkeypatch, tmp_path):
+    """Users split by id across shards get the same profiles; each shard keeps its own bucket file"""
+    shift = timedelta(weeks=(datetime.now() - datetime(2024, 3, 1)).days // 7 - 1)
+    rows = profile_view_rows(shift)
+    written = []
+
+    reads = []
+
+    def fake_stream_query(query, params=None, chunk_size=50000):
+        reads.append(params)
+        yield PROFILE_VIEW_COLUMNS, [row for row in rows if row[0] > params[0]]
+
+    def fake_update_user_preferences(profiles, batch_size=None, commit_every=None):
+        written.append(profiles.set_index('user_id'))
+        return {'rows': len(profiles)}
+
+    monkeypatch.setattr(pipeline_module, "stream_query", fake_stream_query)
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    pipeline = DataPipeline()
+    monkeypatch.setattr(pipeline, "update_user_preferences", fake_update_user_preferences)
+
+    assert pipeline.refresh_user_profiles(30)['user_ids'] == [1, 2, 3]
+
+    # One read serves both shards
+    assert pipeline.read_profile_views(30, n_shards=2)['new_views'] == 10
+    assert len(reads) == 2
+    assert pipeline.apply_profile_views(30, shard=0, n_shards=2)['user_ids'] == [2]
+    assert pipeline.apply_profile_views(30, shard=1, n_shards=2)['user_ids'] == [1, 3]
+    assert (tmp_path / "profile_buckets-0of2.npz").exists() and (tmp_path / "profile_buckets-1of2.npz").exists()
+    assert not (tmp_path / "profile_delta-0of2.npz").exists()
+
+    unsharded = written[0]
+    sharded = pd.concat(written[1:]).sort_index()
+    pd.testing.assert_frame_equal(sharded[unsharded.columns], unsharded)
+
+    # A shard behind the others still gets the views past its own watermark from the shared read
+    rows.append((11, 3, *rows[-1][2:]))
+    (tmp_path / "profile_buckets-0of2.npz").unlink()
+    assert pipeline.refresh_user_profiles(30, n_shards=2)['user_ids'] == [2, 3]
+    assert reads[-1][0] == 0
+    assert written[-1].loc[3, 'video_id'] == unsharded.loc[3, 'video_id'] + 1
+
+    # The export gathers profiles from every shard's bucket file
+    monkeypatch.setattr(pipeline, "iter_user_interactions", lambda days_back, chunk_size: iter(()))
+    result = pipeline.export_training_data(str(tmp_path / "training"), 1, profile_shards=2)
+    assert result['total_users'] == 3
+
+
+def test_profile_buckets_expire_days_outside_the_window(tmp_path):
+    """Days leaving the window are dropped and their users reported as touched"""
+    from app.models.profile_buckets import DailyProfileBuckets
+
+    buckets = DailyProfileBuckets(tmp_path / "buckets.npz", window_days=7)
+    views = pd.DataFrame({
+        'user_id': [1, 1, 2],
+        'watched_at': pd.to_datetime(["2024-03-01 08:00", "2024-03-06 20:00", "2024-03-06 21:00"]),
+        'watch_duration': [100, 200, 300], 'watch_percentage': [50.0, 100.0, 80.0], 'completed': [0, 1, 1],
+        'engagement_score': [0.3, 0.9, 0.8], 'video_duration': [600.0, np.nan, 600.0],
+        'days_since_published': [1.0, 2.0, np.nan], 'content_freshness': [0.9, 0.8, np.nan],
+        'category_id': [1.0, 2.0, np.nan],
+    })
+    today = int(pd.Timestamp("2024-03-06").value // 86400 // 10**9)
+    assert buckets.merge(*buckets.aggregate(views), today) == {1, 2}
+    buckets.save()
+
+    reloaded = DailyProfileBuckets(tmp_path / "buckets.npz", window_days=7)
+    assert reloaded.load()
+    assert reloaded.merge(reloaded.days.iloc[0:0], reloaded.categories.iloc[0:0], today + 2) == {1}
+    profile = reloaded.profiles([1, 2]).set_index('user_id')
+    assert profile.loc[1, 'video_id'] == 1 and profile.loc[1, 'preferred_hour'] == 20
+    assert np.isnan(profile.loc[1, 'preferred_duration']) and profile.loc[2, 'preferred_duration'] == 600
+    assert profile.loc[1, 'category_id'] == 2 and pd.isna(profile.loc[2, 'category_id'])
+
+    # A different window cannot reuse the buckets
+    assert not DailyProfileBuckets(tmp_path / "buckets.npz", window_days=30).load()
+
+
+def test_popularity_rereads_the_open_day(monkeypatch, tmp_path):
+    """Settled hours merge once past the watermark; today's hours are replaced on every run"""
+    from app.models.popularity import HourlyViewBuckets, PopularityLeaderboard
+
+    hour = int(datetime.now().timestamp() // 3600)
+    settled = [{'hour': hour - 30, 'video_id': 1, 'views': 2, 'completed_views': Decimal("1.0"), 'max_view_id': 7}]
+    today = [{'hour': hour, 'video_id': 2, 'views': 1, 'completed_views': Decimal("0.1"), 'max_view_id': 9}]
+    reads = []
+
+    def fake_execute_query(query, params=None):
+        if "FROM videos" in query:
+            return [{'id': 1, 'category_id': 1}, {'id': 2, 'category_id': 1}]
+        if "CURDATE()" in query and "id > %s" in query:
+            reads.append(params[0])
+            return [row for row in settled if row['max_view_id'] > params[0]]
+        return today
+
+    monkeypatch.setattr(pipeline_module, "execute_query", fake_execute_query)
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    pipeline = DataPipeline()
+
+    assert pipeline.update_popularity() == {'new_views': 2, 'open_views': 1, 'buckets': 1, 'last_view_id': 7}
+    # The view finished watching later today: its bucket is replaced, not added to
+    today[0]['completed_views'] = Decimal("1.0")
+    assert pipeline.update_popularity()['new_views'] == 0
+    assert reads == [0, 7]
+
+    leaderboard = PopularityLeaderboard(tmp_path / "popularity.npz")
+    leaderboard.load()
+    assert leaderboard.scores_for(np.array([2]), window="24h")[0] == pytest.approx(2.0)
+    buckets = HourlyViewBuckets(tmp_path / "popularity_buckets.npz")
+    assert buckets.load() and buckets.buckets['video_id'].tolist() == [1]
+
+
+def test_online_features_answer_user_video_pairs_from_memory(monkeypatch, tmp_path):
+    """Settled days and a re-read current day give rolling counts, streaks and candidate matches per pair"""
+    from app.models.feature_store import DEFAULT_FEATURES, HISTORY_SIZE, UserFeatureStore
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    videos = [{'id': 1, 'category_id': 1, 'duration': 600}, {'id': 2, 'category_id': 2, 'duration': 1200},
+              {'id': 3, 'category_id': 1, 'duration': None}]
+    # User 1: 40 views of video 2 today and yesterday, then video 1 twice today; user 2: one view 3 days ago
+    views = [
+        {'id': i + 1, 'user_id': 1, 'video_id': 2, 'watch_percentage': Decimal("50.00"), 'completed': 0,
+         'created_at': today - timedelta(days=1 if i < 20 else 0) + timedelta(hours=9, minutes=i)}
+        for i in range(40)
+    ]
+    views += [
+        {'id': 41, 'user_id': 1, 'video_id': 1, 'watch_percentage': Decimal("100.00"), 'completed': 1,
+         'created_at': today + timedelta(hours=10)},
+        {'id': 42, 'user_id': 1, 'video_id': 1, 'watch_percentage': None, 'completed': None,
+         'created_at': today + timedelta(hours=11)},
+        {'id': 43, 'user_id': 2, 'video_id': 3, 'watch_percentage': Decimal("80.00"), 'completed': 1,
+         'created_at': today - timedelta(days=3) + timedelta(hours=20)},
+        {'id': 44, 'user_id': 3, 'video_id': 1, 'watch_percentage': Decimal("80.00"), 'completed': 1,
+         'created_at': today - timedelta(days=9)},
+    ]
+
+    def day_totals(rows, day):
+        """The totals query's per (user, day) aggregates, for videos without likes"""
+        grouped = {}
+        for view in rows:
+            key = (view['user_id'], day(view))
+            pct, completed = float(view['watch_percentage'] or 0), view['completed'] or 0
+            total = grouped.setdefault(key, {'views': 0, 'completed': 0, 'engagement_sum': 0.0, 'max_view_id': 0})
+            total['views'] += 1
+            total['completed'] += completed
+            total['engagement_sum'] += pct / 100 * 0.4 + completed * 0.3
+            total['max_view_id'] = max(total['max_view_id'], view['id'])
+        return [{'user_id': user_id, 'day': day, **total} for (user_id, day), total in grouped.items()]
+
+    epoch = datetime(1970, 1, 1)
+    reads = []
+
+    def fake_execute_query(query, params=None):
+        if "FROM videos" in query:
+            return videos
+        if "GROUP BY" not in query:
+            last_view_id, _, batch_size = params
+            return [view for view in views if view['id'] > last_view_id][:batch_size]
+        if "vv.id > %s" in query:
+            reads.append(params[0])
+            settled = [view for view in views if view['id'] > params[0]
+                       and today - timedelta(days=params[1]) <= view['created_at'] < today]
+            return day_totals(settled, lambda view: (view['created_at'] - epoch).days)
+        return day_totals([view for view in views if view['created_at'] >= today], lambda view: (today - epoch).days)
+
+    monkeypatch.setattr(pipeline_module, "execute_query", fake_execute_query)
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    pipeline = DataPipeline()
+    pipeline.user_features = UserFeatureStore(tmp_path / "user_features.npz")
+
+    result = pipeline.update_user_features(batch_size=16)
+    assert result['views_applied'] == 44 and result['last_view_id'] == 44 and result['users'] == 3
+    assert result['settled_views'] == 21 and result['open_views'] == 22 and result['settled_view_id'] == 43
+
+    # View 42 is still being watched: today's totals are re-read, the settled days are not
+    views[41].update(watch_percentage=Decimal("100.00"), completed=1)
+    result = pipeline.update_user_features()
+    assert result['views_applied'] == 0 and result['settled_views'] == 0 and result['open_views'] == 22
+    assert reads == [0, 43]
+
+    features = pipeline.get_real_time_features_batch(np.array([1, 1, 2, 3, 99]), np.array([1, 2, 1, 1, 1]))
+    assert features['recent_watch_count'].tolist() == [42, 42, 1, 0, 0]
+    assert features['recent_completion_rate'][0] == pytest.approx(2 / 42)
+    # Mean engagement score: 40 half-watched views and two completed ones
+    assert features['recent_avg_engagement'][0] == pytest.approx((40 * 0.2 + 2 * 0.7) / 42)
+    assert features['current_streak'].tolist() == [2, 2, 0, 0, 0]
+    assert features['last_watch_hour'].tolist() == [11, 11, 20, 12, 12]
+
+    # Only the newest HISTORY_SIZE views are kept for matching
+    assert features['category_match'][:2] == pytest.approx([2 / HISTORY_SIZE, (HISTORY_SIZE - 2) / HISTORY_SIZE])
+    assert features['category_match'][2] == 1.0 and features['duration_match'][2] == 0.0
+    assert features['duration_match'][1] > features['duration_match'][0] > 0
+    for name, value in DEFAULT_FEATURES.items():
+        assert features[name][4] == value and features[name][3] == value
+
+    single = pipeline.get_real_time_features(2, 3)
+    assert single['recent_watch_count'] == 1 and single['category_match'] == 1.0
+    assert pipeline.user_features.recent_categories(1) == [2, 1]
+
+
+def test_training_export_appends_date_partitions(streamed, monkeypatch, tmp_path):
+    """Interactions land in per-day Parquet partitions; a second run only adds days not exported yet"""
+    from app.utils.training_export import exported_dates, load_training_interactions
+
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    days_back = (datetime.now() - datetime(2024, 2, 25)).days
+    pipeline = DataPipeline()
+
+    result = pipeline.export_training_data(str(tmp_path / "training"), days_back, chunk_size=4)
+    assert result['days_written'] == 5 and result['total_interactions'] == 10
+    assert result['interactions_bytes'] > 0 and result['total_users'] == 0
+
+    interactions_dir = tmp_path / "training" / "interactions"
+    assert exported_dates(interactions_dir)[0].isoformat() == "2024-03-01"
+    assert not [path for path in interactions_dir.iterdir() if path.name.startswith("_staging")]
+
+    # The streamed rows are all older than the newest partition, so nothing is appended
+    again = pipeline.export_training_data(str(tmp_path / "training"), days_back, chunk_size=4)
+    assert again['days_written'] == 0 and again['days_exported'] == 5
+
+    df = load_training_interactions(interactions_dir)
+    assert len(df) == 10 and 'total_videos' not in df.columns
+    assert isinstance(df['category_name'].dtype, pd.CategoricalDtype)
+    assert df['user_id'].dtype == np.int32 and df['watch_percentage'].dtype == np.float32
+    assert df['watch_date'].dtype.kind == 'M'
+
+    first_two = load_training_interactions(interactions_dir, columns=['user_id', 'video_id'],
+                                           end_date=datetime(2024, 3, 2).date())
+    assert list(first_two.columns) == ['user_id', 'video_id'] and len(first_two) == 6
+
+
+def test_analytics_snapshot_serves_model_builds_without_mysql(monkeypatch, tmp_path):
+    """Views appended past the high-water id are joined locally the way the MySQL queries join them"""
+    from app.models.recommendation_engine import RecommendationEngine
+    from app.utils import analytics_snapshot as snapshot_module
+
+    now = datetime.now().replace(microsecond=0)
+    video = {'description': None, 'tags': None, 'channel_title': 'LCMTV', 'view_count': 100, 'like_count': 10,
+             'duration': 600, 'published_at': now - timedelta(days=40), 'target_role': None, 'original_language': 'en'}
+    tables = {
+        'videos': [{**video, 'id': 1, 'title': 'Sunday Service', 'category_id': 1, 'is_active': 1},
+                   {**video, 'id': 2, 'title': 'Praise Night', 'category_id': 2, 'is_active': 1},
+                   {**video, 'id': 3, 'title': 'Archived', 'category_id': 2, 'is_active': 0}],
+        'categories': [{'id': 1, 'name': 'Services', 'slug': 'services'}, {'id': 2, 'name': 'Worship', 'slug': 'worship'}],
+        'users': [{'id': 7, 'created_at': now - timedelta(days=100), 'role': 'user'},
+                  {'id': 8, 'created_at': now - timedelta(days=10), 'role': 'admin'}],
+    }
+    view_columns = ['id', 'user_id', 'video_id', 'session_id', 'watch_duration', 'total_duration',
+                    'watch_percentage', 'completed', 'created_at']
+    views = [
+        (1, 7, 1, 's1', 300, 600, Decimal("50.00"), 0, now - timedelta(days=2)),
+        (2, 7, 2, 's1', 600, 600, Decimal("100.00"), 1, now - timedelta(days=2) + timedelta(minutes=20)),
+        (3, 8, 1, 's2', 500, 600, Decimal("80.00"), 0, now - timedelta(days=1)),
+        (4, None, 1, 's3', 60, 600, Decimal("10.00"), 0, now - timedelta(days=1)),  # anonymous
+        (5, 8, 3, 's2', 100, 600, Decimal("20.00"), 0, now - timedelta(hours=3)),   # inactive video
+        (6, 7, 1, 's4', 100, 600, Decimal("30.00"), 0, now - timedelta(days=45)),   # outside 30 days
+    ]
+
+    today = datetime.combine(now.date(), datetime.min.time())
+
+    def fake_stream_query(query, params=None, chunk_size=50000):
+        pending = [(*row, int(row[8] < today)) for row in views if row[0] > params[0]]
+        for start in range(0, len(pending), 4):
+            yield view_columns + ['settled'], pending[start:start + 4]
+
+    def fake_execute_query(query, params=None):
+        return next(rows for name, rows in tables.items() if f"FROM {name}" in query)
+
+    monkeypatch.setattr(snapshot_module, "stream_query", fake_stream_query)
+    monkeypatch.setattr(snapshot_module, "execute_query", fake_execute_query)
+    monkeypatch.setattr(pipeline_module.settings, "model_cache_dir", str(tmp_path))
+    pipeline = DataPipeline()
+
+    assert snapshot_module.get_snapshot() is None
+    result = pipeline.refresh_analytics_snapshot()
+    assert result['new_views'] == 6 and result['last_view_id'] == 6 and result['videos'] == 3
+
+    # From here on MySQL is unavailable; everything below reads the snapshot
+    def no_mysql(*args, **kwargs):
+        raise AssertionError("MySQL queried while the snapshot is fresh")
+
+    for module in (pipeline_module, snapshot_module):
+        monkeypatch.setattr(module, "stream_query", no_mysql)
+        monkeypatch.setattr(module, "execute_query", no_mysql)
+    from app.models import recommendation_engine as recommendation_module
+    monkeypatch.setattr(recommendation_module, "execute_query", no_mysql)
+
+    df = pipeline.collect_user_interactions(30, chunk_size=2)
+    assert df['video_id'].tolist() == [1, 2, 1]
+    assert df['user_id'].dtype == np.int32 and isinstance(df['category_name'].dtype, pd.CategoricalDtype)
+    assert df['category_name'].tolist() == ["Services", "Worship", "Services"]
+    assert df.groupby('user_id')['total_videos'].first().to_dict() == {7: 2, 8: 1}
+    assert df['user_age_days'].tolist() == [100, 100, 10]
+    assert df['video_title'].tolist()[0] == "Sunday Service"
+
+    engine = RecommendationEngine()
+    matrix = engine.build_user_item_matrix()
+    assert matrix.loc[7, 2] == pytest.approx(5.0 * np.exp(-1 / 30))  # completed; TIMESTAMPDIFF floors to 1 day
+    assert matrix.loc[7, 1] == pytest.approx(3.0 * np.exp(-2 / 30))
+    assert matrix.loc[8, 1] == pytest.approx(4.0 * np.exp(-1 / 30))
+    assert 3 not in matrix.columns
+
+    stats = engine.build_engagement_stats()
+    assert sorted(stats.index) == [1, 2]
+    assert stats.loc[1, 'total_views'] == 4 and stats.loc[1, 'unique_viewers'] == 2
+    assert stats.loc[1, 'category_name'] == "Services"
+
+    # A later refresh appends only the new view, next to the existing files of its day
+    monkeypatch.setattr(snapshot_module, "stream_query", fake_stream_query)
+    monkeypatch.setattr(snapshot_module, "execute_query", fake_execute_query)
+    views.append((7, 8, 2, 's5', 600, 600, Decimal("90.00"), 1, now))
+    assert pipeline.refresh_analytics_snapshot()['new_views'] == 1
+    monkeypatch.setattr(snapshot_module, "stream_query", no_mysql)
+    assert len(pipeline.collect_user_interactions(30)) == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
+
+
+def test_analytics_snapshot_replaces_the_open_day(monkeypatch, tmp_path):
+    """Today's partition is re-read and replaced until the day is over, then the watermark moves past it"""
+    from app.utils import analytics_snapshot as snapshot_module
+    from app.utils.analytics_snapshot import AnalyticsSnapshot
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    clock = {'today': today}
+    view_columns = ['id', 'user_id', 'video_id', 'session_id', 'watch_duration', 'total_duration',
+                    'watch_percentage', 'completed', 'created_at', 'settled']
+    views = {
+        1: [7, 1, 's1', 300, 600, Decimal("50.00"), 0, today - timedelta(hours=2)],
+        2: [7, 2, 's2', 60, 600, Decimal("10.00"), 0, today + timedelta(minutes=5)],
+    }
+    reads = []
+
+    def fake_stream_query(query, params=None, chunk_size=50000):
+        reads.append(params[0])
+        yield view_columns, [
+            (view_id, *row, int(row[-1] < clock['today'])) for view_id, row in sorted(views.items()) if view_id > params[0]
+        ]
+
+    monkeypatch.setattr(snapshot_module, "stream_query", fake_stream_query)
+    monkeypatch.setattr(snapshot_module, "execute_query", lambda query, params=None: [])
+    snapshot = AnalyticsSnapshot(tmp_path / "snapshot")
+
+    result = snapshot.refresh()
+    assert result['last_view_id'] == 1 and result['reopened_days'] == 0
+    assert snapshot.open_dates == [today.date()]
+
+    # View 2 keeps playing and a third view starts: today's partition is rewritten, not appended to
+    views[2][4:6] = [600, Decimal("100.00")]
+    views[2][6] = 1
+    views[3] = [8, 1, 's3', 30, 600, Decimal("5.00"), 0, today + timedelta(hours=1)]
+    result = snapshot.refresh()
+    assert result['new_views'] == 2 and result['reopened_days'] == 1 and result['last_view_id'] == 1
+
+    stored = snapshot.views().sort_values('id')
+    assert stored['id'].tolist() == [1, 2, 3]
+    assert stored['watch_percentage'].tolist() == [50, 100, 5] and stored['completed'].tolist() == [0, 1, 0]
+    assert not any(path.name.startswith("_") for path in snapshot.views_dir.iterdir())
+
+    # Once the day is over its views are settled and no longer re-read
+    clock['today'] = today + timedelta(days=1)
+    assert snapshot.refresh()['last_view_id'] == 3 and snapshot.open_dates == []
+    assert snapshot.refresh()['new_views'] == 0
+    assert reads == [0, 1, 1, 3]
+    assert snapshot.views()['id'].sort_values().tolist() == [1, 2, 3]
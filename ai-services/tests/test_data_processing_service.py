@@ -0,0 +1,155 @@
+"""
+Tests for LCMTV Data Processing Service
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import data_processing_service as service
+from app.services import processing_jobs
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Fake pipeline stages on a thread pool, recording when each one starts and ends"""
+    events = []
+    lock = threading.Lock()
+    notified = []
+
+    def fake_stage(name, result):
+        def run(*args):
+            with lock:
+                events.append(("start", name, args))
+            time.sleep(0.05)
+            with lock:
+                events.append(("end", name, args))
+            return result(*args) if callable(result) else dict(result)
+        return run
+
+    monkeypatch.setattr(processing_jobs, "STAGES", {
+        "refresh_snapshot": fake_stage("refresh_snapshot", {'new_views': 10}),
+        "profile_views": fake_stage("profile_views", {'new_views': 4}),
+        "profiles": fake_stage("profiles", lambda days, shard, n_shards: {
+            'rows': 1, 'user_ids': [shard + 1, shard + 3]
+        }),
+        "taste_vectors": fake_stage("taste_vectors", {'users_updated': 2}),
+        "popularity": fake_stage("popularity", {'videos': 5}),
+        "train_als": fake_stage("train_als", {'users': 4}),
+        "export": fake_stage("export", {'days_written': 1}),
+    })
+    monkeypatch.setattr(service.settings, "processing_workers", 2)
+    monkeypatch.setattr(service, "process_pool", ThreadPoolExecutor(max_workers=6))
+
+    async def fake_notify(user_ids):
+        notified.append(user_ids)
+
+    monkeypatch.setattr(service, "notify_preferences_updated", fake_notify)
+    monkeypatch.setitem(service.processing_status, "stages", {})
+    monkeypatch.setitem(service.processing_status, "errors", [])
+    monkeypatch.setitem(service.processing_status, "tasks", {})
+    yield events, notified
+    service.process_pool.shutdown()
+
+
+def test_status_reports_stages():
+    """Status responses carry the per-stage breakdown"""
+    client = TestClient(service.app)
+    assert client.get("/health").json()["status"] == "healthy"
+    data = client.get("/status").json()
+    assert data["status"] in ("idle", "running")
+    assert "stages" in data
+
+
+def test_full_refresh_runs_independent_stages_in_parallel(stages):
+    """Builds overlap after the snapshot, profile shards run side by side after one view read, the export waits for profiles"""
+    events, notified = stages
+    asyncio.run(service.run_processing_task("full_refresh", 90, True))
+
+    status = service.processing_status
+    assert status["errors"] == [] and status["progress"] == 100
+    assert list(status["stages"]) == [
+        "refresh_snapshot", "profile_views", "profiles[0]", "profiles[1]", "taste_vectors", "train_als",
+        "popularity", "export"
+    ]
+    assert all(stage["state"] == "done" and stage["seconds"] >= 0 for stage in status["stages"].values())
+    assert status["stages"]["export"]["result"] == {'days_written': 1}
+    assert status["stages"]["profiles[0]"]["result"] == {'rows': 1}
+
+    order = [(kind, name) for kind, name, _ in events]
+    assert order[:2] == [("start", "refresh_snapshot"), ("end", "refresh_snapshot")]
+    assert sorted(order[2:6]) == [
+        ("start", "popularity"), ("start", "profile_views"), ("start", "taste_vectors"), ("start", "train_als")
+    ]
+    profile_starts = [i for i, event in enumerate(order) if event == ("start", "profiles")]
+    assert len(profile_starts) == 2 and min(profile_starts) > order.index(("end", "profile_views"))
+    assert order.index(("start", "export")) > max(i for i, event in enumerate(order) if event == ("end", "profiles"))
+
+    assert next(args for kind, name, args in events if name == "profile_views") == (30, True, 2)
+    shards = sorted(args for kind, name, args in events if kind == "start" and name == "profiles")
+    assert shards == [(30, 0, 2), (30, 1, 2)]
+    assert notified == [[1, 2, 3, 4]]
+    export_args = next(args for kind, name, args in events if name == "export")
+    assert export_args == ("data/training", 90, 2)
+
+
+def test_failed_stage_is_reported_after_the_others_finish(stages, monkeypatch):
+    """A failing build marks its stage and the task error without abandoning the stages beside it"""
+    def broken(*args):
+        raise RuntimeError("factorization diverged")
+
+    monkeypatch.setitem(processing_jobs.STAGES, "train_als", broken)
+    asyncio.run(service.run_processing_task("full_refresh", 90, True))
+
+    status = service.processing_status
+    assert status["stages"]["train_als"]["state"] == "failed"
+    assert status["stages"]["train_als"]["error"] == "factorization diverged"
+    assert status["stages"]["export"]["state"] == "done"
+    assert status["stages"]["popularity"]["state"] == "done"
+    assert "factorization diverged" in status["errors"][0]["error"]
+
+
+def test_task_failures_stay_reported_after_other_tasks_run(stages, monkeypatch):
+    """A failed task keeps its error and per-task state while later tasks succeed"""
+    def broken(*args):
+        raise RuntimeError("leaderboard write failed")
+
+    monkeypatch.setitem(processing_jobs.STAGES, "popularity", broken)
+    asyncio.run(service.run_processing_task("update_popularity"))
+    asyncio.run(service.run_processing_task("train_als", 90))
+
+    status = service.processing_status
+    assert [error["task"] for error in status["errors"]] == ["update_popularity"]
+    tasks = status["tasks"]
+    assert tasks["update_popularity"]["state"] == "failed" and "last_success" not in tasks["update_popularity"]
+    assert "leaderboard write failed" in tasks["update_popularity"]["last_error"]["error"]
+    assert tasks["train_als"]["state"] == "done"
+    assert tasks["train_als"]["last_success"] == status["last_run"]
+
+
+def test_scheduler_runs_late_tasks_instead_of_skipping_them():
+    """Tasks fall due on their interval and run oldest first once the service is free"""
+    assert service.next_due("update_profiles", datetime(2026, 3, 4, 1, 59)) == datetime(2026, 3, 4, 2)
+    assert service.next_due("update_profiles", datetime(2026, 3, 4, 2)) == datetime(2026, 3, 5, 2)
+    assert service.next_due("full_refresh", datetime(2026, 3, 4, 12)) == datetime(2026, 3, 8, 3)  # Sunday
+    assert service.next_due("update_trending", datetime(2026, 3, 4, 2, 3)) == datetime(2026, 3, 4, 2, 7)
+
+    # A long run held the service from 1:58 to 2:11: the 2 AM profile update still runs, then popularity once
+    due_at = {
+        "update_profiles": datetime(2026, 3, 4, 2),
+        "update_popularity": datetime(2026, 3, 4, 2, 5),
+        "train_als": datetime(2026, 3, 4, 4),
+    }
+    now = datetime(2026, 3, 4, 2, 11)
+    assert service.take_due_task(due_at, now) == "update_profiles"
+    assert service.take_due_task(due_at, now) == "update_popularity"
+    assert service.take_due_task(due_at, now) is None
+    assert due_at == {
+        "update_profiles": datetime(2026, 3, 5, 2),
+        "update_popularity": datetime(2026, 3, 4, 2, 15),
+        "train_als": datetime(2026, 3, 4, 4),
+    }
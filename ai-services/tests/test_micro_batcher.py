@@ -0,0 +1,49 @@
+"""
+Tests for the async micro-batcher
+"""
+import asyncio
+
+import pytest
+
+from app.utils.micro_batcher import MicroBatcher
+
+
+def test_concurrent_submissions_share_batches():
+    """Concurrent callers are coalesced and each gets its own result"""
+    batch_sizes = []
+
+    def double(items):
+        batch_sizes.append(len(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    results = asyncio.run(run())
+
+    assert results == [i * 2 for i in range(10)]
+    assert sum(batch_sizes) == 10
+    assert max(batch_sizes) <= 4
+    assert len(batch_sizes) < 10
+    assert batcher.get_stats()["items_processed"] == 10
+
+
+def test_batch_failure_propagates_to_every_caller():
+    """A failing batch call surfaces the error to all waiting requests"""
+    def fail(items):
+        raise RuntimeError("encoder unavailable")
+
+    batcher = MicroBatcher(fail, max_batch_size=8, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,197 @@
+"""
+Tests for LCMTV Recommendation Engine
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.models import recommendation_engine as recommendation_module
+from app.models.recommendation_engine import RecommendationEngine
+
+
+def no_sql(*args, **kwargs):
+    raise AssertionError("unexpected SQL on the request path")
+
+
+@pytest.fixture
+def recommender(engine, monkeypatch):
+    """Recommendation engine over the shared fixture index, with engagement stats loaded"""
+    stats_rows = [
+        {"video_id": 1, "category_id": 1, "category_name": "Services", "view_count": 100, "like_count": 10,
+         "duration": 3600,
+         "avg_completion_rate": 80, "unique_viewers": 40, "total_views": 50},
+        {"video_id": 2, "category_id": 2, "category_name": "Worship", "view_count": 100, "like_count": 1,
+         "duration": 300,
+         "avg_completion_rate": 20, "unique_viewers": 2, "total_views": 2},
+        {"video_id": 3, "category_id": 3, "category_name": "Teaching", "view_count": 500, "like_count": 100,
+         "duration": 2400,
+         "avg_completion_rate": 95, "unique_viewers": 300, "total_views": 400},
+    ]
+    monkeypatch.setattr(recommendation_module, "execute_query", lambda query, params=None: stats_rows)
+
+    recommender = RecommendationEngine()
+    recommender.build_engagement_stats()
+    recommender.load_video_embeddings()
+    monkeypatch.setattr(recommendation_module, "execute_query", no_sql)
+    return recommender
+
+
+def test_content_based_uses_embedding_neighbors(recommender):
+    """Neighbors of the context video are re-scored by engagement without SQL"""
+    recommendations = recommender.get_content_based_recommendations(1, n_recommendations=2)
+
+    assert [rec["video_id"] for rec in recommendations] == [2, 3]
+    assert recommendations[0]["reason"] == "Similar to the video you're watching"
+
+    # Engagement can outrank a closer but rarely finished neighbor
+    engagement_heavy = recommender.get_content_based_recommendations(1, n_recommendations=2, similarity_weight=0.2)
+    assert engagement_heavy[0]["video_id"] == 3
+
+
+def test_taste_recommendations_skip_inactive_videos(recommender):
+    """Taste matches come only from videos that are still active, like the content path"""
+    store = recommender.taste_vectors
+    store.add_views(np.array([7]), np.array([[0.6, 0.8]]), np.array([1.0]), np.array([1_700_000_000.0]), now=1_700_000_000.0)
+    store.save()
+    assert [rec["video_id"] for rec in recommender.get_taste_recommendations(7, n_recommendations=3)] == [2, 3, 1]
+
+    recommender.active_rows = recommender.video_ids != 2
+    assert [rec["video_id"] for rec in recommender.get_taste_recommendations(7, n_recommendations=3)] == [3, 1]
+
+
+def test_popular_served_from_decayed_leaderboard(recommender, tmp_path):
+    """Recent views outweigh older ones and categories get their own boards"""
+    from app.models.popularity import HourlyViewBuckets, PopularityLeaderboard
+
+    now_hour = 500_000
+    buckets = HourlyViewBuckets(tmp_path / "popularity_buckets.npz")
+    buckets.merge(pd.DataFrame({
+        "hour": [now_hour - 1, now_hour - 100, now_hour - 100, now_hour - 2000],
+        "video_id": [2, 1, 3, 3],
+        "views": [10.0, 40.0, 5.0, 1000.0],
+        "completed_views": [5.0, 40.0, 5.0, 1000.0],
+    }), now_hour)
+    assert buckets.buckets["hour"].min() > now_hour - 24 * 30  # expired bucket dropped
+
+    categories = pd.Series([1.0, 2.0, 1.0], index=[1, 2, 3])
+    PopularityLeaderboard(tmp_path / "popularity.npz").save(PopularityLeaderboard.build(buckets, categories, now_hour))
+    recommender.popularity.path = tmp_path / "popularity.npz"
+
+    day = recommender.get_popular_recommendations(5, window="24h")
+    assert [rec["video_id"] for rec in day] == [2]
+
+    week = recommender.get_popular_recommendations(5, window="7d")
+    assert [rec["video_id"] for rec in week] == [1, 2, 3]
+
+    in_category = recommender.get_popular_recommendations(5, window="30d", category_id=1)
+    assert [rec["video_id"] for rec in in_category] == [1, 3]
+
+
+def test_trending_ranks_velocity_over_volume(recommender, tmp_path):
+    """A video spiking above its own baseline outranks a steadily busy one"""
+    from app.models.trending import N_SLOTS, TrendingDetector
+
+    detector = TrendingDetector(tmp_path / "trending.npz")
+    now = 10_000
+    slots = np.arange(now - 100, now + 1)
+    detector.add(np.full(len(slots), 1), slots, np.full(len(slots), 20.0))  # steady 20 per slot
+    detector.add(np.full(4, 2), slots[-4:], np.full(4, 6.0))  # 0 -> 6 per slot this hour
+    detector.add(np.array([3]), np.array([now - N_SLOTS - 5]), np.array([99.0]))  # outside the window
+
+    assert 3 not in detector.video_ids
+    detector.save()
+    recommender.trending.path = tmp_path / "trending.npz"
+
+    trending = recommender.get_trending_recommendations(5)
+    assert [rec["video_id"] for rec in trending] == [2]
+    assert trending[0]["reason"] == "Trending now: 24 views in the last hour"
+
+
+def test_hybrid_reranks_generator_candidates(recommender, tmp_path, monkeypatch):
+    """Candidates from every generator are re-ranked in one pass, with per-stage timings"""
+    from app.models.popularity import HourlyViewBuckets, PopularityLeaderboard
+
+    # User 7 watched video 1; user 8 watched 1 and 3, so item-CF proposes 3
+    recommender.user_item_matrix = pd.DataFrame([[1.0, 0.0, 0.0], [1.0, 0.0, 1.0]], index=[7, 8], columns=[1, 2, 3])
+    recommender.calculate_item_similarity()
+
+    now_hour = 500_000
+    buckets = HourlyViewBuckets(tmp_path / "popularity_buckets.npz")
+    buckets.merge(pd.DataFrame({
+        "hour": [now_hour - 1, now_hour - 1, now_hour - 1],
+        "video_id": [1, 2, 3],
+        "views": [30.0, 20.0, 10.0],
+        "completed_views": [0.0, 0.0, 0.0],
+    }), now_hour)
+    categories = pd.Series([1.0, 2.0, 3.0], index=[1, 2, 3])
+    PopularityLeaderboard(tmp_path / "popularity.npz").save(PopularityLeaderboard.build(buckets, categories, now_hour))
+    recommender.popularity.path = tmp_path / "popularity.npz"
+
+    from app.models.feature_store import UserFeatureStore, local_seconds
+
+    features = UserFeatureStore(tmp_path / "user_features.npz")
+    features.set_videos(np.array([1, 2, 3]), np.array([3, 2, 3]), np.array([2400, 600, 2400]))
+    now = pd.Timestamp.now()
+    features.add_views(np.array([7, 7]), np.array([1, 3]), local_seconds([now - pd.Timedelta(hours=2), now]))
+    features.save()
+    monkeypatch.setattr(recommendation_module.data_pipeline, "user_features", UserFeatureStore(features.path))
+    monkeypatch.setattr(recommendation_module, "get_cached_recommendations", lambda user_id, limit: [])
+    cached = []
+    monkeypatch.setattr(recommendation_module, "update_recommendation_cache",
+                        lambda user_id, video_id, score, expires_at: cached.append(video_id))
+
+    timings = {}
+    recommendations = recommender.get_hybrid_recommendations(7, n_recommendations=2, timings=timings)
+
+    assert [rec["video_id"] for rec in recommendations] == [3, 2]
+    assert recommendations[0]["reason"] == "Based on similar videos you've watched"
+    assert recommendations[1]["reason"] == "Popular and highly rated"
+    assert cached == [3, 2]
+    assert {"user_context", "generate_item_cf", "features", "rerank", "total"} <= set(timings)
+
+
+def test_rerank_scores_every_candidate_without_weighted_features():
+    """Candidates keep a (zero) score each when none of the weighted features were computed"""
+    from app.models.candidate_ranking import rerank
+
+    assert rerank({"unweighted": np.ones(3)}, 3).tolist() == [0, 0, 0]
+    np.testing.assert_allclose(rerank({"popularity": np.array([1.0, 0.0])}, 2, {"popularity": 0.5}), [0.5, 0])
+
+
+def test_als_recommends_from_cooccurring_videos(recommender, tmp_path):
+    """ALS factors trained in one process are served from the cache file in another"""
+    from app.models.matrix_factorization import ImplicitALS
+
+    # Two audiences with disjoint catalogues; user 100 has only seen videos 1 and 2
+    user_ids, video_ids = [], []
+    for user in range(40):
+        catalogue = range(1, 6) if user < 20 else range(6, 11)
+        for video in catalogue:
+            if (user + video) % 5:
+                user_ids.append(user)
+                video_ids.append(video)
+    user_ids += [100, 100, 100]
+    video_ids += [1, 2, 2]
+    weights = np.ones(len(user_ids), dtype=np.float32)
+
+    trainer = ImplicitALS(tmp_path / "als_factors.npz", factors=2, regularization=1.0, iterations=10)
+    result = trainer.fit(np.array(user_ids), np.array(video_ids), weights)
+    trainer.save()
+    assert result["interactions"] == len(user_ids) - 1  # duplicate pair collapsed
+    assert trainer.item_factors.dtype == np.float32
+
+    recommender.als.path = tmp_path / "als_factors.npz"
+    recommender.engagement_stats = pd.DataFrame({"engagement_score": 0.5}, index=pd.Index(range(1, 11), name="video_id"))
+    recommendations = recommender.get_als_recommendations(100, n_recommendations=3)
+    assert {rec["video_id"] for rec in recommendations} == {3, 4, 5}
+
+    without_context = recommender.get_als_recommendations(100, n_recommendations=3, context_video_id=3)
+    assert 3 not in {rec["video_id"] for rec in without_context}
+
+    # Videos deactivated since training are skipped, like on the taste and content paths
+    recommender.engagement_stats = recommender.engagement_stats.drop(index=4)
+    assert 4 not in {rec["video_id"] for rec in recommender.get_als_recommendations(100, n_recommendations=3)}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
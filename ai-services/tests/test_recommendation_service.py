@@ -54,6 +54,7 @@ def test_popular_recommendations(client):
         assert "recommendations" in data
         assert "algorithm_version" in data
         assert data["algorithm_version"] == "popular_fallback"
+        assert data["window"] == "7d"
 
 
 def test_invalid_request_data(client):
@@ -0,0 +1,128 @@
+"""
+Tests for LCMTV Search Service
+"""
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import search_service
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """Test client serving the small fixture index with a stub encoder"""
+    engine.load_cached_index()
+    monkeypatch.setattr(search_service, "search_engine", engine)
+    monkeypatch.setattr(
+        search_service.query_encoder, "batch_fn",
+        lambda queries: np.tile(np.array([1.0, 0.0], dtype=np.float32), (len(queries), 1))
+    )
+    search_service.ranking_cache.clear()
+    return TestClient(search_service.app)
+
+
+def test_cursor_pagination(client):
+    """Later pages are cut from the cached ranking"""
+    request = {"query": "sunday", "limit": 1, "search_type": "semantic"}
+
+    first = client.post("/api/v1/search", json=request).json()
+    assert [r["video_id"] for r in first["results"]] == [1]
+    assert first["total_candidates"] == 2
+
+    second = client.post("/api/v1/search", json=dict(request, cursor=first["next_cursor"])).json()
+    assert [r["video_id"] for r in second["results"]] == [2]
+    assert second["next_cursor"] is None
+
+    mismatched = client.post("/api/v1/search", json=dict(request, query="other", cursor=first["next_cursor"]))
+    assert mismatched.status_code == 400
+
+
+def test_out_of_range_pages_rejected(client):
+    """Negative or oversized cursor offsets and out-of-range limits are client errors"""
+    request = {"query": "sunday", "limit": 1, "search_type": "semantic"}
+    first = client.post("/api/v1/search", json=request).json()
+    key, generation, _ = search_service.decode_cursor(first["next_cursor"])
+
+    for offset in (-1, 10 ** 9):
+        cursor = search_service.encode_cursor(key, generation, offset)
+        assert client.post("/api/v1/search", json=dict(request, cursor=cursor)).status_code == 400
+    for limit in (0, 10 ** 6):
+        assert client.post("/api/v1/search", json=dict(request, limit=limit)).status_code == 400
+
+
+def test_cursor_from_a_previous_index_build_rejected(client):
+    """A rebuild swaps in a new generation; old cursors and rankings never map rows onto it"""
+    engine = search_service.search_engine
+    request = {"query": "sunday", "limit": 1, "search_type": "semantic"}
+    first = client.post("/api/v1/search", json=request).json()
+    old_ranking = engine.rank("sunday", search_type="semantic", query_embedding=np.array([1.0, 0.0]))
+
+    # The rebuilt index lists the videos in another order
+    old_index = engine.index
+    engine._set_index(old_index.embeddings[::-1], old_index.video_data.iloc[::-1])
+    assert engine.index_generation == old_index.generation + 1
+
+    expired = client.post("/api/v1/search", json=dict(request, cursor=first["next_cursor"]))
+    assert expired.status_code == 400 and "rebuilt" in expired.json()["detail"]
+
+    # A ranking computed before the swap still formats against its own build
+    assert [r["video_id"] for r in engine.format_results("sunday", old_ranking)] == [1, 2]
+    fresh = client.post("/api/v1/search", json=request).json()
+    assert [r["video_id"] for r in fresh["results"]] == [1]
+    assert search_service.decode_cursor(fresh["next_cursor"])[1] == engine.index_generation
+
+
+def test_page_details_fetched_in_one_query(client, monkeypatch):
+    """Result details for a page come from a single batched lookup"""
+    lookups = []
+
+    def fake_details(video_ids):
+        lookups.append(video_ids)
+        return {video_id: {'thumbnail_url': f"https://img/{video_id}.jpg"} for video_id in video_ids}
+
+    monkeypatch.setattr(search_service.search_engine, "_get_video_details", fake_details)
+    results = client.post("/api/v1/search", json={"query": "sunday", "limit": 5}).json()["results"]
+
+    assert lookups == [[1, 2]]
+    assert [r["thumbnail_url"] for r in results] == ["https://img/1.jpg", "https://img/2.jpg"]
+
+
+def test_ndjson_stream(client):
+    """Streaming responses emit one result per line and a trailing summary"""
+    response = client.post("/api/v1/search", json={"query": "sunday", "limit": 5, "stream": True})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["video_id"] for line in lines[:-1]] == [1, 2]
+    assert lines[-1]["total_results"] == 2
+    assert lines[-1]["next_cursor"] is None
+
+
+def test_fast_json_handles_row_types():
+    """MySQL decimals and numpy scalars serialize without model validation"""
+    from decimal import Decimal
+    from app.core.serialization import dumps
+
+    payload = json.loads(dumps({"score": np.float32(0.5), "views": np.int64(3), "rating": Decimal("4.5")}))
+    assert payload == {"score": 0.5, "views": 3, "rating": 4.5}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_json_writes_non_finite_floats_as_null(monkeypatch, use_orjson):
+    """Both encoders emit valid JSON for NaN scores"""
+    from decimal import Decimal
+    from app.core import serialization
+
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+
+    payload = {"score": float("nan"), "scores": [np.float32("inf"), 1.5], "rating": Decimal("NaN"), "n": 2}
+    assert json.loads(serialization.dumps(payload)) == {"score": None, "scores": [None, 1.5], "rating": None, "n": 2}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
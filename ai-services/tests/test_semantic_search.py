@@ -0,0 +1,261 @@
+"""
+Tests for LCMTV Semantic Search Engine
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.models.autocomplete import PrefixAutocomplete
+from app.models.encoders import OnnxEncoder, _mean_pool, create_encoder
+from app.models.lexical_index import BM25Index, tokenize
+from app.models.semantic_search import SemanticSearchEngine
+
+AI_ROOT = Path(__file__).parent.parent
+
+# Modules that must only be imported on first encode
+HEAVY_MODULES = ["sentence_transformers", "transformers", "torch", "sklearn"]
+
+# Wall-clock budget for importing the search engine in a fresh interpreter
+IMPORT_TIME_BUDGET_SECONDS = 3.0
+
+
+def test_import_stays_within_budget():
+    """Importing the search engine must not pull in the ML stack"""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.models.semantic_search\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=AI_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.splitlines()
+
+    import_time = float(output[0])
+    loaded_heavy = output[1] if len(output) > 1 else ""
+
+    assert loaded_heavy == ""
+    assert import_time < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_cached_index_serves_without_model(engine):
+    """The persisted index is usable before any model is loaded"""
+    assert engine.load_cached_index()
+    assert engine.model is None
+
+    similar = engine.find_similar_videos(video_id=1, top_k=2)
+
+    assert [video["video_id"] for video in similar] == [2, 3]
+    assert similar[0]["similarity_score"] == pytest.approx(0.8)
+    assert engine.get_index_stats()["model_loaded"] is False
+
+
+def test_hybrid_search_surfaces_exact_lexical_matches(engine):
+    """A title match is fused in even when its embedding is not the nearest"""
+    engine.load_cached_index()
+    query_embedding = np.array([1.0, 0.0], dtype=np.float32)
+
+    semantic = engine.semantic_search("romans", top_k=2, query_embedding=query_embedding)
+    hybrid = engine.hybrid_search("romans", top_k=2, query_embedding=query_embedding)
+
+    assert 3 not in [result["video_id"] for result in semantic]
+    exact_match = next(result for result in hybrid if result["video_id"] == 3)
+    assert exact_match["lexical_match"] is True
+    assert "Title matches your search" in exact_match["relevance_reason"]
+
+
+def test_filters_apply_before_ranking(engine):
+    """Filtered queries still fill the page from the allowed rows"""
+    engine.load_cached_index()
+    query_embedding = np.array([1.0, 0.0], dtype=np.float32)
+
+    by_role = engine.semantic_search(
+        "worship", top_k=2, threshold=-1.0, query_embedding=query_embedding,
+        filters={"target_roles": ["general"]}
+    )
+    assert [result["video_id"] for result in by_role] == [1, 3]
+
+    recent_short = engine.filter_index.mask(durations=["short", "medium"], published_after=pd.Timestamp("2024-02-01"))
+    assert recent_short.tolist() == [False, True, True]
+
+    assert engine.filter_index.mask() is None
+
+
+def test_user_preferences_cached_and_batch_loaded(engine, monkeypatch):
+    """Preferences are read once per user and boost candidates before truncation"""
+    from app.models import user_preferences
+
+    calls = []
+
+    def fake_query(query, params):
+        calls.append(params)
+        return [{"user_id": 7, "preferred_categories": '["Teaching"]'}]
+
+    monkeypatch.setattr(user_preferences, "execute_query", fake_query)
+    engine.load_cached_index()
+    query_embedding = np.array([1.0, 0.0], dtype=np.float32)
+
+    for _ in range(3):
+        results = engine.hybrid_search("lcmtv", user_id=7, top_k=1, threshold=-1.0, query_embedding=query_embedding)
+    assert [result["video_id"] for result in results] == [3]
+    assert results[0]["personalized"] is True
+    assert calls == [(7,)]
+
+    engine.user_preferences.invalidate([7])
+    prefs = engine.user_preferences.get_many([7, 8])
+    assert calls[-1] == (7, 8)
+    assert prefs[8]["preferred_categories"] == []
+
+
+def test_taste_vectors_decay_and_personalize_search(engine, tmp_path):
+    """Recent views dominate a user's taste, which then pulls search results toward it"""
+    from app.models.taste_vectors import TasteVectorStore
+
+    now = 1_700_000_000.0
+    store = TasteVectorStore(tmp_path / "taste_vectors.npz", half_life_days=30)
+    store.add_views(np.array([5]), np.array([[1.0, 0.0]]), np.array([1.0]), np.array([now - 90 * 86400]), now=now)
+    store.add_views(np.array([5, 6]), np.array([[0.0, 1.0], [1.0, 0.0]]), np.array([1.0, 1.0]), np.array([now, now]), now=now)
+
+    # The 90-day-old view kept 1/8 of its weight
+    np.testing.assert_allclose(store.get(5), np.array([1, 8]) / np.hypot(1, 8), atol=1e-3)
+    store.save()
+
+    engine.load_cached_index()
+    engine.taste_weight = 0.6
+    query_embedding = np.array([0.8, 0.6], dtype=np.float32)
+    anonymous = engine.semantic_search("worship", top_k=1, query_embedding=query_embedding)
+    personal = engine.semantic_search("worship", top_k=1, user_id=5, query_embedding=query_embedding)
+
+    assert anonymous[0]["video_id"] == 2
+    assert personal[0]["video_id"] == 3
+    # The blend only reorders: the reported score and the threshold use the query similarity
+    assert personal[0]["similarity_score"] == pytest.approx(0.6)
+    on_topic = engine.semantic_search(
+        "worship", top_k=1, user_id=5, query_embedding=query_embedding, threshold=0.7
+    )
+    assert on_topic[0]["video_id"] == 2
+    assert engine.get_index_stats()["taste_vectors"]["users"] == 2
+
+
+def test_bm25_keeps_scripture_references():
+    """Verse references survive tokenization and rank their documents first"""
+    assert tokenize("John 3:16 - For God so loved") == ["john", "3:16", "for", "god", "so", "loved"]
+
+    index = BM25Index().build([tokenize("Psalm 23"), tokenize("John 3:16 sermon"), tokenize("sermon notes")])
+    doc_ids, scores = index.search("3:16", top_k=5)
+
+    assert doc_ids.tolist() == [1]
+    assert scores[0] > 0
+
+
+def test_autocomplete_ranks_by_popularity_and_word_prefix():
+    """Completions come from titles, channels and categories, most popular first"""
+    autocomplete = PrefixAutocomplete()
+    autocomplete.build_from_catalog(pd.DataFrame({
+        "title": ["Sunday Service Live", "Sunday School Kids", "Bible Study: Romans"],
+        "channel_title": ["LCMTV", "LCMTV Kids", "LCMTV"],
+        "category_name": ["Services", "Kids", "Teaching"],
+        "view_count": [5000, 10, 300],
+    }))
+
+    assert autocomplete.suggest("sun", limit=2) == ["Sunday Service Live", "Sunday School Kids"]
+    assert autocomplete.suggest("rom") == ["Bible Study: Romans"]
+    assert "Teaching" in autocomplete.suggest("te")
+    assert autocomplete.suggest("zzz") == []
+
+
+def test_autocomplete_learns_logged_queries():
+    """Queries become suggestions only after repeated searches by several users, and survive a rebuild"""
+    autocomplete = PrefixAutocomplete(min_query_count=3, min_query_users=2, rebuild_threshold=2)
+    autocomplete.build_from_catalog(pd.DataFrame({"title": ["Sunday Service Live"], "view_count": [1]}))
+
+    # One user repeating a query is not enough
+    for _ in range(5):
+        assert not autocomplete.record_query("my private search", user_id=7)
+    assert autocomplete.suggest("my") == []
+
+    autocomplete.record_query("healing testimonies", user_id=1)
+    autocomplete.record_query("healing testimonies", user_id=2)
+    assert autocomplete.suggest("heal") == []
+    assert not autocomplete.record_query("healing testimonies", user_id=1)
+    assert autocomplete.suggest("heal") == ["healing testimonies"]
+
+    # The second promoted query makes a rebuild due, reported once
+    for user_id in (1, 2):
+        assert not autocomplete.record_query("worship songs", user_id=user_id)
+    assert autocomplete.record_query("worship songs")
+    assert not autocomplete.record_query("worship songs")
+
+    autocomplete.rebuild()
+    assert autocomplete.suggest("heal") == ["healing testimonies"]
+    assert autocomplete.get_stats()["pending_queries"] == 0
+
+
+def test_autocomplete_caps_logged_queries():
+    """Candidate queries are pruned and promoted counts trimmed on rebuild"""
+    autocomplete = PrefixAutocomplete(min_query_count=2, min_query_users=1, max_queries=2, max_candidates=4)
+    for i in range(10):
+        autocomplete.record_query(f"query {i}")
+    assert autocomplete.get_stats()["candidate_queries"] <= 4
+
+    autocomplete = PrefixAutocomplete(min_query_count=2, min_query_users=1, max_queries=2)
+    for query in ("alpha", "beta", "gamma"):
+        autocomplete.record_query(query)
+        autocomplete.record_query(query)
+    autocomplete.record_query("alpha")
+    autocomplete.rebuild()
+    assert len(autocomplete.query_counts) == 2 and "alpha" in autocomplete.query_counts
+
+
+def test_mean_pool_ignores_padding():
+    """ONNX pooling matches sentence-transformers mean pooling"""
+    token_embeddings = np.array([[[1.0, 2.0], [3.0, 4.0], [100.0, 100.0]]], dtype=np.float32)
+    attention_mask = np.array([[1, 1, 0]])
+
+    pooled = _mean_pool(token_embeddings, attention_mask)
+
+    np.testing.assert_allclose(pooled, [[2.0, 3.0]])
+
+
+def test_unknown_encoder_backend(tmp_path):
+    """Misconfigured backends fail loudly"""
+    with pytest.raises(ValueError):
+        create_encoder("tensorflow", "all-MiniLM-L6-v2", tmp_path)
+
+
+def test_cached_index_from_another_encoder_is_rebuilt(engine):
+    """Catalog embeddings from a different backend or quantization are not scored against new queries"""
+    assert engine.load_cached_index()
+
+    onnx_engine = SemanticSearchEngine(encoder_backend="onnx")
+    assert onnx_engine.encoder_signature != engine.encoder_signature
+    assert not onnx_engine.load_cached_index()
+
+
+def test_onnx_tokenizer_exported_when_missing(tmp_path, monkeypatch):
+    """A cached model without its tokenizer.json still gets the tokenizer exported"""
+    exported = []
+    monkeypatch.setattr(OnnxEncoder, "_export_fp32", lambda self, path: exported.append("model"))
+    monkeypatch.setattr(OnnxEncoder, "_export_tokenizer", lambda self: exported.append("tokenizer"))
+
+    encoder = OnnxEncoder.__new__(OnnxEncoder)
+    encoder.model_name = "all-MiniLM-L6-v2"
+    encoder.quantize = False
+    encoder.export_dir = tmp_path
+    (tmp_path / "model.onnx").write_bytes(b"")
+
+    encoder.ensure_exported()
+    assert exported == ["tokenizer"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
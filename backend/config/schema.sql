@@ -213,7 +213,8 @@ CREATE TABLE video_views (
     INDEX idx_video_views_user (user_id),
     INDEX idx_video_views_session (session_id),
     INDEX idx_video_views_created (created_at),
-    INDEX idx_video_views_completed (completed)
+    INDEX idx_video_views_completed (completed),
+    INDEX idx_video_views_created_user (created_at, user_id, video_id, session_id, watch_percentage, completed, watch_duration, total_duration)
 );
 
 -- Content engagement events (comprehensive tracking)